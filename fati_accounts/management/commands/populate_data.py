@@ -6,13 +6,11 @@ Objectif:
 - si les JSON sont absents/incomplets, generer des donnees synthetiques.
 """
 import csv
-import json
 import random
 import re
-import unicodedata
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Iterable, Optional, Tuple
+from typing import Optional
 
 from django.contrib.auth.hashers import make_password
 from django.core.management.base import BaseCommand, CommandError
@@ -21,6 +19,7 @@ from django.utils.text import slugify
 from fati_accounts.models import User
 from fati_facilities.models import EducationFacility, HealthFacility, Staff
 from fati_geography.models import Commune, Department, Region
+from fati_indicators.importers import JsonIndicatorImporter
 from fati_indicators.models import Indicator, IndicatorValue
 from fati_workflows.models import Alert
 
@@ -94,7 +93,6 @@ class Command(BaseCommand):
         self.stdout.write(self.style.NOTICE("Demarrage du peuplement FATI..."))
 
         self.sync_geography_from_csv()
-        self._build_geo_lookup()
 
         health_values_from_json = 0
         education_values_from_json = 0
@@ -252,239 +250,41 @@ class Command(BaseCommand):
             idx += 1
         return code
 
-    def _build_geo_lookup(self):
-        self.region_by_name: Dict[str, Region] = {}
-        self.department_by_name: Dict[str, Department] = {}
-
-        for region in Region.objects.all():
-            self.region_by_name[self._normalize(region.name)] = region
-
-        for department in Department.objects.select_related("region").all():
-            self.department_by_name[self._normalize(department.name)] = department
-
-        # Alias frequents pour les JSON.
-        aliases = {
-            "ST LOUIS": "SAINT LOUIS",
-            "THIES": "THIES",
-            "KEDOUGOU": "KEDOUGOU",
-            "ZIGUINCHOR": "ZIGUINCHOR",
-            "SENEGAL": "SENEGAL",
-        }
-        for src, dst in aliases.items():
-            src_norm = self._normalize(src)
-            dst_norm = self._normalize(dst)
-            if dst_norm in self.region_by_name:
-                self.region_by_name[src_norm] = self.region_by_name[dst_norm]
-
-    def _resolve_geo(self, raw_label: Optional[str]) -> Tuple[Optional[Region], Optional[Department], Optional[Commune]]:
-        if not raw_label:
-            return None, None, None
-
-        label = self._normalize(raw_label)
-        if not label or label in {"SENEGAL", "TOTAL", "NATIONAL"}:
-            return None, None, None
-
-        department = self.department_by_name.get(label)
-        if department:
-            return None, department, None
-
-        region = self.region_by_name.get(label)
-        if region:
-            return region, None, None
-
-        # Tentative fuzzy simple.
-        for key, dep in self.department_by_name.items():
-            if key in label or label in key:
-                return None, dep, None
-        for key, reg in self.region_by_name.items():
-            if key in label or label in key:
-                return reg, None, None
-
-        return None, None, None
-
     # ------------------------------------------------------------------
     # JSON import
     # ------------------------------------------------------------------
     def import_health_json(self, json_path: str) -> int:
-        path = Path(json_path)
-        if not path.exists():
-            self.stdout.write(self.style.WARNING(f"JSON sante introuvable: {path}"))
-            return 0
-
-        try:
-            data = json.loads(path.read_text(encoding="utf-8"))
-        except Exception as exc:
-            self.stdout.write(self.style.WARNING(f"Erreur de lecture JSON sante: {exc}"))
-            return 0
-
-        imported_values = 0
-        created_indicators = 0
-
-        for group_key, sheets in data.items():
-            if not isinstance(sheets, dict):
-                continue
-
-            for sheet_name, rows in sheets.items():
-                if not isinstance(rows, list):
-                    continue
-
-                current_geo_label = None
-                for row in rows:
-                    if not isinstance(row, dict):
-                        continue
-
-                    period_label = row.get("Période")
-                    if isinstance(period_label, str) and period_label.strip():
-                        normalized = self._normalize(period_label)
-                        if normalized not in {"", "PERIODE", "DECOUPAGE ADMINISTRATIF"}:
-                            current_geo_label = period_label.strip()
-
-                    indicator_raw = row.get("Unnamed: 1") or row.get("Unnamed: 2") or ""
-                    indicator_name = self._clean_indicator_name(indicator_raw)
-                    if not indicator_name or self._looks_like_header(indicator_name):
-                        continue
-
-                    year_values = self._extract_year_values(row)
-                    if not year_values:
-                        continue
-
-                    category = self._guess_category(
-                        sector="health",
-                        group_key=group_key,
-                        sheet_name=sheet_name,
-                        indicator_name=indicator_name,
-                    )
-                    indicator_type = self._guess_type(unit="", indicator_name=indicator_name)
-                    indicator, created = self._get_or_create_indicator(
-                        sector=Indicator.Sector.HEALTH,
-                        category=category,
-                        indicator_type=indicator_type,
-                        name=indicator_name,
-                        group_key=group_key,
-                        sheet_name=sheet_name,
-                        unit="",
-                        description=f"Import JSON sante / {group_key} / {sheet_name}",
-                    )
-                    if created:
-                        created_indicators += 1
-
-                    region, department, commune = self._resolve_geo(current_geo_label)
-                    for year, value in year_values:
-                        self._upsert_indicator_value(
-                            indicator=indicator,
-                            year=year,
-                            value=value,
-                            region=region,
-                            department=department,
-                            commune=commune,
-                            source=f"json:{path.name}",
-                        )
-                        imported_values += 1
-
-        self.stdout.write(
-            self.style.SUCCESS(
-                f"Sante JSON importe: {imported_values} valeurs, {created_indicators} indicateurs crees."
-            )
-        )
-        return imported_values
+        return self._import_json(json_path, Indicator.Sector.HEALTH, "Sante")
 
     def import_education_json(self, json_path: str) -> int:
+        return self._import_json(json_path, Indicator.Sector.EDUCATION, "Education")
+
+    def _import_json(self, json_path: str, sector: str, label: str) -> int:
         path = Path(json_path)
         if not path.exists():
-            self.stdout.write(self.style.WARNING(f"JSON education introuvable: {path}"))
+            self.stdout.write(self.style.WARNING(f"JSON {label.lower()} introuvable: {path}"))
             return 0
 
         try:
-            data = json.loads(path.read_text(encoding="utf-8"))
-        except Exception as exc:
-            self.stdout.write(self.style.WARNING(f"Erreur de lecture JSON education: {exc}"))
+            result = JsonIndicatorImporter(str(path), sector).run()
+        except (ValueError, OSError) as exc:
+            self.stdout.write(self.style.WARNING(f"Erreur de lecture JSON {label.lower()}: {exc}"))
             return 0
 
-        imported_values = 0
-        created_indicators = 0
-
-        for group_key, sheets in data.items():
-            if not isinstance(sheets, dict):
-                continue
-
-            for sheet_name, rows in sheets.items():
-                if not isinstance(rows, list):
-                    continue
-
-                year_map: Dict[str, int] = {}
-                current_indicator = None
-
-                for row in rows:
-                    if not isinstance(row, dict) or not row:
-                        continue
-
-                    first_col = next(iter(row.keys()))
-                    first_value = str(row.get(first_col) or "").strip()
-                    if not first_value:
-                        continue
-
-                    normalized_first_value = self._normalize(first_value)
-
-                    if "PERIODE" in normalized_first_value:
-                        year_map = self._extract_year_map_from_education_row(row)
-                        continue
-
-                    if "FREQUENCE" in normalized_first_value and "INDICATEUR" in normalized_first_value:
-                        indicator_name, unit = self._parse_education_indicator_line(first_value)
-                        indicator_name = self._clean_indicator_name(indicator_name)
-                        if not indicator_name:
-                            continue
-
-                        category = self._guess_category(
-                            sector="education",
-                            group_key=group_key,
-                            sheet_name=sheet_name,
-                            indicator_name=indicator_name,
-                        )
-                        indicator_type = self._guess_type(unit=unit, indicator_name=indicator_name)
-                        current_indicator, created = self._get_or_create_indicator(
-                            sector=Indicator.Sector.EDUCATION,
-                            category=category,
-                            indicator_type=indicator_type,
-                            name=indicator_name,
-                            group_key=group_key,
-                            sheet_name=sheet_name,
-                            unit=unit,
-                            description=f"Import JSON education / {group_key} / {sheet_name}",
-                        )
-                        if created:
-                            created_indicators += 1
-                        continue
-
-                    if not current_indicator or not year_map:
-                        continue
-
-                    if self._is_education_meta_row(normalized_first_value):
-                        continue
-
-                    region, department, commune = self._resolve_geo(first_value)
-                    for column_key, year in year_map.items():
-                        value = self._parse_number(row.get(column_key))
-                        if value is None:
-                            continue
-
-                        self._upsert_indicator_value(
-                            indicator=current_indicator,
-                            year=year,
-                            value=value,
-                            region=region,
-                            department=department,
-                            commune=commune,
-                            source=f"json:{path.name}",
-                        )
-                        imported_values += 1
-
         self.stdout.write(
             self.style.SUCCESS(
-                f"Education JSON importe: {imported_values} valeurs, {created_indicators} indicateurs crees."
+                f"{label} JSON importe: {result['values']} valeurs, "
+                f"{result['indicators_created']} indicateurs crees."
             )
         )
-        return imported_values
+        if result["skipped"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{result['skipped']} lignes ignorees (territoires ambigus: "
+                    f"{len(result['ambiguous'])}, inconnus: {len(result['unresolved'])})."
+                )
+            )
+        return result["values"]
 
     # ------------------------------------------------------------------
     # Synthetic generation fallback
@@ -921,14 +721,6 @@ class Command(BaseCommand):
     # ------------------------------------------------------------------
     # Parsing helpers
     # ------------------------------------------------------------------
-    def _normalize(self, value: Optional[str]) -> str:
-        if value is None:
-            return ""
-        text = unicodedata.normalize("NFKD", str(value))
-        text = "".join(ch for ch in text if not unicodedata.combining(ch))
-        text = re.sub(r"[^A-Za-z0-9]+", " ", text).strip().upper()
-        return text
-
     def _parse_number(self, value) -> Optional[float]:
         if value is None:
             return None
@@ -962,107 +754,6 @@ class Command(BaseCommand):
             return None
         return int(number)
 
-    def _extract_year_values(self, row: dict) -> Iterable[Tuple[int, float]]:
-        year_values = []
-        for key, raw in row.items():
-            key_str = str(key).strip()
-            if not re.fullmatch(r"(19|20)\d{2}", key_str):
-                continue
-            value = self._parse_number(raw)
-            if value is None:
-                continue
-            year_values.append((int(key_str), value))
-        return year_values
-
-    def _extract_year_map_from_education_row(self, row: dict) -> Dict[str, int]:
-        year_map = {}
-        for col, raw in row.items():
-            if raw is None:
-                continue
-            match = re.search(r"(19|20)\d{2}", str(raw))
-            if match:
-                year_map[col] = int(match.group(0))
-        return year_map
-
-    def _parse_education_indicator_line(self, text: str) -> Tuple[str, str]:
-        indicator_match = re.search(r"indicateurs?\s*:\s*([^,]+)", text, flags=re.IGNORECASE)
-        unit_match = re.search(r"unit[ée]?\s*:\s*([^,]+)", text, flags=re.IGNORECASE)
-        indicator_name = indicator_match.group(1).strip() if indicator_match else text.strip()
-        unit = unit_match.group(1).strip() if unit_match else ""
-        return indicator_name, unit
-
-    def _clean_indicator_name(self, value: str) -> str:
-        text = str(value or "").strip()
-        text = text.replace("(*)", "")
-        text = re.sub(r"\s+", " ", text).strip(" -:;")
-        return text
-
-    def _looks_like_header(self, indicator_name: str) -> bool:
-        normalized = self._normalize(indicator_name)
-        if not normalized or len(normalized) < 3:
-            return True
-        blocked_patterns = [
-            "PRINCIPAUX INDICATEURS",
-            "DECOUPAGE ADMINISTRATIF",
-            "ETABLISSEMENTS DE SANTE",
-            "INDICATEURS",
-        ]
-        return any(pattern in normalized for pattern in blocked_patterns)
-
-    def _is_education_meta_row(self, normalized_value: str) -> bool:
-        meta_prefixes = [
-            "STATUT",
-            "CYCLES",
-            "NIVEAU",
-            "MILIEU",
-            "SEXE",
-            "ACADEMIES",
-            "IA",
-        ]
-        return any(normalized_value.startswith(prefix) for prefix in meta_prefixes)
-
-    def _guess_category(self, sector: str, group_key: str, sheet_name: str, indicator_name: str) -> str:
-        text = self._normalize(f"{group_key} {sheet_name} {indicator_name}")
-
-        if sector == "health":
-            if any(token in text for token in ["DEPENSE", "BUDGET", "FINANCE"]):
-                return Indicator.Category.FINANCE
-            if any(token in text for token in ["PERSONNEL", "SOIGNANT", "MEDECIN", "SAGE FEMME"]):
-                return Indicator.Category.PERSONNEL
-            if any(token in text for token in ["LIT", "ETABLISSEMENT", "HOPITAL", "CENTRE", "POSTE", "INFRA"]):
-                return Indicator.Category.INFRASTRUCTURE
-            if any(token in text for token in ["MORTAL", "PREVALENCE", "DECES", "RESULTAT"]):
-                return Indicator.Category.OUTCOMES
-            if any(token in text for token in ["ACCES", "COUVERTURE", "CONSULTATION", "VACCIN"]):
-                return Indicator.Category.ACCESS
-            return Indicator.Category.RESOURCES
-
-        if any(token in text for token in ["RESULTAT", "REUSSITE", "ADMIS", "EXAMEN"]):
-            return Indicator.Category.OUTCOMES
-        if any(token in text for token in ["ETABLISSEMENT", "CLASSE", "SALLE", "INFRA"]):
-            return Indicator.Category.INFRASTRUCTURE
-        if any(token in text for token in ["ENSEIGNANT", "PERSONNEL", "MAITRE"]):
-            return Indicator.Category.PERSONNEL
-        if any(token in text for token in ["SCOLAR", "INSCRIPTION", "ACCES"]):
-            return Indicator.Category.ACCESS
-        if "RATIO" in text or "QUALITE" in text:
-            return Indicator.Category.QUALITY
-        return Indicator.Category.RESOURCES
-
-    def _guess_type(self, unit: str, indicator_name: str) -> str:
-        normalized = self._normalize(f"{unit} {indicator_name}")
-        unit_norm = self._normalize(unit)
-
-        if "%" in unit or "TAUX" in normalized or "POURCENT" in normalized:
-            return Indicator.Type.PERCENTAGE
-        if "RATIO" in normalized or unit_norm in {"PER 1000", "1000", "POUR 1000"}:
-            return Indicator.Type.RATIO
-        if any(token in normalized for token in ["BUDGET", "DEPENSE", "COUT", "FCFA"]):
-            return Indicator.Type.CURRENCY
-        if any(token in normalized for token in ["NOMBRE", "EFFECTIF", "NB", "ETABLISSEMENT"]):
-            return Indicator.Type.COUNT
-        return Indicator.Type.NUMBER
-
     # ------------------------------------------------------------------
     # Utility
     # ------------------------------------------------------------------
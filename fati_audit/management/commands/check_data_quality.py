@@ -0,0 +1,28 @@
+"""
+Contrôler la qualité des valeurs d'indicateurs modifiées
+"""
+from django.core.management.base import BaseCommand
+
+from fati_audit.quality import SCAN_BATCH_SIZE, scan_values
+
+
+class Command(BaseCommand):
+    help = "Contrôle les valeurs créées ou modifiées depuis le dernier passage"
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help="Recontrôler toutes les valeurs (ignore le point de reprise)"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=SCAN_BATCH_SIZE,
+            help="Nombre de valeurs par lot"
+        )
+    
+    def handle(self, *args, **options):
+        checked, created = scan_values(
+            full=options['full'], batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {checked} valeurs contrôlées, {created} vérifications créées'
+        ))
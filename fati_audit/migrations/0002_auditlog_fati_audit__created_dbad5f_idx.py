@@ -0,0 +1,17 @@
+# Generated by Django 4.2.27 on 2026-10-18 23:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fati_audit", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="auditlog",
+            index=models.Index(fields=["created_at", "id"], name="fati_audit__created_dbad5f_idx"),
+        ),
+    ]
@@ -61,6 +61,8 @@ class AuditLog(models.Model):
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['entity_type', 'entity_id']),
             models.Index(fields=['action', '-created_at']),
+            # Pagination par curseur (created_at, id)
+            models.Index(fields=['created_at', 'id']),
         ]
     
     def __str__(self):
@@ -70,6 +72,17 @@ class AuditLog(models.Model):
     def log(cls, user, action, entity_type, entity_id, entity_name='',
             old_values=None, new_values=None, request=None):
         """Créer une entrée de journal"""
+        entry = cls.build(
+            user, action, entity_type, entity_id, entity_name,
+            old_values, new_values, request
+        )
+        entry.save()
+        return entry
+    
+    @classmethod
+    def build(cls, user, action, entity_type, entity_id, entity_name='',
+              old_values=None, new_values=None, request=None):
+        """Construire une entrée non enregistrée (pour ``bulk_create``)"""
         ip_address = None
         user_agent = ''
         
@@ -77,7 +90,7 @@ class AuditLog(models.Model):
             ip_address = cls._get_client_ip(request)
             user_agent = request.META.get('HTTP_USER_AGENT', '')
         
-        return cls.objects.create(
+        return cls(
             user=user,
             user_name=user.get_full_name() if user else 'Anonymous',
             user_role=user.role if user else '',
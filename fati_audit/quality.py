@@ -0,0 +1,403 @@
+"""
+FATI Audit - Contrôle qualité des valeurs d'indicateurs
+
+Les valeurs créées ou modifiées depuis le dernier passage (journal des
+modifications, transactions terminées uniquement) sont contrôlées par lots :
+
+- ``completeness`` : années manquantes dans la série du territoire et
+  territoires du même niveau non renseignés pour l'année ;
+- ``consistency`` : pourcentages dans [0, 100] et somme des territoires
+  enfants comparée à la valeur parente (types sommés par la consolidation,
+  ``rollup.SUM_TYPES``) ;
+- ``validity`` : valeur finie et plage admise par ``Indicator.type`` ;
+- ``timeliness`` : saisie postérieure à la fin du cycle de collecte.
+
+Les règles sont évaluées avec NumPy sur tout le lot ; les vérifications
+d'une valeur remplacent les précédentes et sont insérées avec
+``bulk_create``. Une valeur modifiée entraîne le recontrôle des valeurs
+dont les résultats en dépendent : sa série (années manquantes), sa cellule
+(indicateur, niveau, période, année ; territoires renseignés) et sa valeur
+parente (somme des enfants).
+"""
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from fati_data_collection.models import DataCollection
+from fati_indicators.changes import CHANGE_BATCH_SIZE, ChangedValues, prune_changes
+from fati_indicators.models import Indicator, IndicatorValue
+from fati_indicators.rollup import SUM_TYPES
+from .models import DataQualityCheck
+
+
+SCAN_NAME = 'quality_checks'
+SCAN_BATCH_SIZE = CHANGE_BATCH_SIZE
+
+YEAR_SPAN = 10000
+
+# Part de territoires renseignés en dessous de laquelle la complétude échoue
+COMPLETENESS_MIN_COVERAGE = 0.5
+# Écart relatif somme des enfants / parent : avertissement, puis échec
+CONSISTENCY_TOLERANCE = 0.01
+CONSISTENCY_FAILURE = 0.1
+# Retard (jours) après la fin de collecte au-delà duquel la ponctualité échoue
+TIMELINESS_GRACE_DAYS = 30
+# Nombre maximal d'années ou de territoires listés dans les détails
+MAX_LISTED = 20
+
+NON_NEGATIVE_TYPES = [
+    Indicator.Type.COUNT, Indicator.Type.RATIO,
+    Indicator.Type.PERCENTAGE, Indicator.Type.CURRENCY,
+]
+
+COLUMNS = (
+    'id', 'indicator_id', 'region_id', 'department_id', 'commune_id',
+    'period', 'year', 'value', 'created_at'
+)
+
+
+def locate(region_id, department_id, commune_id):
+    """(niveau, territoire) le plus fin d'une valeur, ``('national', 0)`` sinon"""
+    if commune_id:
+        return 'commune', commune_id
+    if department_id:
+        return 'department', department_id
+    if region_id:
+        return 'region', region_id
+    return 'national', 0
+
+
+class Territories:
+    """Hiérarchie territoriale : territoires de chaque niveau, parents et enfants"""
+
+    def __init__(self):
+        from fati_geography.models import Commune, Department, Region
+        self.ids = {
+            'national': {0},
+            'region': set(Region.objects.values_list('id', flat=True)),
+        }
+        self.parents = {('region', pk): ('national', 0) for pk in self.ids['region']}
+        self.children = {('national', 0): set(self.ids['region'])}
+        for level, model, field, parent_level in (
+            ('department', Department, 'region_id', 'region'),
+            ('commune', Commune, 'department_id', 'department'),
+        ):
+            self.ids[level] = set()
+            for pk, parent_id in model.objects.values_list('id', field):
+                self.ids[level].add(pk)
+                self.parents[(level, pk)] = (parent_level, parent_id)
+                self.children.setdefault((parent_level, parent_id), set()).add(pk)
+
+    def parent(self, level, territory_id):
+        return self.parents.get((level, territory_id))
+
+
+class Coverage:
+    """
+    Valeurs non rejetées des indicateurs, chargées à la demande : années
+    et valeurs de chaque série, territoires de chaque cellule et sommes des
+    enfants de chaque territoire parent.
+    """
+
+    def __init__(self, territories):
+        self.territories = territories
+        self.loaded = set()
+        self.value_ids = {}
+        self.series_ids = {}
+        self.series_values = {}
+        self.series = []
+        self.years = []
+        self.cells = {}
+        self.parent_ids = {}
+        self.parents = []
+        self.child_values = []
+        self._arrays = None
+
+    def load(self, indicator_ids):
+        missing = set(indicator_ids) - self.loaded
+        if not missing:
+            return
+        rows = IndicatorValue.objects.filter(indicator_id__in=missing).exclude(
+            status=IndicatorValue.Status.REJECTED
+        ).values_list(*COLUMNS[:8]).order_by()
+        for value_id, indicator_id, region_id, department_id, commune_id, period, year, value in rows.iterator(
+            chunk_size=SCAN_BATCH_SIZE
+        ):
+            level, territory_id = locate(region_id, department_id, commune_id)
+            self.value_ids[(indicator_id, level, territory_id, period, year)] = value_id
+            key = (indicator_id, level, territory_id, period)
+            self.series.append(self.series_ids.setdefault(key, len(self.series_ids)))
+            self.series_values.setdefault(key, []).append(value_id)
+            self.years.append(year)
+            self.cells.setdefault((indicator_id, level, period, year), set()).add(territory_id)
+            parent = self.territories.parent(level, territory_id)
+            if parent is not None:
+                key = (indicator_id, *parent, period, year)
+                self.parents.append(self.parent_ids.setdefault(key, len(self.parent_ids)))
+                self.child_values.append(value)
+        self.loaded |= missing
+        self._arrays = None
+
+    def arrays(self):
+        """
+        (clés série-année triées, sommes et effectifs des enfants par
+        parent) ; l'indice -1 des sommes désigne un parent sans enfant.
+        """
+        if self._arrays is None:
+            keys = np.array(self.series, dtype=np.int64) * YEAR_SPAN + np.array(self.years, dtype=np.int64)
+            parents = np.array(self.parents, dtype=np.intp)
+            count = len(self.parent_ids)
+            sums = np.bincount(parents, np.array(self.child_values, dtype=float), minlength=count)
+            counts = np.bincount(parents, minlength=count)
+            self._arrays = (np.sort(keys), np.append(sums, np.nan), np.append(counts, 0))
+        return self._arrays
+
+
+def collection_deadlines():
+    """Date de fin de collecte par (indicateur, année, période)"""
+    Through = DataCollection.indicators.through
+    deadlines = {}
+    for indicator_id, year, period, end_date in Through.objects.values_list(
+        'indicator_id', 'datacollection__year', 'datacollection__period',
+        'datacollection__end_date'
+    ):
+        key = (indicator_id, year, period)
+        # Plusieurs cycles : la date la plus tardive fait foi
+        deadlines[key] = max(end_date, deadlines.get(key, end_date))
+    return deadlines
+
+
+def _status(failed, warning):
+    if failed:
+        return DataQualityCheck.Status.FAILED
+    if warning:
+        return DataQualityCheck.Status.WARNING
+    return DataQualityCheck.Status.PASSED
+
+
+def check_batch(rows, indicators, coverage, territories, deadlines):
+    """
+    Construire les vérifications d'un lot.
+
+    ``rows`` : tuples (id, indicator_id, region_id, department_id,
+    commune_id, period, year, value, created_at).
+    """
+    coverage.load({row[1] for row in rows})
+    series_keys, child_sums, child_counts = coverage.arrays()
+
+    n = len(rows)
+    located = [locate(*row[2:5]) for row in rows]
+    values = np.fromiter((row[7] for row in rows), dtype=float, count=n)
+    years = np.fromiter((row[6] for row in rows), dtype=np.int64, count=n)
+    types = np.array([indicators[row[1]].type for row in rows], dtype=str)
+
+    # Complétude : années manquantes depuis le début de la série
+    series = np.fromiter(
+        (coverage.series_ids.get((row[1], *place, row[5]), -1) for row, place in zip(rows, located)),
+        dtype=np.int64, count=n
+    )
+    known = series >= 0
+    start = np.searchsorted(series_keys, series * YEAR_SPAN)
+    end = np.searchsorted(series_keys, series * YEAR_SPAN + years, side='right')
+    first_years = np.where(
+        known & (end > start), series_keys[np.minimum(start, len(series_keys) - 1)] - series * YEAR_SPAN, years
+    )
+    missing_years = np.where(known, years - first_years + 1 - (end - start), 0)
+
+    # Complétude : territoires du niveau renseignés pour l'année
+    covered = np.fromiter(
+        (len(coverage.cells.get((row[1], place[0], row[5], row[6]), ())) for row, place in zip(rows, located)),
+        dtype=float, count=n
+    )
+    totals = np.fromiter((len(territories.ids[place[0]]) for place in located), dtype=float, count=n)
+    shares = np.where(totals > 0, covered / np.maximum(totals, 1), 1.0)
+    incomplete = shares < COMPLETENESS_MIN_COVERAGE
+    gaps = (missing_years > 0) | (shares < 1)
+
+    # Cohérence : pourcentages, puis somme des enfants pour les types additifs
+    percentage = types == Indicator.Type.PERCENTAGE
+    with np.errstate(invalid='ignore'):
+        out_of_range = percentage & ((values < 0) | (values > 100))
+    parents = np.fromiter(
+        (coverage.parent_ids.get((row[1], *place, row[5], row[6]), -1) for row, place in zip(rows, located)),
+        dtype=np.intp, count=n
+    )
+    has_children = np.isin(types, list(SUM_TYPES)) & (parents >= 0)
+    sums, counts = child_sums[parents], child_counts[parents]
+    expected = np.fromiter((len(territories.children.get(place, ())) for place in located), dtype=np.int64, count=n)
+    complete = has_children & (expected > 0) & (counts >= expected)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        deviations = np.abs(sums - values) / np.maximum(np.abs(values), 1e-9)
+        # Enfants partiels : seul un dépassement du parent est incohérent
+        exceeded = has_children & ~complete & (sums > values + np.abs(values) * CONSISTENCY_TOLERANCE)
+    consistency_failed = out_of_range | (complete & (deviations > CONSISTENCY_FAILURE))
+    consistency_warning = exceeded | (complete & (deviations > CONSISTENCY_TOLERANCE))
+
+    # Validité selon le type d'indicateur
+    finite = np.isfinite(values)
+    with np.errstate(invalid='ignore'):
+        negative = np.isin(types, NON_NEGATIVE_TYPES) & (values < 0)
+        fractional = (types == Indicator.Type.COUNT) & finite & (values != np.round(values))
+
+    # Ponctualité : date de saisie et fin du cycle de collecte
+    due = np.array([
+        deadlines.get((row[1], row[6], row[5]), deadlines.get((row[1], row[6], '')))
+        for row in rows
+    ], dtype='datetime64[D]')
+    entered = np.array([timezone.localtime(row[8]).date() for row in rows], dtype='datetime64[D]')
+    delays = (entered - due) / np.timedelta64(1, 'D')
+    scheduled = ~np.isnat(due)
+
+    checks = []
+    for index, (row, (level, territory_id)) in enumerate(zip(rows, located)):
+        value_id, indicator_id, _, _, _, period, year, value, _ = row
+        cell = coverage.cells.get((indicator_id, level, period, year), set())
+
+        details = {
+            'first_year': int(first_years[index]),
+            'missing_years': int(missing_years[index]),
+            'covered': int(covered[index]),
+            'total': int(totals[index]),
+        }
+        if missing_years[index] > 0:
+            present = set(
+                (series_keys[start[index]:end[index]] - series[index] * YEAR_SPAN).tolist()
+            )
+            details['years'] = sorted(set(range(int(first_years[index]), year)) - present)[:MAX_LISTED]
+        if shares[index] < 1:
+            details['territories'] = sorted(territories.ids[level] - cell)[:MAX_LISTED]
+        checks.append(DataQualityCheck(
+            indicator_value_id=value_id,
+            check_type=DataQualityCheck.CheckType.COMPLETENESS,
+            status=_status(incomplete[index], gaps[index]),
+            message=(
+                f"{int(missing_years[index])} année(s) manquante(s) depuis {int(first_years[index])}, "
+                f"{int(covered[index])}/{int(totals[index])} territoires renseignés en {year}"
+            ),
+            details=details,
+        ))
+
+        if percentage[index] or has_children[index]:
+            details = {}
+            if out_of_range[index]:
+                message = f"Pourcentage hors de l'intervalle [0, 100] : {value:g}"
+            else:
+                message = "Pourcentage dans l'intervalle [0, 100]"
+            if has_children[index]:
+                details = {
+                    'children_sum': float(sums[index]),
+                    'children': int(counts[index]),
+                    'expected_children': int(expected[index]),
+                    'deviation': float(deviations[index]) if np.isfinite(deviations[index]) else None,
+                }
+                message = (
+                    f"Somme des {int(counts[index])}/{int(expected[index])} territoires enfants : "
+                    f"{sums[index]:g} pour une valeur de {value:g}"
+                )
+            checks.append(DataQualityCheck(
+                indicator_value_id=value_id,
+                check_type=DataQualityCheck.CheckType.CONSISTENCY,
+                status=_status(consistency_failed[index], consistency_warning[index]),
+                message=message,
+                details=details,
+            ))
+
+        if not finite[index]:
+            message = 'Valeur non numérique ou infinie'
+        elif negative[index]:
+            message = f"Valeur négative ({value:g}) pour un indicateur de type {types[index]}"
+        elif fractional[index]:
+            message = f"Comptage non entier : {value:g}"
+        else:
+            message = f"Valeur admise pour le type {types[index]}"
+        checks.append(DataQualityCheck(
+            indicator_value_id=value_id,
+            check_type=DataQualityCheck.CheckType.VALIDITY,
+            status=_status(not finite[index] or negative[index], fractional[index]),
+            message=message,
+            details={'type': str(types[index])},
+        ))
+
+        if scheduled[index]:
+            delay = int(delays[index])
+            checks.append(DataQualityCheck(
+                indicator_value_id=value_id,
+                check_type=DataQualityCheck.CheckType.TIMELINESS,
+                status=_status(delay > TIMELINESS_GRACE_DAYS, delay > 0),
+                message=(
+                    f"Saisie {delay} jour(s) après la fin de collecte ({due[index]})" if delay > 0
+                    else f"Saisie avant la fin de collecte ({due[index]})"
+                ),
+                details={'deadline': str(due[index]), 'entered': str(entered[index]), 'delay_days': delay},
+            ))
+    return checks
+
+
+def _affected_rows(rows, indicators, coverage, territories, checked):
+    """
+    Valeurs à recontrôler après la modification des valeurs ``rows`` : même
+    série, même cellule et valeur parente (types additifs), hors lot et hors
+    valeurs déjà recontrôlées (``checked``).
+    """
+    affected = set()
+    for row in rows:
+        indicator_id, period, year = row[1], row[5], row[6]
+        level, territory_id = locate(*row[2:5])
+        affected.update(coverage.series_values.get((indicator_id, level, territory_id, period), ()))
+        affected.update(
+            coverage.value_ids[(indicator_id, level, other, period, year)]
+            for other in coverage.cells.get((indicator_id, level, period, year), ())
+        )
+        parent = territories.parent(level, territory_id)
+        if parent is not None and indicators[indicator_id].type in SUM_TYPES:
+            affected.add(coverage.value_ids.get((indicator_id, *parent, period, year)))
+    affected -= {row[0] for row in rows} | checked
+    affected.discard(None)
+    if not affected:
+        return []
+    return list(IndicatorValue.objects.filter(id__in=affected).exclude(
+        status=IndicatorValue.Status.REJECTED
+    ).order_by('id').values_list(*COLUMNS))
+
+
+def scan_values(full=False, batch_size=SCAN_BATCH_SIZE):
+    """
+    Contrôler les valeurs modifiées depuis le dernier passage (journal des
+    modifications).
+
+    ``full`` recontrôle toutes les valeurs. Les vérifications des valeurs
+    rejetées sont supprimées. Renvoie (valeurs contrôlées, vérifications
+    créées).
+    """
+    changed = ChangedValues(SCAN_NAME, full=full, batch_size=batch_size)
+    indicators = Indicator.objects.in_bulk()
+    territories = Territories()
+    coverage = Coverage(territories)
+    deadlines = collection_deadlines()
+    checked = set()
+
+    for value_ids in changed:
+        rows = list(IndicatorValue.objects.filter(id__in=value_ids).order_by('id').values_list(
+            *COLUMNS, 'status'
+        ))
+        batch = []
+        if rows:
+            missing = {row[1] for row in rows} - indicators.keys()
+            if missing:
+                indicators.update(Indicator.objects.in_bulk(missing))
+            coverage.load({row[1] for row in rows})
+            batch = [row[:9] for row in rows if row[9] != IndicatorValue.Status.REJECTED]
+            if not changed.full:
+                # Passage complet : chaque valeur est de toute façon contrôlée
+                batch += _affected_rows([row[:9] for row in rows], indicators, coverage, territories, checked)
+                checked.update(row[0] for row in batch)
+        checks = check_batch(batch, indicators, coverage, territories, deadlines) if batch else []
+
+        with transaction.atomic():
+            DataQualityCheck.objects.filter(
+                indicator_value_id__in=set(value_ids) | {row[0] for row in batch}
+            ).delete()
+            DataQualityCheck.objects.bulk_create(checks, batch_size=1000)
+            changed.commit(len(batch), len(checks))
+    prune_changes()
+    return changed.values, changed.results
@@ -44,7 +44,7 @@ class DataQualityCheckSerializer(serializers.ModelSerializer):
     def get_indicator_value_details(self, obj):
         return {
             'indicator_name': obj.indicator_value.indicator.name,
-            'region': obj.indicator_value.region.name,
+            'region': obj.indicator_value.region.name if obj.indicator_value.region else None,
             'value': obj.indicator_value.value,
             'period': obj.indicator_value.period
         }
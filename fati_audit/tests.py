@@ -1,3 +1,102 @@
+import datetime
+
 from django.test import TestCase
+from django.utils import timezone
+
+from fati_geography.models import Department, Region
+from fati_indicators.models import Indicator, IndicatorValue
+from .models import DataQualityCheck
+from .quality import COLUMNS, Coverage, Territories, check_batch
+
+
+Status = DataQualityCheck.Status
+CheckType = DataQualityCheck.CheckType
+
+
+class CheckBatchTest(TestCase):
+    """Règles de complétude, cohérence, validité et ponctualité d'un lot"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.north = Region.objects.create(code='RN', name='Nord')
+        cls.south = Region.objects.create(code='RS', name='Sud')
+        cls.east = Department.objects.create(code='DE', name='Est', region=cls.north)
+        cls.west = Department.objects.create(code='DW', name='Ouest', region=cls.north)
+        cls.count = Indicator.objects.create(
+            code='Q_COUNT', name='Effectif', sector='health', category='access', type=Indicator.Type.COUNT
+        )
+        cls.rate = Indicator.objects.create(
+            code='Q_RATE', name='Taux', sector='health', category='access', type=Indicator.Type.PERCENTAGE
+        )
+
+    def add(self, indicator, value, year=2020, region=None, department=None):
+        return IndicatorValue.objects.create(
+            indicator=indicator, region=region, department=department, year=year, value=value
+        ).id
+
+    def check(self, value_ids, deadlines=None):
+        """{(valeur, type de contrôle): (statut, détails)}"""
+        territories = Territories()
+        rows = list(IndicatorValue.objects.filter(id__in=value_ids).values_list(*COLUMNS))
+        checks = check_batch(
+            rows, Indicator.objects.in_bulk(), Coverage(territories), territories, deadlines or {}
+        )
+        return {
+            (check.indicator_value_id, check.check_type): (check.status, check.details)
+            for check in checks
+        }
+
+    def test_children_sum(self):
+        parent = self.add(self.count, 100, region=self.north)
+        self.add(self.count, 60, department=self.east)
+        west = self.add(self.count, 45, department=self.west)
+        status, details = self.check([parent])[(parent, CheckType.CONSISTENCY)]
+        self.assertEqual(status, Status.WARNING)
+        self.assertEqual((details['children_sum'], details['children']), (105.0, 2))
+
+        IndicatorValue.objects.filter(id=west).update(value=70)
+        self.assertEqual(self.check([parent])[(parent, CheckType.CONSISTENCY)][0], Status.FAILED)
+
+    def test_partial_children(self):
+        # Un seul enfant renseigné : seul un dépassement du parent est signalé
+        parent = self.add(self.count, 100, region=self.north)
+        east = self.add(self.count, 60, department=self.east)
+        self.assertEqual(self.check([parent])[(parent, CheckType.CONSISTENCY)][0], Status.PASSED)
+        IndicatorValue.objects.filter(id=east).update(value=120)
+        self.assertEqual(self.check([parent])[(parent, CheckType.CONSISTENCY)][0], Status.WARNING)
+
+    def test_percentage_range(self):
+        inside, outside = self.add(self.rate, 45, region=self.north), self.add(self.rate, 120, region=self.south)
+        checks = self.check([inside, outside])
+        self.assertEqual(checks[(inside, CheckType.CONSISTENCY)][0], Status.PASSED)
+        self.assertEqual(checks[(outside, CheckType.CONSISTENCY)][0], Status.FAILED)
+
+    def test_validity(self):
+        negative = self.add(self.count, -3, region=self.north)
+        fractional = self.add(self.count, 2.5, region=self.south)
+        checks = self.check([negative, fractional])
+        self.assertEqual(checks[(negative, CheckType.VALIDITY)][0], Status.FAILED)
+        self.assertEqual(checks[(fractional, CheckType.VALIDITY)][0], Status.WARNING)
+
+    def test_missing_years_and_territories(self):
+        self.add(self.count, 10, year=2017, region=self.south)
+        latest = self.add(self.count, 12, year=2019, region=self.south)
+        status, details = self.check([latest])[(latest, CheckType.COMPLETENESS)]
+        self.assertEqual(status, Status.WARNING)
+        self.assertEqual(
+            (details['first_year'], details['missing_years'], details['years']), (2017, 1, [2018])
+        )
+        self.assertEqual((details['covered'], details['total'], details['territories']), (1, 2, [self.north.id]))
 
-# Create your tests here.
+    def test_timeliness(self):
+        value_id = self.add(self.count, 10, region=self.north)
+        today = timezone.localdate()
+        for deadline, expected in (
+            (today, Status.PASSED),
+            (today - datetime.timedelta(days=10), Status.WARNING),
+            (today - datetime.timedelta(days=40), Status.FAILED),
+        ):
+            with self.subTest(deadline=deadline):
+                checks = self.check([value_id], {(self.count.id, 2020, ''): deadline})
+                self.assertEqual(checks[(value_id, CheckType.TIMELINESS)][0], expected)
+        self.assertNotIn((value_id, CheckType.TIMELINESS), self.check([value_id]))
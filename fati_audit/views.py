@@ -10,6 +10,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
+from fati_backend.pagination import KeysetPagination
 from .models import AuditLog, DataQualityCheck, SystemMetric
 from .serializers import (
     AuditLogSerializer,
@@ -20,10 +21,17 @@ from .serializers import (
 )
 
 
+class AuditLogPagination(KeysetPagination):
+    """Curseur sur (date, id), couvert par un index"""
+    
+    key = ('-created_at', '-id')
+
+
 class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet pour les journaux d'audit"""
     queryset = AuditLog.objects.all()
     serializer_class = AuditLogSerializer
+    pagination_class = AuditLogPagination
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['action', 'entity_type', 'user', 'user_role']
@@ -82,7 +90,9 @@ class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
 
 class DataQualityCheckViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet pour les vérifications de qualité"""
-    queryset = DataQualityCheck.objects.all()
+    queryset = DataQualityCheck.objects.select_related(
+        'indicator_value__indicator', 'indicator_value__region'
+    )
     serializer_class = DataQualityCheckSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
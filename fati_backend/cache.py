@@ -0,0 +1,91 @@
+"""
+FATI Backend - Cache versionné
+
+Chaque espace de noms possède un numéro de version stocké dans le cache.
+Les clés de résultats incluent cette version : incrémenter la version
+invalide d'un coup toutes les entrées de l'espace de noms.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+
+def _version_key(namespace):
+    return f'fati:{namespace}:version'
+
+
+def get_cache_version(namespace):
+    """Version courante d'un espace de noms"""
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        # Version initiale horodatée : une clé évincée ne ressuscite pas d'anciennes entrées
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(namespace):
+    """Invalider toutes les entrées d'un espace de noms"""
+    key = _version_key(namespace)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return get_cache_version(namespace)
+
+
+def versioned_cache_key(namespace, params=None):
+    """Clé de cache pour un jeu de paramètres dans la version courante"""
+    digest = hashlib.sha1(
+        json.dumps(params or {}, sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest()
+    return f'fati:{namespace}:{get_cache_version(namespace)}:{digest}'
+
+
+def get_or_compute(namespace, params, compute, timeout=None):
+    """Lire un résultat en cache ou le calculer puis le stocker"""
+    key = versioned_cache_key(namespace, params)
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        cache.set(key, result, timeout or settings.FATI_CACHE_TIMEOUT)
+    return result
+
+
+def cached_json_response(request, namespace, params, build):
+    """
+    Réponse JSON pré-rendue en cache (octets + ETag). ``If-None-Match``
+    correspondant à l'ETag courant renvoie un 304 sans corps.
+
+    Les octets ne sont servis tels quels qu'au rendu JSON négocié ; les
+    autres rendus (API navigable, ``?format=``) reçoivent une ``Response``
+    DRF construite depuis le cache, avec un ETag propre au format.
+    """
+    def render():
+        body = JSONRenderer().render(build())
+        return body, hashlib.sha1(body).hexdigest()
+    
+    body, digest = get_or_compute(namespace, params, render)
+    renderer = getattr(request, 'accepted_renderer', None)
+    raw = renderer is None or renderer.format == 'json'
+    etag = '"%s"' % digest if raw else '"%s-%s"' % (digest, renderer.format)
+    
+    if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    if '*' in if_none_match or etag in if_none_match:
+        response = HttpResponse(status=304)
+    elif raw:
+        response = HttpResponse(body, content_type='application/json')
+    else:
+        response = Response(json.loads(body))
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Accept'])
+    return response
@@ -0,0 +1,206 @@
+"""
+FATI Backend - Pagination par clé (keyset)
+
+La page suivante est sélectionnée par comparaison de lignes
+``(k1, k2, id) < (v1, v2, v3)`` sur une clé composite unique, couverte par
+un index : le coût d'une page ne dépend pas de sa profondeur.
+"""
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import F, Field, Func, Value
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class RowValue(Func):
+    """Constructeur de ligne SQL ``ROW(a, b, c)``"""
+
+    function = 'ROW'
+    output_field = Field()
+
+
+def _parse_bool(value, default=True):
+    if value is None:
+        return default
+    return value.lower() not in ('0', 'false', 'no', 'non')
+
+
+class CountablePageNumberPagination(PageNumberPagination):
+    """Pagination par numéro de page, ``?count=false`` évite le COUNT(*)"""
+
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.with_count = _parse_bool(request.query_params.get('count'))
+        if self.with_count:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            raise NotFound('Page invalide.')
+        if self.page_number < 1:
+            raise NotFound('Page invalide.')
+        offset = (self.page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        self.has_next = len(rows) > page_size
+        return rows[:page_size]
+
+    def get_paginated_response(self, data):
+        if self.with_count:
+            return super().get_paginated_response(data)
+        url = self.request.build_absolute_uri()
+        next_url = (
+            replace_query_param(url, self.page_query_param, self.page_number + 1)
+            if self.has_next else None
+        )
+        previous_url = None
+        if self.page_number > 1:
+            previous_url = replace_query_param(url, self.page_query_param, self.page_number - 1)
+        return Response({'next': next_url, 'previous': previous_url, 'results': data})
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagination par curseur sur une clé composite.
+
+    ``key`` : champs de tri, tous dans le même sens, le dernier unique
+    (``('-year', '-indicator_id', '-id')``). Le total n'est calculé que si
+    ``?count=true``. ``?page=`` reste accepté (pagination par numéro), de
+    même que ``?ordering=`` : le tri demandé est alors conservé.
+    """
+
+    key = ('-id',)
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+
+    def __init__(self):
+        self.page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+        descending = {field.startswith('-') for field in self.key}
+        if len(descending) != 1:
+            raise ValueError('Les champs de la clé doivent avoir le même sens de tri')
+        self.descending = descending.pop()
+        self.fields = [field.lstrip('-') for field in self.key]
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def _encode(self, values, reverse):
+        payload = json.dumps({'k': values, 'r': reverse}, default=_json_default)
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def _decode(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            values, reverse = payload['k'], bool(payload['r'])
+        except (binascii.Error, ValueError, KeyError, TypeError):
+            raise NotFound('Curseur invalide.')
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise NotFound('Curseur invalide.')
+        return values, reverse
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Tri demandé par le client (OrderingFilter) : la clé l'écraserait
+        if request.query_params.get('page') or request.query_params.get(api_settings.ORDERING_PARAM):
+            self.page_pagination = CountablePageNumberPagination()
+            return self.page_pagination.paginate_queryset(queryset, request, view)
+        self.page_pagination = None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        self.count = None
+        if _parse_bool(request.query_params.get('count'), default=False):
+            self.count = queryset.order_by().count()
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        position, reverse = (None, False) if not cursor else self._decode(cursor)
+
+        # Sens de parcours : en arrière, on inverse tri et comparaison
+        descending = self.descending != reverse
+        ordering = [f'-{field}' if descending else field for field in self.fields]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.alias(
+                _keyset=RowValue(*(F(field) for field in self.fields))
+            ).filter(**{
+                f'_keyset__{lookup}': RowValue(*(Value(value) for value in position))
+            })
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_position = self.previous_position = None
+        if rows:
+            first, last = self._position(rows[0]), self._position(rows[-1])
+            if reverse:
+                self.next_position = last
+                self.previous_position = first if has_more else None
+            else:
+                self.next_position = last if has_more else None
+                self.previous_position = first if position is not None else None
+        elif reverse:
+            self.next_position = position
+        return rows
+
+    def _position(self, instance):
+        return [getattr(instance, field) for field in self.fields]
+
+    def _link(self, position, reverse):
+        if position is None:
+            return None
+        url = remove_query_param(self.base_url, 'page')
+        return replace_query_param(url, self.cursor_query_param, self._encode(position, reverse))
+
+    def get_paginated_response(self, data):
+        if self.page_pagination is not None:
+            return self.page_pagination.get_paginated_response(data)
+        payload = {
+            'next': self._link(self.next_position, False),
+            'previous': self._link(self.previous_position, True),
+            'results': data,
+        }
+        if self.count is not None:
+            payload = {'count': self.count, **payload}
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {'type': 'integer'},
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'Valeur de curseur non sérialisable: {value!r}')
+
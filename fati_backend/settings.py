@@ -103,6 +103,27 @@ if 'postgis' not in DATABASES['default']['ENGINE']:
 
 
 
+# Cache (Redis si REDIS_URL est défini, mémoire locale sinon)
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'fati',
+        }
+    }
+
+# Durée de vie par défaut des résultats calculés mis en cache (secondes)
+FATI_CACHE_TIMEOUT = int(os.environ.get('FATI_CACHE_TIMEOUT', 3600))
+
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -0,0 +1,54 @@
+"""
+FATI Backend - Lots rattachés à la transaction
+
+Les éléments mis en lot sont liés au bloc ``atomic`` courant : le lot est
+transmis à ``transaction.on_commit`` par une fermeture, que Django abandonne
+(avec le lot) si le bloc ou son point de sauvegarde est annulé. Rien ne
+survit à un rollback et rien n'est écrit deux fois.
+"""
+import threading
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+_open = threading.local()
+
+
+def defer_batch(flush, items, using=DEFAULT_DB_ALIAS):
+    """
+    Ajouter ``items`` au lot de ``flush`` du bloc atomic courant.
+
+    ``flush(items)`` est appelé une fois par lot, après le commit ; hors
+    transaction, immédiatement.
+    """
+    items = list(items)
+    if not items:
+        return
+    connection = connections[using]
+    if not connection.in_atomic_block:
+        flush(items)
+        return
+
+    if not hasattr(_open, 'batches'):
+        _open.batches = {}
+    key = (using, flush)
+    batch = _open.batches.get(key)
+    if batch is not None:
+        position, callback, entries = batch
+        callbacks = connection.run_on_commit
+        # Rappel encore en attente et enregistré dans le même bloc : compléter le lot
+        if (position < len(callbacks) and callbacks[position][1] is callback
+                and callbacks[position][0] == set(connection.savepoint_ids)):
+            entries.extend(items)
+            return
+
+    entries = items
+
+    def callback():
+        # Lot exécuté : les ajouts suivants ouvrent un nouveau lot
+        if _open.batches.get(key, (None, None))[1] is callback:
+            del _open.batches[key]
+        flush(entries)
+
+    transaction.on_commit(callback, using=using)
+    _open.batches[key] = (len(connection.run_on_commit) - 1, callback, entries)
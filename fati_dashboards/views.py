@@ -1,7 +1,7 @@
 """
 FATI Dashboards - Views
 """
-from django.db.models import Q
+from django.db.models import Count, Q
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
@@ -143,9 +143,10 @@ class DashboardViewSet(viewsets.ModelViewSet):
     
     def _get_widget_data(self, widget, filters):
         """Récupérer les données pour un widget spécifique"""
-        from fati_indicators.models import Indicator, IndicatorValue
+        from fati_indicators.models import (
+            Indicator, IndicatorAggregate, IndicatorLatestValue
+        )
         from fati_workflows.models import Alert
-        from fati_facilities.models import Facility
         
         widget_type = widget.type
         
@@ -155,19 +156,32 @@ class DashboardViewSet(viewsets.ModelViewSet):
             if indicator_id:
                 try:
                     indicator = Indicator.objects.get(id=indicator_id)
-                    values = IndicatorValue.objects.filter(
+                    cells = IndicatorAggregate.objects.filter(
                         indicator=indicator,
-                        validation_status='validated'
+                        status='validated'
                     )
+                    # Dernière valeur : une lecture sur (indicateur, niveau, territoire)
                     if filters.get('region'):
-                        values = values.filter(region_id=filters['region'])
+                        cells = cells.filter(
+                            level=IndicatorAggregate.Level.REGION,
+                            territory_id=filters['region']
+                        )
+                        territory = (IndicatorAggregate.Level.REGION, filters['region'])
+                    else:
+                        cells = cells.filter(level=IndicatorAggregate.Level.ALL)
+                        territory = (IndicatorAggregate.Level.NATIONAL, 0)
                     
-                    latest = values.order_by('-period').first()
+                    latest = IndicatorLatestValue.objects.filter(
+                        indicator=indicator,
+                        level=territory[0],
+                        territory_id=territory[1]
+                    ).first()
                     if latest:
                         return {
                             'value': latest.value,
+                            'year': latest.year,
                             'period': latest.period,
-                            'trend': self._calculate_trend(values)
+                            'trend': self._calculate_trend(cells)
                         }
                 except Indicator.DoesNotExist:
                     pass
@@ -190,6 +204,7 @@ class DashboardViewSet(viewsets.ModelViewSet):
         
         elif widget_type == 'facility_list':
             # Liste de structures
+            from fati_facilities.models import Facility
             facilities = Facility.objects.filter(is_active=True)
             if filters.get('region'):
                 facilities = facilities.filter(region_id=filters['region'])
@@ -205,15 +220,17 @@ class DashboardViewSet(viewsets.ModelViewSet):
         
         return {}
     
-    def _calculate_trend(self, values_qs):
-        """Calculer la tendance d'un indicateur"""
-        values = list(values_qs.order_by('-period')[:2])
+    def _calculate_trend(self, cells_qs):
+        """Calculer la tendance d'un indicateur à partir des cellules du cube"""
+        values = list(
+            cells_qs.order_by('-year', '-period').values_list('latest_value', flat=True)[:2]
+        )
         if len(values) < 2:
             return 'stable'
         
-        if values[0].value > values[1].value:
+        if values[0] > values[1]:
             return 'up'
-        elif values[0].value < values[1].value:
+        elif values[0] < values[1]:
             return 'down'
         return 'stable'
 
@@ -319,9 +336,11 @@ class DashboardDataViewSet(viewsets.ViewSet):
     
     def list(self, request):
         """Récupérer les données pour le dashboard principal"""
-        from fati_indicators.models import Indicator, IndicatorValue
+        from fati_indicators.models import (
+            Indicator, IndicatorAggregate, IndicatorLatestValue, IndicatorValue
+        )
         from fati_workflows.models import Alert
-        from fati_facilities.models import Facility
+        from fati_facilities.models import EducationFacility, HealthFacility
         from fati_accounts.models import User
         from fati_geography.models import Region
         from fati_audit.models import AuditLog
@@ -336,7 +355,7 @@ class DashboardDataViewSet(viewsets.ViewSet):
             indicators_qs = indicators_qs.filter(sector=sector)
         
         values_qs = IndicatorValue.objects.filter(
-            validation_status='validated'
+            status='validated'
         )
         if sector:
             values_qs = values_qs.filter(indicator__sector=sector)
@@ -357,7 +376,10 @@ class DashboardDataViewSet(viewsets.ViewSet):
             },
             {
                 'title': 'Structures',
-                'value': Facility.objects.filter(is_active=True).count(),
+                'value': (
+                    HealthFacility.objects.filter(is_active=True).count()
+                    + EducationFacility.objects.filter(is_active=True).count()
+                ),
                 'icon': 'building'
             },
             {
@@ -368,16 +390,34 @@ class DashboardDataViewSet(viewsets.ViewSet):
             }
         ]
         
-        # Données de carte
-        regions_data = []
-        for region in Region.objects.all():
-            region_values = values_qs.filter(region=region)
-            regions_data.append({
+        # Données de carte : effectifs groupés et dernières valeurs maintenues
+        data_points = dict(
+            values_qs.order_by().values('region_id').annotate(
+                count=Count('id')
+            ).values_list('region_id', 'count')
+        )
+        latest_values = IndicatorLatestValue.objects.filter(
+            level=IndicatorAggregate.Level.REGION
+        )
+        if sector:
+            latest_values = latest_values.filter(indicator__sector=sector)
+        if region_id:
+            latest_values = latest_values.filter(territory_id=region_id)
+        latest_by_region = {}
+        for territory_id, value in latest_values.order_by(
+            'territory_id', 'year', 'period', 'refreshed_at'
+        ).values_list('territory_id', 'value'):
+            latest_by_region[territory_id] = value
+        
+        regions_data = [
+            {
                 'region_id': region.id,
                 'region_name': region.name,
-                'data_points': region_values.count(),
-                'value': region_values.order_by('-period').first().value if region_values.exists() else None
-            })
+                'data_points': data_points.get(region.id, 0),
+                'value': latest_by_region.get(region.id)
+            }
+            for region in Region.objects.only('id', 'name')
+        ]
         
         # Activité récente
         recent_activity = AuditLog.objects.all()[:10]
@@ -5,3 +5,6 @@ class FatiFacilitiesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'fati_facilities'
     verbose_name = 'FATI - Facilities'
+    
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,15 @@
+"""
+FATI Facilities - Signaux
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from fati_backend.cache import bump_cache_version
+from .models import EducationFacility, HealthFacility
+
+
+@receiver([post_save, post_delete], sender=HealthFacility)
+@receiver([post_save, post_delete], sender=EducationFacility)
+def invalidate_facility_statistics(sender, **kwargs):
+    """Invalider les statistiques en cache après une écriture"""
+    bump_cache_version(f'facility_stats:{sender._meta.model_name}')
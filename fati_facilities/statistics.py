@@ -0,0 +1,117 @@
+"""
+FATI Facilities - Statistiques groupées
+
+Toutes les ventilations demandées sont calculées en une seule requête
+``GROUP BY GROUPING SETS`` ; la fonction ``GROUPING()`` indique à quel
+ensemble appartient chaque ligne du résultat.
+"""
+from django.db import connection
+
+from fati_geography.models import Commune, Department, Region
+
+
+# Dimensions communes : nom -> colonnes (expression SQL, alias)
+FACILITY_DIMENSIONS = {
+    'region': (('r.id', 'region_id'), ('r.name', 'region_name')),
+    'department': (('d.id', 'department_id'), ('d.name', 'department_name')),
+    'commune': (('c.id', 'commune_id'), ('c.name', 'commune_name')),
+    'type': (('f.facility_type', 'facility_type'),),
+    'is_active': (('f.is_active', 'is_active'),),
+}
+
+GEOGRAPHIC_DIMENSIONS = {'region', 'department', 'commune'}
+
+
+def parse_group_by(raw, dimensions):
+    """
+    Analyser ``group_by`` : les ensembles sont séparés par des virgules,
+    les dimensions croisées d'un même ensemble par ``+`` (ex. ``region+type``).
+    """
+    grouping_sets = []
+    for item in (raw or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        dims = tuple(dim.strip() for dim in item.split('+') if dim.strip())
+        unknown = [dim for dim in dims if dim not in dimensions]
+        if unknown:
+            raise ValueError(
+                f"Dimension(s) inconnue(s): {', '.join(unknown)} "
+                f"(disponibles: {', '.join(dimensions)})"
+            )
+        if dims and dims not in grouping_sets:
+            grouping_sets.append(dims)
+    return grouping_sets
+
+
+def grouped_statistics(queryset, grouping_sets, dimensions, capacity_column):
+    """
+    Compter les structures (et sommer leur capacité) pour chaque ensemble
+    de regroupement, plus le total, en une seule requête.
+    """
+    used = []
+    for grouping_set in grouping_sets:
+        for dim in grouping_set:
+            if dim not in used:
+                used.append(dim)
+
+    select = []
+    for dim in used:
+        select.extend(f'{expr} AS {alias}' for expr, alias in dimensions[dim])
+    select.extend(f'GROUPING({dimensions[dim][0][0]}) AS grouping_{dim}' for dim in used)
+    select.append('COUNT(*) AS count')
+    select.append(f'COALESCE(SUM(f.{capacity_column}), 0) AS capacity')
+
+    sets_sql = [
+        '(' + ', '.join(expr for dim in grouping_set for expr, _ in dimensions[dim]) + ')'
+        for grouping_set in grouping_sets
+    ]
+    sets_sql.append('()')
+
+    joins = ''
+    if GEOGRAPHIC_DIMENSIONS.intersection(used):
+        joins = (
+            f'JOIN {Commune._meta.db_table} c ON c.id = f.commune_id '
+            f'JOIN {Department._meta.db_table} d ON d.id = c.department_id '
+            f'JOIN {Region._meta.db_table} r ON r.id = d.region_id'
+        )
+
+    # Les filtres de la vue sont appliqués via le queryset compilé en sous-requête
+    subquery, params = queryset.order_by().values('id').query.sql_with_params()
+    sql = (
+        f'SELECT {", ".join(select)} '
+        f'FROM {queryset.model._meta.db_table} f {joins} '
+        f'WHERE f.id IN ({subquery}) '
+        f'GROUP BY GROUPING SETS ({", ".join(sets_sql)})'
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = [col[0] for col in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    set_names = {frozenset(grouping_set): '+'.join(grouping_set) for grouping_set in grouping_sets}
+    result = {
+        'total': 0,
+        'capacity': 0,
+        'breakdowns': {name: [] for name in set_names.values()},
+    }
+    for row in rows:
+        grouped = frozenset(dim for dim in used if row[f'grouping_{dim}'] == 0)
+        if not grouped:
+            result['total'] = row['count']
+            result['capacity'] = row['capacity']
+            continue
+        name = set_names[grouped]
+        entry = {
+            alias: row[alias]
+            for dim in name.split('+')
+            for _, alias in dimensions[dim]
+        }
+        entry['count'] = row['count']
+        entry['capacity'] = row['capacity']
+        result['breakdowns'][name].append(entry)
+
+    for entries in result['breakdowns'].values():
+        entries.sort(key=lambda entry: entry['count'], reverse=True)
+    return result
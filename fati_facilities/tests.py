@@ -61,3 +61,94 @@ class FacilitySerializerTest(TestCase):
         self.assertIsInstance(facility.location, Point)
         self.assertEqual(facility.location.x, -17.500)
         self.assertEqual(facility.location.y, 14.700)
+
+
+class FacilityExportTest(TestCase):
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from fati_accounts.models import User
+
+        region = Region.objects.create(name="Export Region", code="EXR")
+        department = Department.objects.create(name="Export Dept", code="EXD", region=region)
+        commune = Commune.objects.create(name="Export Commune", code="EXC", department=department)
+        for index in range(3):
+            HealthFacility.objects.create(
+                code=f'EXP_{index}',
+                name=f'Poste {index}',
+                facility_type='health_post',
+                commune=commune,
+                location=Point(-17.4 + index * 0.1, 14.7)
+            )
+        HealthFacility.objects.create(
+            code='EXP_NOLOC', name='Sans position', facility_type='clinic', commune=commune
+        )
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(
+            email='export@fati.sn', first_name='Export', last_name='Test', password='x'
+        ))
+
+    def test_flatgeobuf_export_has_magic_and_index(self):
+        response = self.client.get('/api/facilities/health/export/', {'format': 'fgb'})
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content)
+        self.assertTrue(content.startswith(b'fgb\x03fgb\x00'))
+
+    def test_geopackage_export_is_sqlite(self):
+        response = self.client.get('/api/facilities/health/export/', {'format': 'gpkg'})
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content)
+        self.assertTrue(content.startswith(b'SQLite format 3\x00'))
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get('/api/facilities/health/export/', {'format': 'shp'})
+        self.assertEqual(response.status_code, 400)
+
+
+class FacilityStatisticsTest(TestCase):
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from fati_accounts.models import User
+
+        dakar = Region.objects.create(name="Dakar", code="DK")
+        thies = Region.objects.create(name="Thiès", code="TH")
+        for region, count in ((dakar, 3), (thies, 2)):
+            department = Department.objects.create(name=f"Dept {region.code}", code=f"D{region.code}", region=region)
+            commune = Commune.objects.create(name=f"Com {region.code}", code=f"C{region.code}", department=department)
+            for index in range(count):
+                HealthFacility.objects.create(
+                    code=f'{region.code}_{index}',
+                    name=f'Structure {index}',
+                    facility_type='hospital' if index == 0 else 'health_post',
+                    commune=commune,
+                    bed_capacity=10
+                )
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(
+            email='stats@fati.sn', first_name='Stats', last_name='Test', password='x'
+        ))
+
+    def test_grouping_sets_breakdowns(self):
+        response = self.client.get(
+            '/api/facilities/health/statistics/', {'group_by': 'region,type,region+type'}
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['total'], 5)
+        self.assertEqual(data['capacity'], 50)
+        by_region = {entry['region_name']: entry['count'] for entry in data['breakdowns']['region']}
+        self.assertEqual(by_region, {'Dakar': 3, 'Thiès': 2})
+        self.assertEqual(len(data['breakdowns']['region+type']), 4)
+
+    def test_cache_is_invalidated_on_write(self):
+        url = '/api/facilities/health/statistics/'
+        self.assertEqual(self.client.get(url).json()['total'], 5)
+        HealthFacility.objects.filter(code='DK_0').delete()
+        self.assertEqual(self.client.get(url).json()['total'], 4)
+
+    def test_unknown_dimension_is_rejected(self):
+        response = self.client.get('/api/facilities/health/statistics/', {'group_by': 'level'})
+        self.assertEqual(response.status_code, 400)
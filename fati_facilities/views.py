@@ -5,6 +5,13 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from fati_backend.cache import get_or_compute
+from fati_geography.exports import (
+    ExportContentNegotiation,
+    ExportField,
+    ExportLayer,
+    export_layer_response
+)
 from .models import HealthFacility, EducationFacility, Equipment, Staff
 from .serializers import (
     HealthFacilitySerializer,
@@ -12,9 +19,77 @@ from .serializers import (
     EquipmentSerializer,
     StaffSerializer
 )
+from .statistics import FACILITY_DIMENSIONS, grouped_statistics, parse_group_by
+
+
+FACILITY_EXPORT_FIELDS = [
+    ExportField('id', 'long'),
+    ExportField('code', 'string'),
+    ExportField('name', 'string'),
+    ExportField('facility_type', 'string'),
+    ExportField('commune_code', 'string', 'commune__code'),
+    ExportField('commune_name', 'string', 'commune__name'),
+    ExportField('department_name', 'string', 'commune__department__name'),
+    ExportField('region_name', 'string', 'commune__department__region__name'),
+    ExportField('address', 'string'),
+    ExportField('phone', 'string'),
+    ExportField('is_active', 'bool'),
+    ExportField('updated_at', 'datetime'),
+]
 
+HEALTH_FACILITY_EXPORT_FIELDS = FACILITY_EXPORT_FIELDS + [
+    ExportField('category', 'string'),
+    ExportField('manager_name', 'string'),
+    ExportField('bed_capacity', 'int'),
+    ExportField('services', 'json'),
+]
 
-class HealthFacilityViewSet(viewsets.ModelViewSet):
+EDUCATION_FACILITY_EXPORT_FIELDS = FACILITY_EXPORT_FIELDS + [
+    ExportField('level', 'string'),
+    ExportField('principal_name', 'string'),
+    ExportField('student_capacity', 'int'),
+]
+
+
+class FacilityStatisticsMixin:
+    """Statistiques groupées des structures (GROUPING SETS, mises en cache)"""
+    
+    statistics_dimensions = FACILITY_DIMENSIONS
+    capacity_column = None
+    
+    @action(detail=False, methods=['get'])
+    def statistics(self, request):
+        """Statistiques des structures (?group_by=region,type,region+type,...)"""
+        raw_group_by = request.query_params.get('group_by', 'type')
+        try:
+            grouping_sets = parse_group_by(raw_group_by, self.statistics_dimensions)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        params = {
+            'group_by': grouping_sets,
+            'filters': {
+                field: request.query_params.getlist(field)
+                for field in self.filterset_fields
+                if field in request.query_params
+            },
+        }
+        data = get_or_compute(
+            f'facility_stats:{queryset.model._meta.model_name}',
+            params,
+            lambda: grouped_statistics(
+                queryset, grouping_sets, self.statistics_dimensions, self.capacity_column
+            )
+        )
+        
+        # Compatibilité : ancienne clé by_type
+        if 'type' in data['breakdowns']:
+            data = dict(data, by_type=data['breakdowns']['type'])
+        return Response(data)
+
+
+class HealthFacilityViewSet(FacilityStatisticsMixin, viewsets.ModelViewSet):
     """ViewSet pour les structures de santé"""
     
     queryset = HealthFacility.objects.select_related('commune').all()
@@ -22,6 +97,11 @@ class HealthFacilityViewSet(viewsets.ModelViewSet):
     filterset_fields = ['facility_type', 'category', 'commune', 'is_active']
     filter_backends = [DjangoFilterBackend]
     search_fields = ['name', 'code', 'address']
+    statistics_dimensions = dict(
+        FACILITY_DIMENSIONS,
+        category=(('f.category', 'category'),)
+    )
+    capacity_column = 'bed_capacity'
     
     @action(detail=True, methods=['get'])
     def equipment(self, request, pk=None):
@@ -55,21 +135,20 @@ class HealthFacilityViewSet(viewsets.ModelViewSet):
         serializer = HealthFacilitySerializer(facilities, many=True)
         return Response(serializer.data)
     
-    @action(detail=False, methods=['get'])
-    def statistics(self, request):
-        """Statistiques des structures de santé"""
-        total = self.queryset.count()
-        by_type = self.queryset.values('facility_type').annotate(
-            count=Count('id')
+    @action(detail=False, methods=['get'], content_negotiation_class=ExportContentNegotiation)
+    def export(self, request):
+        """Exporter les structures de santé (?format=fgb|gpkg)"""
+        layer = ExportLayer(
+            'health_facilities',
+            self.filter_queryset(self.get_queryset()),
+            'location',
+            'Point',
+            HEALTH_FACILITY_EXPORT_FIELDS
         )
-        
-        return Response({
-            'total': total,
-            'by_type': list(by_type)
-        })
+        return export_layer_response(request, layer)
 
 
-class EducationFacilityViewSet(viewsets.ModelViewSet):
+class EducationFacilityViewSet(FacilityStatisticsMixin, viewsets.ModelViewSet):
     """ViewSet pour les établissements d'enseignement"""
     
     queryset = EducationFacility.objects.select_related('commune').all()
@@ -77,6 +156,11 @@ class EducationFacilityViewSet(viewsets.ModelViewSet):
     filterset_fields = ['facility_type', 'level', 'commune', 'is_active']
     filter_backends = [DjangoFilterBackend]
     search_fields = ['name', 'code', 'address']
+    statistics_dimensions = dict(
+        FACILITY_DIMENSIONS,
+        level=(('f.level', 'level'),)
+    )
+    capacity_column = 'student_capacity'
     
     @action(detail=True, methods=['get'])
     def staff(self, request, pk=None):
@@ -102,18 +186,17 @@ class EducationFacilityViewSet(viewsets.ModelViewSet):
         serializer = EducationFacilitySerializer(facilities, many=True)
         return Response(serializer.data)
     
-    @action(detail=False, methods=['get'])
-    def statistics(self, request):
-        """Statistiques des établissements"""
-        total = self.queryset.count()
-        by_type = self.queryset.values('facility_type').annotate(
-            count=Count('id')
+    @action(detail=False, methods=['get'], content_negotiation_class=ExportContentNegotiation)
+    def export(self, request):
+        """Exporter les établissements d'enseignement (?format=fgb|gpkg)"""
+        layer = ExportLayer(
+            'education_facilities',
+            self.filter_queryset(self.get_queryset()),
+            'location',
+            'Point',
+            EDUCATION_FACILITY_EXPORT_FIELDS
         )
-        
-        return Response({
-            'total': total,
-            'by_type': list(by_type)
-        })
+        return export_layer_response(request, layer)
 
 
 class EquipmentViewSet(viewsets.ModelViewSet):
@@ -130,7 +213,3 @@ class StaffViewSet(viewsets.ModelViewSet):
     queryset = Staff.objects.all()
     serializer_class = StaffSerializer
     filterset_fields = ['category']
-
-
-# Import manquant
-from django.db.models import Count
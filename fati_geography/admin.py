@@ -3,7 +3,7 @@ FATI Geography - Admin Configuration
 """
 from django.contrib import admin
 from django.contrib.gis.admin import GISModelAdmin
-from .models import Region, Department, Commune
+from .models import Region, Department, Commune, TerritoryAlias
 
 
 @admin.register(Region)
@@ -57,3 +57,13 @@ class CommuneAdmin(GISModelAdmin):
             'default_lat': 14.5,
         }
     }
+
+
+@admin.register(TerritoryAlias)
+class TerritoryAliasAdmin(admin.ModelAdmin):
+    """Configuration admin pour les alias de territoires"""
+    
+    list_display = ['alias', 'normalized', 'region', 'department', 'commune', 'created_at']
+    search_fields = ['alias', 'normalized']
+    readonly_fields = ['normalized']
+    raw_id_fields = ['department', 'commune']
@@ -0,0 +1,575 @@
+"""
+FATI Geography - Export SIG (FlatGeobuf et GeoPackage)
+
+Les couches sont lues depuis un curseur serveur (``.iterator()``) et écrites
+ligne par ligne : le queryset n'est jamais matérialisé en mémoire.
+"""
+import itertools
+import json
+import math
+import os
+import sqlite3
+import struct
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+
+import flatbuffers
+import numpy as np
+from django.db import transaction
+from django.http import FileResponse, StreamingHttpResponse
+from rest_framework import status
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.response import Response
+
+
+EXPORT_CHUNK_SIZE = 2000
+STREAM_BLOCK_SIZE = 64 * 1024
+
+FGB_MAGIC = b'fgb\x03fgb\x00'
+FGB_INDEX_NODE_SIZE = 16
+FGB_NODE_DTYPE = np.dtype([
+    ('min_x', '<f8'), ('min_y', '<f8'),
+    ('max_x', '<f8'), ('max_y', '<f8'),
+    ('offset', '<u8'),
+])
+
+# Types de géométrie FlatGeobuf
+GEOMETRY_TYPES = {
+    'Point': 1,
+    'LineString': 2,
+    'Polygon': 3,
+    'MultiPoint': 4,
+    'MultiLineString': 5,
+    'MultiPolygon': 6,
+}
+
+# Types de colonnes : (code FlatGeobuf, format struct, type SQLite)
+COLUMN_TYPES = {
+    'bool': (2, '<B', 'BOOLEAN'),
+    'int': (5, '<i', 'INTEGER'),
+    'long': (7, '<q', 'INTEGER'),
+    'double': (10, '<d', 'REAL'),
+    'string': (11, None, 'TEXT'),
+    'json': (12, None, 'TEXT'),
+    'datetime': (13, None, 'DATETIME'),
+}
+
+EXPORT_FORMATS = {
+    'fgb': ('application/flatgeobuf', 'fgb'),
+    'gpkg': ('application/geopackage+sqlite3', 'gpkg'),
+}
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """
+    Négociation ignorant le paramètre ``format`` : il désigne ici le format
+    du fichier exporté et non un renderer DRF.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderer = renderers[0]
+        return renderer, renderer.media_type
+
+
+class ExportField:
+    """Colonne d'une couche exportée"""
+
+    def __init__(self, name, type, lookup=None):
+        if type not in COLUMN_TYPES:
+            raise ValueError(f"Type de colonne inconnu: {type}")
+        self.name = name
+        self.type = type
+        self.lookup = lookup or name
+
+
+class ExportLayer:
+    """Couche exportable : queryset, champ géométrique et colonnes"""
+
+    def __init__(self, name, queryset, geometry_field, geometry_type, fields, srid=4326):
+        self.name = name
+        self.queryset = queryset.filter(**{f'{geometry_field}__isnull': False})
+        self.geometry_field = geometry_field
+        self.geometry_type = geometry_type
+        self.fields = fields
+        self.srid = srid
+
+    def rows(self):
+        """Itérer sur (géométrie, valeurs...) via un curseur serveur"""
+        lookups = [field.lookup for field in self.fields]
+        return self.queryset.order_by().values_list(
+            self.geometry_field, *lookups
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+# ----------------------------------------------------------------------
+# FlatGeobuf
+# ----------------------------------------------------------------------
+
+def _encode_properties(fields, values):
+    """Encoder les attributs au format binaire FlatGeobuf"""
+    buffer = bytearray()
+    for index, (field, value) in enumerate(zip(fields, values)):
+        if value is None:
+            continue
+        buffer += struct.pack('<H', index)
+        fmt = COLUMN_TYPES[field.type][1]
+        if fmt:
+            buffer += struct.pack(fmt, value)
+            continue
+        if field.type == 'datetime':
+            text = value.isoformat()
+        elif field.type == 'json':
+            text = json.dumps(value, ensure_ascii=False)
+        else:
+            text = str(value)
+        data = text.encode('utf-8')
+        buffer += struct.pack('<I', len(data)) + data
+    return bytes(buffer)
+
+
+def _build_geometry(builder, geometry_type, coords):
+    """Construire la table Geometry FlatGeobuf à partir des coordonnées GEOS"""
+    if geometry_type == GEOMETRY_TYPES['MultiPolygon']:
+        parts = [
+            _build_geometry(builder, GEOMETRY_TYPES['Polygon'], polygon)
+            for polygon in coords
+        ]
+        builder.StartVector(4, len(parts), 4)
+        for part in reversed(parts):
+            builder.PrependUOffsetTRelative(part)
+        parts_vector = builder.EndVector()
+        builder.StartObject(8)
+        builder.PrependUOffsetTRelativeSlot(7, parts_vector, 0)
+        builder.PrependUint8Slot(6, geometry_type, 0)
+        return builder.EndObject()
+
+    if geometry_type == GEOMETRY_TYPES['Point']:
+        rings = [[coords]]
+    elif geometry_type in (GEOMETRY_TYPES['LineString'], GEOMETRY_TYPES['MultiPoint']):
+        rings = [coords]
+    else:
+        rings = coords
+
+    xy = np.array(
+        [point[:2] for ring in rings for point in ring], dtype='<f8'
+    ).ravel()
+    xy_vector = builder.CreateNumpyVector(xy)
+    ends_vector = None
+    if len(rings) > 1 and geometry_type != GEOMETRY_TYPES['MultiPoint']:
+        ends = np.cumsum([len(ring) for ring in rings]).astype('<u4')
+        ends_vector = builder.CreateNumpyVector(ends)
+
+    builder.StartObject(8)
+    if ends_vector is not None:
+        builder.PrependUOffsetTRelativeSlot(0, ends_vector, 0)
+    builder.PrependUOffsetTRelativeSlot(1, xy_vector, 0)
+    builder.PrependUint8Slot(6, geometry_type, 0)
+    return builder.EndObject()
+
+
+def encode_feature(geometry_type, coords, properties):
+    """Encoder une entité FlatGeobuf (préfixée par sa taille)"""
+    builder = flatbuffers.Builder(256)
+    geometry = _build_geometry(builder, geometry_type, coords)
+    properties_vector = builder.CreateByteVector(properties) if properties else None
+    builder.StartObject(3)
+    builder.PrependUOffsetTRelativeSlot(0, geometry, 0)
+    if properties_vector is not None:
+        builder.PrependUOffsetTRelativeSlot(1, properties_vector, 0)
+    builder.FinishSizePrefixed(builder.EndObject())
+    return bytes(builder.Output())
+
+
+def encode_header(layer, features_count=0, envelope=None, index_node_size=0):
+    """Encoder l'en-tête FlatGeobuf (préfixé par sa taille)"""
+    builder = flatbuffers.Builder(1024)
+    name = builder.CreateString(layer.name)
+
+    columns = []
+    for field in layer.fields:
+        column_name = builder.CreateString(field.name)
+        builder.StartObject(11)
+        builder.PrependUOffsetTRelativeSlot(0, column_name, 0)
+        builder.PrependUint8Slot(1, COLUMN_TYPES[field.type][0], 0)
+        columns.append(builder.EndObject())
+    builder.StartVector(4, len(columns), 4)
+    for column in reversed(columns):
+        builder.PrependUOffsetTRelative(column)
+    columns_vector = builder.EndVector()
+
+    envelope_vector = None
+    if envelope is not None:
+        envelope_vector = builder.CreateNumpyVector(np.asarray(envelope, dtype='<f8'))
+
+    org = builder.CreateString('EPSG')
+    builder.StartObject(6)
+    builder.PrependUOffsetTRelativeSlot(0, org, 0)
+    builder.PrependInt32Slot(1, layer.srid, 0)
+    crs = builder.EndObject()
+
+    builder.StartObject(14)
+    builder.PrependUOffsetTRelativeSlot(0, name, 0)
+    if envelope_vector is not None:
+        builder.PrependUOffsetTRelativeSlot(1, envelope_vector, 0)
+    builder.PrependUint8Slot(2, GEOMETRY_TYPES[layer.geometry_type], 0)
+    builder.PrependUOffsetTRelativeSlot(7, columns_vector, 0)
+    builder.PrependUint64Slot(8, features_count, 0)
+    builder.PrependUint16Slot(9, index_node_size, FGB_INDEX_NODE_SIZE)
+    builder.PrependUOffsetTRelativeSlot(10, crs, 0)
+    builder.FinishSizePrefixed(builder.EndObject())
+    return bytes(builder.Output())
+
+
+def hilbert(x, y):
+    """Valeur de Hilbert (16 bits par axe) vectorisée sur des tableaux uint32"""
+    x = x.astype(np.uint32)
+    y = y.astype(np.uint32)
+    mask = np.uint32(0xFFFF)
+
+    a = x ^ y
+    b = mask ^ a
+    c = mask ^ (x | y)
+    d = x & (y ^ mask)
+
+    A = a | (b >> 1)
+    B = (a >> 1) ^ a
+    C = ((c >> 1) ^ (b & (d >> 1))) ^ c
+    D = ((a & (c >> 1)) ^ (d >> 1)) ^ d
+
+    for shift in (2, 4):
+        a, b, c, d = A, B, C, D
+        A = (a & (a >> shift)) ^ (b & (b >> shift))
+        B = (a & (b >> shift)) ^ (b & ((a ^ b) >> shift))
+        C = C ^ ((a & (c >> shift)) ^ (b & (d >> shift)))
+        D = D ^ ((b & (c >> shift)) ^ ((a ^ b) & (d >> shift)))
+
+    a, b, c, d = A, B, C, D
+    C = C ^ ((a & (c >> 8)) ^ (b & (d >> 8)))
+    D = D ^ ((b & (c >> 8)) ^ ((a ^ b) & (d >> 8)))
+
+    a = C ^ (C >> 1)
+    b = D ^ (D >> 1)
+
+    i0 = x ^ y
+    i1 = b | (mask ^ (i0 | a))
+    for shift, spread in ((8, 0x00FF00FF), (4, 0x0F0F0F0F), (2, 0x33333333), (1, 0x55555555)):
+        i0 = (i0 | (i0 << shift)) & np.uint32(spread)
+        i1 = (i1 | (i1 << shift)) & np.uint32(spread)
+    return (i1 << 1) | i0
+
+
+def _level_bounds(num_items, node_size):
+    """Bornes [début, fin) de chaque niveau de l'arbre, des feuilles à la racine"""
+    n = num_items
+    level_sizes = [n]
+    while True:
+        n = math.ceil(n / node_size)
+        level_sizes.append(n)
+        if n == 1:
+            break
+    num_nodes = sum(level_sizes)
+    bounds = []
+    end = num_nodes
+    for size in level_sizes:
+        bounds.append((end - size, end))
+        end -= size
+    return bounds, num_nodes
+
+
+def build_packed_rtree(boxes, offsets, node_size=FGB_INDEX_NODE_SIZE):
+    """
+    Construire l'index R-tree packé de Hilbert à partir des emprises des
+    entités (déjà triées) et de leurs positions dans la section des entités.
+    """
+    bounds, num_nodes = _level_bounds(len(boxes), node_size)
+    nodes = np.zeros(num_nodes, dtype=FGB_NODE_DTYPE)
+
+    leaf_start, leaf_end = bounds[0]
+    leaves = nodes[leaf_start:leaf_end]
+    leaves['min_x'], leaves['min_y'] = boxes[:, 0], boxes[:, 1]
+    leaves['max_x'], leaves['max_y'] = boxes[:, 2], boxes[:, 3]
+    leaves['offset'] = offsets
+
+    for (start, end), (parent_start, parent_end) in zip(bounds, bounds[1:]):
+        children = nodes[start:end]
+        groups = np.arange(0, end - start, node_size)
+        parents = nodes[parent_start:parent_end]
+        parents['min_x'] = np.minimum.reduceat(children['min_x'], groups)
+        parents['min_y'] = np.minimum.reduceat(children['min_y'], groups)
+        parents['max_x'] = np.maximum.reduceat(children['max_x'], groups)
+        parents['max_y'] = np.maximum.reduceat(children['max_y'], groups)
+        parents['offset'] = start + groups
+    return nodes.tobytes()
+
+
+def _spool_features(layer):
+    """Première passe : encoder les entités dans un fichier temporaire"""
+    geometry_type = GEOMETRY_TYPES[layer.geometry_type]
+    spool = tempfile.TemporaryFile()
+    entries = []
+    with transaction.atomic():
+        for geometry, *values in layer.rows():
+            if geometry.empty:
+                continue
+            data = encode_feature(
+                geometry_type, geometry.coords, _encode_properties(layer.fields, values)
+            )
+            entries.append((*geometry.extent, spool.tell(), len(data)))
+            spool.write(data)
+    return spool, np.array(entries, dtype='<f8').reshape(-1, 6)
+
+
+def _read_blocks(spool, positions, lengths):
+    """Relire les entités du fichier temporaire dans l'ordre demandé"""
+    try:
+        block = bytearray()
+        for position, length in zip(positions, lengths):
+            spool.seek(int(position))
+            block += spool.read(int(length))
+            if len(block) >= STREAM_BLOCK_SIZE:
+                yield bytes(block)
+                block = bytearray()
+        if block:
+            yield bytes(block)
+    finally:
+        spool.close()
+
+
+def iter_flatgeobuf(layer):
+    """
+    Produire un FlatGeobuf avec index spatial (entités triées par Hilbert).
+
+    L'index précède les entités dans le fichier : la première passe encode
+    les entités dans un fichier temporaire, seules leurs emprises restent
+    en mémoire, puis le fichier est relu dans l'ordre de Hilbert.
+    """
+    spool, entries = _spool_features(layer)
+    if not len(entries):
+        spool.close()
+        return iter([FGB_MAGIC + encode_header(layer)])
+
+    boxes = entries[:, :4]
+    envelope = (
+        boxes[:, 0].min(), boxes[:, 1].min(),
+        boxes[:, 2].max(), boxes[:, 3].max(),
+    )
+    width = (envelope[2] - envelope[0]) or 1.0
+    height = (envelope[3] - envelope[1]) or 1.0
+    hilbert_max = (1 << 16) - 1
+    centers_x = hilbert_max * ((boxes[:, 0] + boxes[:, 2]) / 2 - envelope[0]) / width
+    centers_y = hilbert_max * ((boxes[:, 1] + boxes[:, 3]) / 2 - envelope[1]) / height
+    values = hilbert(np.floor(centers_x), np.floor(centers_y)).astype(np.int64)
+    order = np.argsort(-values, kind='stable')
+
+    sorted_entries = entries[order]
+    lengths = sorted_entries[:, 5].astype(np.uint64)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.uint64)
+
+    header = FGB_MAGIC + encode_header(
+        layer,
+        features_count=len(entries),
+        envelope=envelope,
+        index_node_size=FGB_INDEX_NODE_SIZE,
+    )
+    index = build_packed_rtree(sorted_entries[:, :4], offsets)
+    return itertools.chain(
+        (header, index),
+        _read_blocks(spool, sorted_entries[:, 4], lengths)
+    )
+
+
+def iter_flatgeobuf_unindexed(layer):
+    """Produire un FlatGeobuf sans index, en flux direct depuis le curseur"""
+    geometry_type = GEOMETRY_TYPES[layer.geometry_type]
+    yield FGB_MAGIC + encode_header(layer)
+    with transaction.atomic():
+        block = bytearray()
+        for geometry, *values in layer.rows():
+            if geometry.empty:
+                continue
+            block += encode_feature(
+                geometry_type, geometry.coords, _encode_properties(layer.fields, values)
+            )
+            if len(block) >= STREAM_BLOCK_SIZE:
+                yield bytes(block)
+                block = bytearray()
+        if block:
+            yield bytes(block)
+
+
+# ----------------------------------------------------------------------
+# GeoPackage
+# ----------------------------------------------------------------------
+
+def _gpkg_geometry(geometry, srid):
+    """Blob géométrique GeoPackage : en-tête GP, enveloppe puis WKB"""
+    min_x, min_y, max_x, max_y = geometry.extent
+    # Drapeaux : little-endian (bit 0) et enveloppe [minx, maxx, miny, maxy] (bits 1-3)
+    header = struct.pack('<2sBBi4d', b'GP', 0, 0b00000011, srid, min_x, max_x, min_y, max_y)
+    return header + bytes(geometry.wkb)
+
+
+def _gpkg_datetime(value):
+    """Horodatage au format GeoPackage (UTC, millisecondes)"""
+    if value.tzinfo is not None:
+        value = value.astimezone(dt_timezone.utc)
+    return value.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def _gpkg_value(field, value):
+    if value is None:
+        return None
+    if field.type == 'json':
+        return json.dumps(value, ensure_ascii=False)
+    if field.type == 'datetime':
+        return _gpkg_datetime(value)
+    if field.type == 'bool':
+        return int(value)
+    return value
+
+
+def write_geopackage(layer):
+    """Écrire la couche dans un GeoPackage temporaire et renvoyer le fichier ouvert"""
+    fd, path = tempfile.mkstemp(suffix='.gpkg')
+    os.close(fd)
+    table = layer.name
+    rtree = f'rtree_{table}_geom'
+    now = _gpkg_datetime(datetime.now(dt_timezone.utc))
+
+    connection = sqlite3.connect(path)
+    try:
+        connection.executescript(f"""
+            PRAGMA application_id = 1196444487;
+            PRAGMA user_version = 10300;
+            CREATE TABLE gpkg_spatial_ref_sys (
+                srs_name TEXT NOT NULL, srs_id INTEGER PRIMARY KEY,
+                organization TEXT NOT NULL, organization_coordsys_id INTEGER NOT NULL,
+                definition TEXT NOT NULL, description TEXT
+            );
+            CREATE TABLE gpkg_contents (
+                table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL,
+                identifier TEXT UNIQUE, description TEXT DEFAULT '',
+                last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+                min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE,
+                srs_id INTEGER REFERENCES gpkg_spatial_ref_sys(srs_id)
+            );
+            CREATE TABLE gpkg_geometry_columns (
+                table_name TEXT NOT NULL, column_name TEXT NOT NULL,
+                geometry_type_name TEXT NOT NULL, srs_id INTEGER NOT NULL,
+                z TINYINT NOT NULL, m TINYINT NOT NULL,
+                CONSTRAINT pk_geom_cols PRIMARY KEY (table_name, column_name)
+            );
+            CREATE TABLE gpkg_extensions (
+                table_name TEXT, column_name TEXT, extension_name TEXT NOT NULL,
+                definition TEXT NOT NULL, scope TEXT NOT NULL,
+                CONSTRAINT ge_tce UNIQUE (table_name, column_name, extension_name)
+            );
+            CREATE VIRTUAL TABLE "{rtree}" USING rtree(id, minx, maxx, miny, maxy);
+        """)
+        connection.executemany(
+            'INSERT INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)',
+            [
+                ('Undefined cartesian SRS', -1, 'NONE', -1, 'undefined', None),
+                ('Undefined geographic SRS', 0, 'NONE', 0, 'undefined', None),
+                ('WGS 84 geodetic', 4326, 'EPSG', 4326,
+                 'GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563,'
+                 'AUTHORITY["EPSG","7030"]],AUTHORITY["EPSG","6326"]],PRIMEM["Greenwich",0,'
+                 'AUTHORITY["EPSG","8901"]],UNIT["degree",0.0174532925199433,'
+                 'AUTHORITY["EPSG","9122"]],AXIS["Latitude",NORTH],AXIS["Longitude",EAST],'
+                 'AUTHORITY["EPSG","4326"]]', None),
+            ]
+        )
+
+        columns = ', '.join(
+            f'"{field.name}" {COLUMN_TYPES[field.type][2]}' for field in layer.fields
+        )
+        connection.execute(
+            f'CREATE TABLE "{table}" (fid INTEGER PRIMARY KEY AUTOINCREMENT, '
+            f'geom {layer.geometry_type.upper()}, {columns})'
+        )
+        connection.execute(
+            'INSERT INTO gpkg_geometry_columns VALUES (?, ?, ?, ?, 0, 0)',
+            (table, 'geom', layer.geometry_type.upper(), layer.srid)
+        )
+        connection.execute(
+            'INSERT INTO gpkg_extensions VALUES (?, ?, ?, ?, ?)',
+            (table, 'geom', 'gpkg_rtree_index',
+             'http://www.geopackage.org/spec120/#extension_rtree', 'write-only')
+        )
+
+        placeholders = ', '.join('?' * (len(layer.fields) + 2))
+        insert_feature = f'INSERT INTO "{table}" VALUES ({placeholders})'
+        insert_rtree = f'INSERT INTO "{rtree}" VALUES (?, ?, ?, ?, ?)'
+        envelope = [math.inf, math.inf, -math.inf, -math.inf]
+        features, boxes = [], []
+        fid = 0
+
+        with transaction.atomic():
+            for geometry, *values in layer.rows():
+                if geometry.empty:
+                    continue
+                fid += 1
+                min_x, min_y, max_x, max_y = geometry.extent
+                envelope = [
+                    min(envelope[0], min_x), min(envelope[1], min_y),
+                    max(envelope[2], max_x), max(envelope[3], max_y),
+                ]
+                features.append((
+                    fid, _gpkg_geometry(geometry, layer.srid),
+                    *(_gpkg_value(field, value) for field, value in zip(layer.fields, values))
+                ))
+                boxes.append((fid, min_x, max_x, min_y, max_y))
+                if len(features) >= EXPORT_CHUNK_SIZE:
+                    connection.executemany(insert_feature, features)
+                    connection.executemany(insert_rtree, boxes)
+                    features, boxes = [], []
+        if features:
+            connection.executemany(insert_feature, features)
+            connection.executemany(insert_rtree, boxes)
+
+        if not fid:
+            envelope = [None, None, None, None]
+        connection.execute(
+            'INSERT INTO gpkg_contents VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (table, 'features', table, '', now, *envelope, layer.srid)
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+    handle = open(path, 'rb')
+    # Le fichier reste lisible jusqu'à la fermeture du descripteur
+    os.unlink(path)
+    return handle
+
+
+# ----------------------------------------------------------------------
+# Réponses HTTP
+# ----------------------------------------------------------------------
+
+def export_layer_response(request, layer):
+    """Construire la réponse d'export selon ``?format=fgb|gpkg`` (défaut: fgb)"""
+    export_format = request.query_params.get('format', 'fgb')
+    if export_format not in EXPORT_FORMATS:
+        return Response(
+            {'error': f"Format non supporté: {export_format} (fgb, gpkg)"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    content_type, extension = EXPORT_FORMATS[export_format]
+    filename = f'{layer.name}.{extension}'
+
+    if export_format == 'gpkg':
+        return FileResponse(
+            write_geopackage(layer),
+            as_attachment=True,
+            filename=filename,
+            content_type=content_type
+        )
+
+    # ?index=false : flux direct sans index spatial (pas de fichier temporaire)
+    with_index = request.query_params.get('index', 'true').lower() not in ('0', 'false')
+    stream = iter_flatgeobuf(layer) if with_index else iter_flatgeobuf_unindexed(layer)
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
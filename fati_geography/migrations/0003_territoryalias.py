@@ -0,0 +1,45 @@
+# Generated by Django 4.2.27 on 2026-10-18 23:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def seed_aliases(apps, schema_editor):
+    """Alias historiquement codés en dur dans l'import JSON"""
+    Region = apps.get_model("fati_geography", "Region")
+    TerritoryAlias = apps.get_model("fati_geography", "TerritoryAlias")
+    region = Region.objects.filter(name__iexact="Saint-Louis").first() or Region.objects.filter(
+        name__iexact="Saint Louis"
+    ).first()
+    if region:
+        TerritoryAlias.objects.get_or_create(
+            normalized="ST LOUIS", defaults={"alias": "St Louis", "region": region}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fati_geography", "0002_alter_commune_code_alter_department_code_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TerritoryAlias",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("alias", models.CharField(max_length=150, verbose_name="alias")),
+                ("normalized", models.CharField(editable=False, max_length=150, unique=True, verbose_name="alias normalisé")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="créé le")),
+                ("commune", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name="aliases", to="fati_geography.commune", verbose_name="commune")),
+                ("department", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name="aliases", to="fati_geography.department", verbose_name="département")),
+                ("region", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name="aliases", to="fati_geography.region", verbose_name="région")),
+            ],
+            options={
+                "verbose_name": "alias de territoire",
+                "verbose_name_plural": "alias de territoires",
+                "ordering": ["normalized"],
+            },
+        ),
+        migrations.RunPython(seed_aliases, migrations.RunPython.noop),
+    ]
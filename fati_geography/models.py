@@ -138,3 +138,63 @@ class Commune(models.Model):
     @property
     def region(self):
         return self.department.region
+
+
+class TerritoryAlias(models.Model):
+    """
+    Libellé alternatif d'un territoire utilisé par les imports (« ST LOUIS »,
+    « REGION DE DAKAR »...). Sans territoire, l'alias désigne le niveau
+    national.
+    """
+    
+    alias = models.CharField(_('alias'), max_length=150)
+    normalized = models.CharField(_('alias normalisé'), max_length=150, unique=True, editable=False)
+    
+    region = models.ForeignKey(
+        Region,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='aliases',
+        verbose_name=_('région')
+    )
+    department = models.ForeignKey(
+        Department,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='aliases',
+        verbose_name=_('département')
+    )
+    commune = models.ForeignKey(
+        Commune,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='aliases',
+        verbose_name=_('commune')
+    )
+    
+    created_at = models.DateTimeField(_('créé le'), auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('alias de territoire')
+        verbose_name_plural = _('alias de territoires')
+        ordering = ['normalized']
+    
+    def __str__(self):
+        return f"{self.alias} → {self.territory or 'National'}"
+    
+    @property
+    def territory(self):
+        return self.commune or self.department or self.region
+    
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        if sum(1 for field in (self.region_id, self.department_id, self.commune_id) if field) > 1:
+            raise ValidationError(_("Un alias désigne un seul territoire."))
+    
+    def save(self, *args, **kwargs):
+        from .resolver import normalize_label
+        self.normalized = normalize_label(self.alias)
+        super().save(*args, **kwargs)
@@ -0,0 +1,166 @@
+"""
+FATI Geography - Résolution des libellés de territoires
+
+Le résolveur est construit une fois par import : table exacte des noms
+normalisés (sans accents, en majuscules), alias enregistrés en base
+(``TerritoryAlias``) et index de trigrammes pour la recherche approchée.
+Chaque libellé n'est résolu qu'une fois ; les correspondances ambiguës ou
+trop faibles sont conservées pour le rapport d'import au lieu de retenir
+silencieusement le premier candidat.
+"""
+import re
+import unicodedata
+from collections import Counter, namedtuple
+
+from .models import Commune, Department, Region, TerritoryAlias
+
+
+NATIONAL_LABELS = {'SENEGAL', 'TOTAL', 'NATIONAL'}
+
+# Ordre de préférence lorsqu'un même nom existe à plusieurs niveaux
+DEFAULT_LEVELS = ('department', 'region')
+
+LEVEL_MODELS = {
+    'region': Region,
+    'department': Department,
+    'commune': Commune,
+}
+
+# Score de Dice minimal d'une correspondance approchée
+FUZZY_MIN_SCORE = 0.6
+# Écart minimal entre les deux meilleurs candidats
+FUZZY_MARGIN = 0.1
+# Score d'un nom contenu mot pour mot dans le libellé (« REGION DE DAKAR »)
+CONTAINED_SCORE = 0.9
+
+
+Resolution = namedtuple(
+    'Resolution', ['region_id', 'department_id', 'commune_id', 'method', 'score']
+)
+
+NATIONAL = Resolution(None, None, None, 'national', 1.0)
+UNRESOLVED = Resolution(None, None, None, None, 0.0)
+
+
+def normalize_label(value):
+    """Majuscules sans accents ni ponctuation"""
+    if value is None:
+        return ''
+    text = unicodedata.normalize('NFKD', str(value))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return re.sub(r'[^A-Za-z0-9]+', ' ', text).strip().upper()
+
+
+def trigrams(label):
+    padded = f'  {label} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _territory(level, pk):
+    return Resolution(
+        pk if level == 'region' else None,
+        pk if level == 'department' else None,
+        pk if level == 'commune' else None,
+        None, 0.0,
+    )
+
+
+class TerritoryResolver:
+    """
+    Libellé -> ``Resolution`` (région, département, commune, méthode, score).
+
+    ``levels`` fixe les niveaux recherchés et leur priorité lorsqu'un nom est
+    partagé (le département de Dakar avant la région de Dakar).
+    """
+
+    def __init__(self, levels=DEFAULT_LEVELS, min_score=FUZZY_MIN_SCORE):
+        self.levels = tuple(levels)
+        self.min_score = min_score
+        # nom normalisé -> [(niveau, id)] dans l'ordre de priorité
+        self.names = {}
+        for level in self.levels:
+            for pk, name in LEVEL_MODELS[level].objects.values_list('id', 'name'):
+                self.names.setdefault(normalize_label(name), []).append((level, pk))
+
+        self.aliases = {}
+        for normalized, region_id, department_id, commune_id in TerritoryAlias.objects.values_list(
+            'normalized', 'region_id', 'department_id', 'commune_id'
+        ):
+            if region_id or department_id or commune_id:
+                self.aliases[normalized] = Resolution(region_id, department_id, commune_id, 'alias', 1.0)
+            else:
+                self.aliases[normalized] = NATIONAL
+
+        self.keys = list(self.names)
+        self.key_trigrams = [trigrams(key) for key in self.keys]
+        self.index = {}
+        for position, grams in enumerate(self.key_trigrams):
+            for gram in grams:
+                self.index.setdefault(gram, []).append(position)
+
+        self.resolved = {}
+        self.ambiguous = {}
+        self.unresolved = set()
+
+    def _pick(self, key, method, score):
+        """Territoire d'un nom ; ``None`` si plusieurs au niveau prioritaire"""
+        entries = self.names[key]
+        level = entries[0][0]
+        same_level = [pk for entry_level, pk in entries if entry_level == level]
+        if len(same_level) > 1:
+            return None
+        return _territory(level, same_level[0])._replace(method=method, score=score)
+
+    def _fuzzy(self, label):
+        """Candidats (score, nom) triés par score décroissant"""
+        grams = trigrams(label)
+        shared = Counter(
+            position for gram in grams for position in self.index.get(gram, ())
+        )
+        padded = f' {label} '
+        scores = []
+        for position, count in shared.items():
+            score = 2 * count / (len(grams) + len(self.key_trigrams[position]))
+            key = self.keys[position]
+            if f' {key} ' in padded:
+                score = max(score, CONTAINED_SCORE)
+            scores.append((round(score, 3), key))
+        scores.sort(key=lambda item: (-item[0], item[1]))
+        return scores
+
+    def _lookup(self, label):
+        if not label or label in NATIONAL_LABELS:
+            return NATIONAL
+        if label in self.aliases:
+            return self.aliases[label]
+        if label in self.names:
+            resolution = self._pick(label, 'exact', 1.0)
+            if resolution is None:
+                self.ambiguous[label] = [
+                    f'{level}:{pk}' for level, pk in self.names[label]
+                ]
+                return UNRESOLVED
+            return resolution
+
+        candidates = self._fuzzy(label)
+        if not candidates or candidates[0][0] < self.min_score:
+            self.unresolved.add(label)
+            return UNRESOLVED
+        best_score, best_key = candidates[0]
+        if len(candidates) > 1 and best_score - candidates[1][0] < FUZZY_MARGIN:
+            self.ambiguous[label] = [
+                f'{key} ({score:.2f})' for score, key in candidates[:3]
+            ]
+            return UNRESOLVED
+        resolution = self._pick(best_key, 'fuzzy', best_score)
+        if resolution is None:
+            self.ambiguous[label] = [f'{level}:{pk}' for level, pk in self.names[best_key]]
+            return UNRESOLVED
+        return resolution
+
+    def resolve(self, raw_label):
+        """Résolution mise en cache par libellé normalisé"""
+        label = normalize_label(raw_label)
+        if label not in self.resolved:
+            self.resolved[label] = self._lookup(label)
+        return self.resolved[label]
@@ -1,3 +1,78 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 
-# Create your tests here.
+from .models import Department, Region, TerritoryAlias
+from .resolver import NATIONAL, TerritoryResolver, normalize_label
+
+
+class NormalizeLabelTest(SimpleTestCase):
+    """Libellés normalisés : majuscules sans accents ni ponctuation"""
+
+    def test_accents_and_punctuation(self):
+        self.assertEqual(normalize_label("  Thiès-Ville (l'Est) "), 'THIES VILLE L EST')
+        self.assertEqual(normalize_label(None), '')
+
+
+class TerritoryResolverTest(TestCase):
+    """Résolution exacte, par alias, approchée ; ambiguïtés signalées"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dakar = Region.objects.create(code='DK', name='Dakar')
+        cls.thies = Region.objects.create(code='TH', name='Thiès')
+        cls.kaolack = Region.objects.create(code='KL', name='Kaolack')
+        cls.dakar_department = Department.objects.create(code='DK1', name='Dakar', region=cls.dakar)
+        cls.mbour = Department.objects.create(code='TH1', name='Mbour', region=cls.thies)
+        # Même nom de département dans deux régions
+        Department.objects.create(code='TH2', name='Guinguinéo', region=cls.thies)
+        Department.objects.create(code='KL2', name='Guinguinéo', region=cls.kaolack)
+        cls.saint_louis = Region.objects.create(code='SL', name='Saint-Louis')
+        TerritoryAlias.objects.create(alias='St Louis', region=cls.saint_louis)
+        TerritoryAlias.objects.create(alias='Ensemble du pays')
+
+    def test_exact_prefers_department(self):
+        resolution = TerritoryResolver().resolve('dakar')
+        self.assertEqual(
+            (resolution.department_id, resolution.region_id, resolution.method),
+            (self.dakar_department.id, None, 'exact')
+        )
+
+    def test_exact_region(self):
+        resolution = TerritoryResolver().resolve('THIES')
+        self.assertEqual((resolution.region_id, resolution.method), (self.thies.id, 'exact'))
+
+    def test_national(self):
+        resolver = TerritoryResolver()
+        self.assertEqual(resolver.resolve('Sénégal'), NATIONAL)
+        self.assertEqual(resolver.resolve(''), NATIONAL)
+        self.assertEqual(resolver.resolve('Ensemble du pays').method, 'national')
+
+    def test_alias(self):
+        resolution = TerritoryResolver().resolve('ST-LOUIS')
+        self.assertEqual((resolution.region_id, resolution.method), (self.saint_louis.id, 'alias'))
+
+    def test_contained_name(self):
+        resolution = TerritoryResolver().resolve('Département de Mbour')
+        self.assertEqual(
+            (resolution.department_id, resolution.method, resolution.score),
+            (self.mbour.id, 'fuzzy', 0.9)
+        )
+
+    def test_misspelling(self):
+        resolution = TerritoryResolver().resolve('Kaolak')
+        self.assertEqual((resolution.region_id, resolution.method), (self.kaolack.id, 'fuzzy'))
+
+    def test_ambiguous(self):
+        resolver = TerritoryResolver()
+        self.assertIsNone(resolver.resolve('Guinguinéo').method)
+        self.assertEqual(len(resolver.ambiguous['GUINGUINEO']), 2)
+
+    def test_unresolved(self):
+        resolver = TerritoryResolver()
+        self.assertIsNone(resolver.resolve('Ziguinchor').method)
+        self.assertEqual(resolver.unresolved, {'ZIGUINCHOR'})
+
+    def test_cached_by_normalized_label(self):
+        resolver = TerritoryResolver()
+        resolver.resolve('Thiès')
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver.resolve(' thies ').region_id, self.thies.id)
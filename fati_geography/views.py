@@ -5,6 +5,12 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db.models import Count
+from .exports import (
+    ExportContentNegotiation,
+    ExportField,
+    ExportLayer,
+    export_layer_response
+)
 from .models import Region, Department, Commune
 from .serializers import (
     RegionSerializer,
@@ -16,6 +22,16 @@ from .serializers import (
 )
 
 
+TERRITORY_EXPORT_FIELDS = [
+    ExportField('id', 'long'),
+    ExportField('code', 'string'),
+    ExportField('name', 'string'),
+    ExportField('population', 'long'),
+    ExportField('area_km2', 'double'),
+    ExportField('updated_at', 'datetime'),
+]
+
+
 class RegionViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet pour les régions"""
     
@@ -77,6 +93,18 @@ class RegionViewSet(viewsets.ReadOnlyModelViewSet):
             data.append(region_data)
         
         return Response(data)
+    
+    @action(detail=False, methods=['get'], content_negotiation_class=ExportContentNegotiation)
+    def export(self, request):
+        """Exporter les limites des régions (?format=fgb|gpkg)"""
+        layer = ExportLayer(
+            'regions',
+            self.filter_queryset(self.get_queryset()),
+            'geometry',
+            'MultiPolygon',
+            TERRITORY_EXPORT_FIELDS
+        )
+        return export_layer_response(request, layer)
 
 
 class DepartmentViewSet(viewsets.ReadOnlyModelViewSet):
@@ -99,6 +127,20 @@ class DepartmentViewSet(viewsets.ReadOnlyModelViewSet):
         communes = department.communes.all()
         serializer = CommuneListSerializer(communes, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'], content_negotiation_class=ExportContentNegotiation)
+    def export(self, request):
+        """Exporter les limites des départements (?format=fgb|gpkg)"""
+        layer = ExportLayer(
+            'departments',
+            self.filter_queryset(self.get_queryset()),
+            'geometry',
+            'MultiPolygon',
+            TERRITORY_EXPORT_FIELDS + [
+                ExportField('region_code', 'string', 'region__code'),
+            ]
+        )
+        return export_layer_response(request, layer)
 
 
 class CommuneViewSet(viewsets.ReadOnlyModelViewSet):
@@ -129,3 +171,18 @@ class CommuneViewSet(viewsets.ReadOnlyModelViewSet):
         communes = self.queryset.filter(name__icontains=query)[:20]
         serializer = CommuneListSerializer(communes, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'], content_negotiation_class=ExportContentNegotiation)
+    def export(self, request):
+        """Exporter les limites des communes (?format=fgb|gpkg)"""
+        layer = ExportLayer(
+            'communes',
+            self.filter_queryset(self.get_queryset()),
+            'geometry',
+            'MultiPolygon',
+            TERRITORY_EXPORT_FIELDS + [
+                ExportField('department_code', 'string', 'department__code'),
+                ExportField('region_code', 'string', 'department__region__code'),
+            ]
+        )
+        return export_layer_response(request, layer)
@@ -2,7 +2,10 @@
 FATI Indicators - Admin Configuration
 """
 from django.contrib import admin
-from .models import Indicator, IndicatorValue, IndicatorHistory
+from .models import (
+    ChangeScan, Indicator, IndicatorAggregate, IndicatorLatestValue, IndicatorProjection,
+    IndicatorValue, IndicatorHistory
+)
 
 
 class IndicatorValueInline(admin.TabularInline):
@@ -97,3 +100,75 @@ class IndicatorHistoryAdmin(admin.ModelAdmin):
     search_fields = ['indicator_value__indicator__name', 'change_reason']
     readonly_fields = ['created_at']
     ordering = ['-created_at']
+
+
+@admin.register(IndicatorAggregate)
+class IndicatorAggregateAdmin(admin.ModelAdmin):
+    """Configuration admin pour le cube d'agrégats (lecture seule)"""
+    
+    list_display = [
+        'indicator', 'level', 'territory_id', 'year', 'period',
+        'status', 'count', 'avg_value', 'refreshed_at'
+    ]
+    list_filter = ['level', 'status', 'year', 'indicator__sector']
+    search_fields = ['indicator__code', 'indicator__name']
+    ordering = ['-year', 'indicator', 'level']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(IndicatorLatestValue)
+class IndicatorLatestValueAdmin(admin.ModelAdmin):
+    """Configuration admin pour les dernières valeurs (lecture seule)"""
+    
+    list_display = [
+        'indicator', 'level', 'territory_id', 'year', 'period',
+        'value', 'refreshed_at'
+    ]
+    list_filter = ['level', 'year', 'indicator__sector']
+    search_fields = ['indicator__code', 'indicator__name']
+    ordering = ['indicator', 'level', 'territory_id']
+    raw_id_fields = ['indicator_value']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(IndicatorProjection)
+class IndicatorProjectionAdmin(admin.ModelAdmin):
+    """Configuration admin pour les projections (lecture seule)"""
+    
+    list_display = [
+        'indicator', 'level', 'territory_id', 'period', 'points',
+        'slope', 'target_value', 'target_year', 'status', 'computed_at'
+    ]
+    list_filter = ['status', 'level', 'indicator__sector']
+    search_fields = ['indicator__code', 'indicator__name']
+    ordering = ['indicator', 'level', 'territory_id']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ChangeScan)
+class ChangeScanAdmin(admin.ModelAdmin):
+    """Configuration admin pour les passages des moteurs incrémentaux"""
+    
+    list_display = [
+        'name', 'last_transaction_id', 'last_change_id', 'values_scanned',
+        'results_created', 'scanned_at'
+    ]
+    readonly_fields = [
+        'name', 'last_transaction_id', 'last_change_id', 'values_scanned',
+        'results_created', 'scanned_at'
+    ]
@@ -0,0 +1,114 @@
+"""
+FATI Indicators - Corrélations entre indicateurs
+
+Pour une année et un niveau territorial, la matrice territoires x
+indicateurs est construite une fois ; corrélations de Pearson, droites de
+régression (moindres carrés) et effectifs sont calculés pour toutes les
+paires à la fois, sur les territoires renseignés pour les deux indicateurs
+(produits matriciels des masques de présence).
+"""
+import numpy as np
+
+from fati_backend.cache import get_or_compute
+from .models import IndicatorValue
+from .series import parse_territories, pivot_values, territory_filter, to_nullable_list
+from .statistics import STATISTICS_NAMESPACE
+
+
+CORRELATION_LEVELS = ('region', 'department', 'commune')
+MAX_CORRELATION_INDICATORS = 12
+# Effectif minimal d'une paire pour publier r et la droite
+MIN_PAIR_POINTS = 3
+
+
+def pairwise_regression(matrix):
+    """
+    Statistiques de toutes les paires de colonnes d'une matrice (NaN = absent).
+
+    Renvoie (n, r, pente, ordonnée) de forme (k, k) ; ``pente[a, b]`` et
+    ``ordonnée[a, b]`` décrivent la droite b = pente * a + ordonnée.
+    """
+    present = (~np.isnan(matrix)).astype(float)
+    x = np.where(present > 0, matrix, 0.0)
+    n = present.T @ present
+    # sums[a, b] : somme de a sur les lignes où a et b sont renseignés
+    sums = x.T @ present
+    squares = (x ** 2).T @ present
+    products = x.T @ x
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = products - sums * sums.T / n
+        variance = squares - sums ** 2 / n
+        r = covariance / np.sqrt(variance * variance.T)
+        slope = covariance / variance
+        intercept = (sums.T - slope * sums) / n
+    enough = (n >= MIN_PAIR_POINTS) & (variance > 1e-12) & (variance.T > 1e-12)
+    r = np.where(enough, np.clip(r, -1, 1), np.nan)
+    slope = np.where(enough, slope, np.nan)
+    intercept = np.where(enough, intercept, np.nan)
+    return n.astype(int), r, slope, intercept
+
+
+def latest_year(indicators, territories, period=''):
+    """Année la plus récente renseignée pour l'un des indicateurs"""
+    return IndicatorValue.objects.filter(
+        territory_filter(territories),
+        indicator__in=[indicator.id for indicator in indicators],
+        period=period,
+        status=IndicatorValue.Status.VALIDATED,
+    ).order_by('-year').values_list('year', flat=True).first()
+
+
+def build_correlations(indicators, level='region', year=None, period=''):
+    """Matrice, corrélations, nuages de points et droites de régression"""
+    territories = parse_territories(None, default_level=level)
+    if year is None:
+        year = latest_year(indicators, territories, period)
+    matrix = np.full((len(territories), len(indicators)), np.nan)
+    if year is not None:
+        matrix = pivot_values(indicators, territories, [year], period)[0][:, :, 0]
+
+    n, r, slope, intercept = pairwise_regression(matrix)
+    present = ~np.isnan(matrix)
+    pairs = []
+    for a in range(len(indicators)):
+        for b in range(a + 1, len(indicators)):
+            rows = np.flatnonzero(present[:, a] & present[:, b])
+            pairs.append({
+                'x': indicators[a].code,
+                'y': indicators[b].code,
+                'n': int(n[a, b]),
+                'r': None if np.isnan(r[a, b]) else float(r[a, b]),
+                'r2': None if np.isnan(r[a, b]) else float(r[a, b] ** 2),
+                'slope': None if np.isnan(slope[a, b]) else float(slope[a, b]),
+                'intercept': None if np.isnan(intercept[a, b]) else float(intercept[a, b]),
+                'points': [
+                    [territories[row]['id'], float(matrix[row, a]), float(matrix[row, b])]
+                    for row in rows
+                ],
+            })
+
+    return {
+        'year': year,
+        'level': level,
+        'period': period,
+        'indicators': [
+            {'id': indicator.id, 'code': indicator.code, 'name': indicator.name,
+             'unit': indicator.unit}
+            for indicator in indicators
+        ],
+        'territories': territories,
+        'values': to_nullable_list(matrix),
+        'n': n.tolist(),
+        'correlation': to_nullable_list(r),
+        'pairs': pairs,
+    }
+
+
+def cached_correlations(indicators, level, year, period=''):
+    """``build_correlations`` mis en cache, invalidé à chaque écriture de valeurs"""
+    return get_or_compute(
+        STATISTICS_NAMESPACE,
+        {'view': 'correlations', 'indicators': [indicator.id for indicator in indicators],
+         'level': level, 'year': year, 'period': period},
+        lambda: build_correlations(indicators, level, year, period)
+    )
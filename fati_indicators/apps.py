@@ -5,3 +5,6 @@ class FatiIndicatorsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'fati_indicators'
     verbose_name = 'FATI - Indicators'
+    
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,339 @@
+"""
+FATI Indicators - Import en masse des valeurs
+
+Les indicateurs et territoires sont résolus en mémoire, les champs calculés
+(variation, taux de réalisation) sont vectorisés et les lignes sont
+insérées ou mises à jour en quelques requêtes.
+"""
+import csv
+import io
+import math
+
+import numpy as np
+from django.db import transaction
+from rest_framework.parsers import BaseParser
+
+from fati_geography.models import Commune, Department, Region
+from .changes import log_changes
+from .cube import schedule_refresh
+from .formulas import schedule_recompute
+from .history import record_changes
+from .rollup import schedule_rollup
+from .models import Indicator, IndicatorValue
+
+
+BULK_BATCH_SIZE = 1000
+
+TERRITORY_MODELS = {
+    'region': Region,
+    'department': Department,
+    'commune': Commune,
+}
+
+# Champs mis à jour lorsqu'une valeur existe déjà pour la même clé
+UPSERT_UPDATE_FIELDS = [
+    'value', 'previous_value', 'target_value',
+    'variation', 'achievement_rate',
+    'source', 'notes', 'updated_at',
+]
+
+
+def value_key(value):
+    """Clé d'unicité d'une valeur d'indicateur"""
+    return (
+        value.indicator_id, value.region_id, value.department_id,
+        value.commune_id, value.year, value.period,
+    )
+
+
+def upsert_values(objects, update_fields=UPSERT_UPDATE_FIELDS, changed_by=None,
+                  change_reason=''):
+    """
+    Insérer ou mettre à jour des valeurs sur leur clé d'unicité.
+    
+    Les colonnes territoriales sont nullables : la contrainte unique ne
+    détecte pas les doublons, les lignes existantes sont donc retrouvées en
+    mémoire et l'upsert cible la clé primaire. Les changements de valeur
+    sont historisés. Renvoie (créées, mises à jour).
+    """
+    if not objects:
+        return 0, 0
+    keys = {value_key(obj) for obj in objects}
+    with transaction.atomic():
+        existing = IndicatorValue.objects.filter(
+            indicator_id__in={key[0] for key in keys},
+            year__in={key[4] for key in keys},
+        ).values_list(
+            'indicator_id', 'region_id', 'department_id',
+            'commune_id', 'year', 'period', 'id', 'value'
+        )
+        rows = {
+            tuple(item[:6]): item[6:]
+            for item in existing.iterator(chunk_size=BULK_BATCH_SIZE)
+            if tuple(item[:6]) in keys
+        }
+        new_objects, old_objects = [], []
+        for obj in objects:
+            obj.id = rows[value_key(obj)][0] if value_key(obj) in rows else None
+            (old_objects if obj.id else new_objects).append(obj)
+        # Insertion simple pour récupérer les clés primaires (RETURNING)
+        IndicatorValue.objects.bulk_create(new_objects, batch_size=BULK_BATCH_SIZE)
+        IndicatorValue.objects.bulk_create(
+            old_objects,
+            batch_size=BULK_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=update_fields,
+        )
+        record_changes(
+            [(obj.id, None, obj.value) for obj in new_objects]
+            + [(obj.id, rows[value_key(obj)][1], obj.value) for obj in old_objects],
+            changed_by=changed_by, reason=change_reason
+        )
+        schedule_refresh({(obj.indicator_id, obj.year, obj.period) for obj in objects})
+        log_changes(obj.id for obj in objects)
+    return len(new_objects), len(old_objects)
+
+
+class CSVTextParser(BaseParser):
+    """Parser ``text/csv`` : liste de dictionnaires, une entrée par ligne"""
+
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', 'utf-8')
+        text = stream.read().decode(encoding).lstrip('\ufeff')
+        return read_csv_rows(text)
+
+
+def read_csv_rows(text):
+    """Lire un CSV (séparateur ``,`` ou ``;``) en liste de dictionnaires"""
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=',;')
+    except csv.Error:
+        dialect = csv.excel
+    return [
+        {key.strip(): value for key, value in row.items() if key}
+        for row in csv.DictReader(io.StringIO(text), dialect=dialect)
+    ]
+
+
+class BulkRowError(ValueError):
+    """Erreurs de validation d'une ligne, par champ"""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def _parse_float(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return float(str(value).strip().replace('\xa0', '').replace(' ', '').replace(',', '.'))
+
+
+def _parse_year(value):
+    year = int(str(value).strip())
+    if year < 1900 or year > 2100:
+        raise ValueError
+    return year
+
+
+class BulkValueLoader:
+    """Résolution, calcul et upsert d'un lot de valeurs d'indicateurs"""
+
+    def __init__(self, user):
+        self.user = user
+        self.indicators = {}
+        self.indicator_by_code = {}
+        for indicator in Indicator.objects.only('id', 'code', 'target_value'):
+            self.indicators[indicator.id] = indicator
+            self.indicator_by_code[indicator.code] = indicator
+        self.territories = {}
+        for level, model in TERRITORY_MODELS.items():
+            ids, codes = set(), {}
+            for pk, code in model.objects.values_list('id', 'code'):
+                ids.add(pk)
+                codes[code] = pk
+            self.territories[level] = (ids, codes)
+
+    def _resolve_indicator(self, row):
+        raw = row.get('indicator')
+        if raw not in (None, ''):
+            try:
+                return self.indicators[int(raw)]
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"Indicateur inconnu: {raw}")
+        code = row.get('indicator_code')
+        if code:
+            try:
+                return self.indicator_by_code[str(code).strip()]
+            except KeyError:
+                raise ValueError(f"Indicateur inconnu: {code}")
+        raise ValueError("Champ obligatoire : indicator ou indicator_code")
+
+    def _resolve_territory(self, row, level):
+        ids, codes = self.territories[level]
+        raw = row.get(level)
+        if raw not in (None, ''):
+            try:
+                pk = int(raw)
+            except (TypeError, ValueError):
+                pk = None
+            if pk not in ids:
+                raise ValueError(f"Territoire inconnu: {raw}")
+            return pk
+        code = row.get(f'{level}_code')
+        if code:
+            try:
+                return codes[str(code).strip()]
+            except KeyError:
+                raise ValueError(f"Territoire inconnu: {code}")
+        return None
+
+    def _check_scope(self, territory):
+        """Un gestionnaire local ne saisit que sur son territoire assigné"""
+        user = self.user
+        if not user.is_local_manager:
+            return
+        for level in ('commune', 'department', 'region'):
+            assigned = getattr(user, f'assigned_{level}_id')
+            if assigned:
+                if territory[level] != assigned:
+                    raise ValueError("Territoire hors de votre périmètre")
+                return
+
+    def _clean_row(self, row):
+        if not isinstance(row, dict):
+            raise ValueError("Ligne invalide : objet attendu")
+        errors = {}
+        cleaned = {}
+        try:
+            cleaned['indicator'] = self._resolve_indicator(row)
+        except ValueError as exc:
+            errors['indicator'] = str(exc)
+        territory = {}
+        for level in TERRITORY_MODELS:
+            try:
+                territory[level] = self._resolve_territory(row, level)
+            except ValueError as exc:
+                errors[level] = str(exc)
+        try:
+            cleaned['year'] = _parse_year(row.get('year'))
+        except (TypeError, ValueError):
+            errors['year'] = "Année invalide"
+        for field in ('value', 'previous_value', 'target_value'):
+            try:
+                cleaned[field] = _parse_float(row.get(field))
+            except ValueError:
+                errors[field] = "Nombre invalide"
+        if 'value' not in errors and cleaned.get('value') is None:
+            errors['value'] = "Champ obligatoire"
+        period = str(row.get('period') or '').strip()
+        if len(period) > 20:
+            errors['period'] = "20 caractères maximum"
+        if not errors:
+            try:
+                self._check_scope(territory)
+            except ValueError as exc:
+                errors['non_field_errors'] = str(exc)
+        if errors:
+            raise BulkRowError(errors)
+        cleaned.update(
+            region_id=territory['region'],
+            department_id=territory['department'],
+            commune_id=territory['commune'],
+            period=period,
+            source=str(row.get('source') or '')[:255],
+            notes=str(row.get('notes') or ''),
+        )
+        return cleaned
+
+    @staticmethod
+    def _key(row):
+        return (
+            row['indicator'].id, row['region_id'], row['department_id'],
+            row['commune_id'], row['year'], row['period'],
+        )
+
+    def _compute(self, rows):
+        """Calculer variation et taux de réalisation sur tout le lot"""
+        nan = float('nan')
+        value = np.array([r['value'] for r in rows], dtype=float)
+        previous = np.array(
+            [nan if r['previous_value'] is None else r['previous_value'] for r in rows],
+            dtype=float
+        )
+        target = np.array([
+            r['target_value'] or r['indicator'].target_value or nan
+            for r in rows
+        ], dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variation = np.where(
+                np.isfinite(previous) & (previous != 0),
+                (value - previous) / previous * 100, nan
+            )
+            achievement = np.where(
+                np.isfinite(target) & (target != 0),
+                value / target * 100, nan
+            )
+        for row, var, rate in zip(rows, variation.tolist(), achievement.tolist()):
+            row['variation'] = None if math.isnan(var) else var
+            row['achievement_rate'] = None if math.isnan(rate) else rate
+
+    def load(self, raw_rows):
+        """Valider puis insérer ou mettre à jour les lignes ; renvoie le rapport"""
+        errors = []
+        valid = {}
+        for index, raw in enumerate(raw_rows):
+            try:
+                cleaned = self._clean_row(raw)
+            except BulkRowError as exc:
+                errors.append({'row': index, 'errors': exc.errors})
+                continue
+            except ValueError as exc:
+                errors.append({'row': index, 'errors': {'non_field_errors': str(exc)}})
+                continue
+            # Dernière occurrence prioritaire pour une même clé
+            valid[self._key(cleaned)] = cleaned
+
+        rows = list(valid.values())
+        created = updated = 0
+        if rows:
+            self._compute(rows)
+            created, updated = upsert_values([
+                IndicatorValue(
+                    indicator_id=row['indicator'].id,
+                    region_id=row['region_id'],
+                    department_id=row['department_id'],
+                    commune_id=row['commune_id'],
+                    year=row['year'],
+                    period=row['period'],
+                    value=row['value'],
+                    previous_value=row['previous_value'],
+                    target_value=row['target_value'],
+                    variation=row['variation'],
+                    achievement_rate=row['achievement_rate'],
+                    source=row['source'],
+                    notes=row['notes'],
+                    created_by=self.user,
+                )
+                for row in rows
+            ], changed_by=self.user, change_reason='Import en masse')
+            schedule_rollup({
+                (row['indicator'].id, row['year'], row['period'],
+                 row['region_id'], row['department_id'], row['commune_id'])
+                for row in rows
+            })
+            schedule_recompute({
+                (row['indicator'].id, row['year'], row['period']) for row in rows
+            })
+
+        return {
+            'received': len(raw_rows),
+            'created': created,
+            'updated': updated,
+            'errors': errors,
+        }
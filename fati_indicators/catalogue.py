@@ -0,0 +1,30 @@
+"""
+FATI Indicators - Catalogue des indicateurs en cache
+
+La liste des indicateurs et leur regroupement par secteur sont servis en
+JSON pré-rendu, avec ETag. La version du catalogue est incrémentée à chaque
+enregistrement ou suppression d'un indicateur (après validation de la
+transaction).
+"""
+from django.db import transaction
+
+from fati_backend.cache import bump_cache_version, cached_json_response
+
+
+CATALOGUE_NAMESPACE = 'indicator_catalogue'
+
+
+def catalogue_response(request, view, build):
+    """Réponse en cache pour une vue du catalogue et ses paramètres de requête"""
+    params = {
+        'view': view,
+        # Les liens de pagination sont absolus
+        'scheme': request.scheme,
+        'host': request.get_host(),
+        'query': sorted(request.query_params.lists()),
+    }
+    return cached_json_response(request, CATALOGUE_NAMESPACE, params, build)
+
+
+def invalidate_catalogue():
+    transaction.on_commit(lambda: bump_cache_version(CATALOGUE_NAMESPACE))
@@ -0,0 +1,129 @@
+"""
+FATI Indicators - Journal des modifications de valeurs
+
+Chaque écriture sur ``IndicatorValue`` (enregistrement, suppression, upsert
+en masse, validation en masse) inscrit l'identifiant de la valeur dans
+``IndicatorValueChange``, dans la transaction qui l'écrit : l'entrée est
+validée ou annulée avec la modification, avec l'identifiant de sa
+transaction (``txid_current()``).
+
+``ChangedValues`` parcourt le journal par lots pour un moteur (alertes,
+contrôle qualité) dans l'ordre (transaction, id) et fait avancer son point
+de reprise (``ChangeScan``). Seules les transactions antérieures au
+``xmin`` de l'instantané courant sont lues : elles sont toutes terminées,
+une transaction longue encore en cours reste au-dessus du point de reprise
+jusqu'à sa fin.
+"""
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ChangeScan, IndicatorValue, IndicatorValueChange
+
+
+CHANGE_BATCH_SIZE = 5000
+
+# Moteurs lecteurs du journal (``ChangeScan.name``) : une entrée n'est
+# supprimée qu'une fois lue par chacun, même par un moteur jamais lancé
+CHANGE_CONSUMERS = ('indicator_alerts', 'quality_checks')
+
+
+def log_changes(value_ids):
+    """Journaliser des valeurs modifiées dans la transaction courante"""
+    value_ids = list(dict.fromkeys(value_id for value_id in value_ids if value_id is not None))
+    if not value_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {IndicatorValueChange._meta.db_table}
+                (indicator_value_id, transaction_id, created_at)
+            SELECT value_id, txid_current(), NOW()
+            FROM unnest(%s::bigint[]) AS value_id
+        """, [value_ids])
+
+
+def _snapshot_xmin():
+    """Plus ancienne transaction encore en cours : toutes les précédentes sont terminées"""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT txid_snapshot_xmin(txid_current_snapshot())')
+        return cursor.fetchone()[0]
+
+
+def _after(transaction_id, change_id):
+    return Q(transaction_id__gt=transaction_id) | Q(transaction_id=transaction_id, id__gt=change_id)
+
+
+class ChangedValues:
+    """
+    Lots d'identifiants de valeurs modifiées depuis le dernier passage du
+    moteur ``name`` (toutes les valeurs si ``full``).
+
+    Le consommateur appelle ``commit(valeurs, résultats)`` dans la
+    transaction qui enregistre ses résultats : le point de reprise avance
+    avec eux.
+    """
+
+    def __init__(self, name, full=False, batch_size=CHANGE_BATCH_SIZE):
+        if name not in CHANGE_CONSUMERS:
+            raise ValueError(f'Moteur non déclaré dans CHANGE_CONSUMERS : {name}')
+        self.scan, _ = ChangeScan.objects.get_or_create(name=name)
+        self.full = full
+        self.batch_size = batch_size
+        self.values = self.results = 0
+        self.upper = _snapshot_xmin()
+        self._position = None
+
+    def __iter__(self):
+        if self.full:
+            # Passage complet : toutes les valeurs, puis reprise après les
+            # transactions terminées au départ
+            position = max((self.scan.last_transaction_id, self.scan.last_change_id), (self.upper, 0))
+            last_id = 0
+            while True:
+                ids = list(IndicatorValue.objects.filter(id__gt=last_id).order_by('id').values_list(
+                    'id', flat=True
+                )[:self.batch_size])
+                if not ids:
+                    break
+                last_id = ids[-1]
+                self._position = position
+                yield ids
+            if self._position is None:
+                self._position = position
+                self.commit(0, 0)
+            return
+
+        while True:
+            changes = list(IndicatorValueChange.objects.filter(
+                _after(self.scan.last_transaction_id, self.scan.last_change_id),
+                transaction_id__lt=self.upper
+            ).order_by('transaction_id', 'id').values_list(
+                'transaction_id', 'id', 'indicator_value_id'
+            )[:self.batch_size])
+            if not changes:
+                break
+            self._position = changes[-1][:2]
+            yield list(dict.fromkeys(value_id for _, _, value_id in changes))
+            if len(changes) < self.batch_size:
+                break
+
+    def commit(self, values, results):
+        """Avancer le point de reprise après le traitement d'un lot"""
+        self.values += values
+        self.results += results
+        self.scan.last_transaction_id, self.scan.last_change_id = self._position
+        self.scan.values_scanned = self.values
+        self.scan.results_created = self.results
+        self.scan.scanned_at = timezone.now()
+        self.scan.save()
+
+
+def prune_changes():
+    """Supprimer les entrées du journal traitées par tous les moteurs déclarés"""
+    positions = dict.fromkeys(CHANGE_CONSUMERS, (0, 0))
+    for name, *position in ChangeScan.objects.filter(name__in=CHANGE_CONSUMERS).values_list(
+        'name', 'last_transaction_id', 'last_change_id'
+    ):
+        positions[name] = tuple(position)
+    transaction_id, change_id = min(positions.values())
+    IndicatorValueChange.objects.exclude(_after(transaction_id, change_id)).delete()
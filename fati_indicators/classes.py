@@ -0,0 +1,189 @@
+"""
+FATI Indicators - Classification des cartes choroplèthes
+
+Bornes de classes (quantiles, intervalles égaux, seuils naturels de Jenks)
+calculées avec NumPy, affectation des territoires et couleurs. Les
+résultats sont mis en cache par (indicateur, année, niveau, méthode, k) et
+invalidés à chaque recalcul du cube de l'indicateur.
+"""
+import numpy as np
+
+from fati_backend.cache import get_or_compute
+from .series import build_series, parse_territories
+
+
+CLASS_METHODS = ('quantile', 'jenks', 'equal')
+CLASS_LEVELS = ('region', 'department', 'commune')
+MIN_CLASSES = 2
+MAX_CLASSES = 9
+
+# Au-delà, Jenks est calculé sur un échantillon régulier des valeurs triées
+JENKS_MAX_POINTS = 1000
+
+# Palettes séquentielles (ColorBrewer, 9 classes), interpolées pour k classes
+PALETTES = {
+    'YlOrRd': ['#ffffcc', '#ffeda0', '#fed976', '#feb24c', '#fd8d3c',
+               '#fc4e2a', '#e31a1c', '#bd0026', '#800026'],
+    'Blues': ['#f7fbff', '#deebf7', '#c6dbef', '#9ecae1', '#6baed6',
+              '#4292c6', '#2171b5', '#08519c', '#08306b'],
+    'Greens': ['#f7fcf5', '#e5f5e0', '#c7e9c0', '#a1d99b', '#74c476',
+               '#41ab5d', '#238b45', '#006d2c', '#00441b'],
+    'RdYlGn': ['#d73027', '#f46d43', '#fdae61', '#fee08b', '#ffffbf',
+               '#d9ef8b', '#a6d96a', '#66bd63', '#1a9850'],
+}
+DEFAULT_PALETTE = 'YlOrRd'
+
+
+def quantile_breaks(values, k):
+    return np.quantile(values, np.linspace(0, 1, k + 1))
+
+
+def equal_breaks(values, k):
+    return np.linspace(values.min(), values.max(), k + 1)
+
+
+def jenks_breaks(values, k):
+    """
+    Seuils naturels de Jenks par programmation dynamique.
+
+    La somme des carrés des écarts de chaque segment [j, i] des valeurs
+    triées est obtenue par sommes cumulées ; chaque classe supplémentaire
+    est une minimisation vectorisée sur j.
+    """
+    data = np.sort(values)
+    if len(data) > JENKS_MAX_POINTS:
+        data = data[np.linspace(0, len(data) - 1, JENKS_MAX_POINTS).round().astype(np.intp)]
+    n = len(data)
+    s1 = np.concatenate(([0.0], np.cumsum(data)))
+    s2 = np.concatenate(([0.0], np.cumsum(data ** 2)))
+
+    # ssd[j, i] : écarts du segment data[j..i] (j <= i), +inf sinon
+    start = np.arange(n)[:, None]
+    end = np.arange(n)[None, :]
+    count = end - start + 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        total = s1[end + 1] - s1[start]
+        ssd = (s2[end + 1] - s2[start]) - total ** 2 / count
+    ssd = np.where(count > 0, np.maximum(ssd, 0), np.inf)
+
+    cost = ssd[0].copy()
+    starts = np.zeros((k, n), dtype=np.intp)
+    for classes in range(1, k):
+        # La classe courante commence en j >= 1, les précédentes couvrent [0, j-1]
+        candidates = np.full((n, n), np.inf)
+        candidates[1:] = cost[:-1, None] + ssd[1:]
+        starts[classes] = np.argmin(candidates, axis=0)
+        cost = candidates[starts[classes], np.arange(n)]
+
+    breaks = [data[-1]]
+    end_index = n - 1
+    for classes in range(k - 1, 0, -1):
+        begin = starts[classes][end_index]
+        breaks.append(data[begin - 1])
+        end_index = begin - 1
+    breaks.append(data[0])
+    return np.array(breaks[::-1])
+
+
+BREAK_FUNCTIONS = {
+    'quantile': quantile_breaks,
+    'jenks': jenks_breaks,
+    'equal': equal_breaks,
+}
+
+
+def palette_colours(k, palette=DEFAULT_PALETTE):
+    """``k`` couleurs interpolées dans une palette de référence"""
+    anchors = np.array([
+        [int(colour[i:i + 2], 16) for i in (1, 3, 5)] for colour in PALETTES[palette]
+    ], dtype=float)
+    positions = np.linspace(0, len(anchors) - 1, k)
+    rgb = np.column_stack([
+        np.interp(positions, np.arange(len(anchors)), anchors[:, channel])
+        for channel in range(3)
+    ]).round().astype(int)
+    return ['#%02x%02x%02x' % tuple(colour) for colour in rgb]
+
+
+def classify(values, method='quantile', k=5):
+    """
+    Bornes (k + 1 valeurs croissantes) et classe 0..k-1 de chaque valeur.
+
+    ``k`` est réduit au nombre de valeurs distinctes. Une classe de largeur
+    nulle (bornes égales) est conservée si elle contient une valeur, par
+    exemple une valeur isolée en tête de série avec Jenks, et fusionnée
+    avec la suivante sinon.
+    """
+    values = np.asarray(values, dtype=float)
+    k = max(1, min(k, len(np.unique(values))))
+    breaks = np.asarray(BREAK_FUNCTIONS[method](values, k), dtype=float)
+    if breaks[0] == breaks[-1]:
+        breaks = np.array([values.min(), values.max()])
+    # Bornes intérieures : une valeur égale à une borne va dans la classe inférieure
+    classes = np.searchsorted(breaks[1:-1], values, side='left')
+    counts = np.bincount(classes, minlength=len(breaks) - 1)
+    keep = (counts > 0) | (breaks[1:] > breaks[:-1])
+    if not keep.all():
+        breaks = np.concatenate((breaks[:1], breaks[1:][keep]))
+        classes = np.cumsum(keep)[classes] - 1
+    return breaks, classes
+
+
+def build_classes(indicator, level='region', year=None, method='quantile', k=5,
+                  palette=DEFAULT_PALETTE, period=''):
+    """Bornes, classes et couleurs des territoires d'un niveau"""
+    if year is None:
+        year = indicator.aggregates.filter(
+            level=level, status='validated', period=period
+        ).order_by('-year').values_list('year', flat=True).first()
+    series = []
+    if year is not None:
+        territories = parse_territories(None, default_level=level)
+        series = build_series(indicator, territories, [year], period=period)['series']
+
+    present = [item for item in series if item['values'][0] is not None]
+    result = {
+        'year': year,
+        'level': level,
+        'method': method,
+        'k': 0,
+        'breaks': [],
+        'classes': [],
+        'territories': [
+            {'id': item['id'], 'code': item['code'], 'name': item['name'],
+             'value': None, 'class': None, 'color': None}
+            for item in series if item['values'][0] is None
+        ],
+    }
+    if not present:
+        return result
+
+    values = np.array([item['values'][0] for item in present], dtype=float)
+    breaks, classes = classify(values, method, k)
+    colours = palette_colours(len(breaks) - 1, palette)
+    counts = np.bincount(classes, minlength=len(breaks) - 1)
+    result.update({
+        'k': len(breaks) - 1,
+        'breaks': breaks.tolist(),
+        'classes': [
+            {'class': index, 'min': float(breaks[index]), 'max': float(breaks[index + 1]),
+             'color': colours[index], 'count': int(counts[index])}
+            for index in range(len(breaks) - 1)
+        ],
+    })
+    result['territories'] = [
+        {'id': item['id'], 'code': item['code'], 'name': item['name'],
+         'value': item['values'][0], 'class': int(index), 'color': colours[index]}
+        for item, index in zip(present, classes)
+    ] + result['territories']
+    return result
+
+
+def cached_classes(indicator, level, year, method, k, palette=DEFAULT_PALETTE, period=''):
+    """``build_classes`` mis en cache, invalidé avec le cube de l'indicateur"""
+    return get_or_compute(
+        f'indicator_values:{indicator.id}',
+        {'view': 'classes', 'level': level, 'year': year, 'method': method,
+         'k': k, 'palette': palette, 'period': period},
+        lambda: build_classes(indicator, level, year, method, k, palette, period)
+    )
@@ -0,0 +1,209 @@
+"""
+FATI Indicators - Cube d'agrégats
+
+Les agrégats par (indicateur, niveau, territoire, année, période, statut)
+sont matérialisés dans ``IndicatorAggregate``. Une écriture sur une valeur
+ne recalcule que la tranche (indicateur, année, période) concernée, après
+validation de la transaction. Les lignes de ``IndicatorLatestValue``
+(dernière valeur validée par indicateur et territoire, ``DISTINCT ON``) et
+les projections d'atteinte des cibles des séries présentes dans ces
+tranches sont recalculées en même temps.
+"""
+from django.db import connection, transaction
+
+from fati_backend.cache import bump_cache_version
+from fati_backend.transactions import defer_batch
+from .models import Indicator, IndicatorAggregate, IndicatorLatestValue, IndicatorValue
+from .projections import refresh_projections
+from .statistics import STATISTICS_NAMESPACE
+
+
+_AGGREGATE_SQL = """
+    INSERT INTO {aggregate} (
+        indicator_id, level, territory_id, year, period, status,
+        count, sum_value, avg_value, min_value, max_value, latest_value,
+        achievement_sum, achievement_count, refreshed_at
+    )
+    SELECT
+        indicator_id,
+        CASE WHEN GROUPING(level) = 1 THEN 'all' ELSE level END,
+        CASE WHEN GROUPING(territory_id) = 1 THEN 0 ELSE territory_id END,
+        year, period, status,
+        COUNT(*), SUM(value), AVG(value), MIN(value), MAX(value),
+        (ARRAY_AGG(value ORDER BY updated_at DESC, id DESC))[1],
+        COALESCE(SUM(achievement_rate), 0), COUNT(achievement_rate), NOW()
+    FROM (
+        SELECT
+            v.id, v.indicator_id, v.year, v.period, v.status, v.value,
+            v.achievement_rate, v.updated_at,
+            CASE
+                WHEN v.commune_id IS NOT NULL THEN 'commune'
+                WHEN v.department_id IS NOT NULL THEN 'department'
+                WHEN v.region_id IS NOT NULL THEN 'region'
+                ELSE 'national'
+            END AS level,
+            COALESCE(v.commune_id, v.department_id, v.region_id, 0) AS territory_id
+        FROM {value} v
+        {where}
+    ) s
+    GROUP BY GROUPING SETS (
+        (indicator_id, year, period, status, level, territory_id),
+        (indicator_id, year, period, status, level),
+        (indicator_id, year, period, status)
+    )
+    HAVING NOT (
+        GROUPING(territory_id) = 1 AND GROUPING(level) = 0 AND level = 'national'
+    )
+"""
+
+_SLICE_FILTER = """
+    WHERE (v.indicator_id, v.year, v.period) IN (
+        SELECT * FROM unnest(%s::bigint[], %s::integer[], %s::varchar[])
+    )
+"""
+
+
+_LATEST_SQL = """
+    INSERT INTO {latest} (
+        indicator_id, level, territory_id, indicator_value_id,
+        year, period, value, achievement_rate, refreshed_at
+    )
+    SELECT DISTINCT ON (indicator_id, level, territory_id)
+        indicator_id, level, territory_id, id,
+        year, period, value, achievement_rate, NOW()
+    FROM (
+        SELECT
+            v.id, v.indicator_id, v.year, v.period, v.value,
+            v.achievement_rate, v.updated_at,
+            CASE
+                WHEN v.commune_id IS NOT NULL THEN 'commune'
+                WHEN v.department_id IS NOT NULL THEN 'department'
+                WHEN v.region_id IS NOT NULL THEN 'region'
+                ELSE 'national'
+            END AS level,
+            COALESCE(v.commune_id, v.department_id, v.region_id, 0) AS territory_id
+        FROM {value} v
+        WHERE v.status = 'validated' {where}
+    ) s
+    {keys}
+    ORDER BY indicator_id, level, territory_id, year DESC, period DESC,
+             updated_at DESC, id DESC
+"""
+
+_KEY_FILTER = """
+    WHERE (indicator_id, level, territory_id) IN (
+        SELECT * FROM unnest(%s::bigint[], %s::varchar[], %s::bigint[])
+    )
+"""
+
+_LATEST_UPSERT = """
+    ON CONFLICT (indicator_id, level, territory_id) DO UPDATE SET
+        indicator_value_id = EXCLUDED.indicator_value_id,
+        year = EXCLUDED.year,
+        period = EXCLUDED.period,
+        value = EXCLUDED.value,
+        achievement_rate = EXCLUDED.achievement_rate,
+        refreshed_at = EXCLUDED.refreshed_at
+    RETURNING indicator_id, level, territory_id
+"""
+
+
+def _latest_sql(where='', keys=''):
+    return _LATEST_SQL.format(
+        latest=IndicatorLatestValue._meta.db_table,
+        value=IndicatorValue._meta.db_table,
+        where=where,
+        keys=keys,
+    )
+
+
+def refresh_latest(keys=None):
+    """
+    Recalculer les dernières valeurs des clés (indicator_id, level,
+    territory_id) (toutes si ``None``) ; les clés sans valeur validée sont
+    supprimées.
+    """
+    table = IndicatorLatestValue._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        if keys is None:
+            cursor.execute(f'DELETE FROM {table}')
+            cursor.execute(_latest_sql())
+            return
+
+        keys = set(keys)
+        if not keys:
+            return
+        indicator_ids, levels, territory_ids = map(list, zip(*sorted(keys)))
+        cursor.execute(
+            _latest_sql('AND v.indicator_id = ANY(%s::bigint[])', _KEY_FILTER) + _LATEST_UPSERT,
+            [sorted(set(indicator_ids)), indicator_ids, levels, territory_ids]
+        )
+        stale = keys - set(cursor.fetchall())
+        if stale:
+            cursor.execute(f"""
+                DELETE FROM {table}
+                WHERE (indicator_id, level, territory_id) IN (
+                    SELECT * FROM unnest(%s::bigint[], %s::varchar[], %s::bigint[])
+                )
+            """, list(map(list, zip(*stale))))
+
+
+def _insert_sql(where=''):
+    return _AGGREGATE_SQL.format(
+        aggregate=IndicatorAggregate._meta.db_table,
+        value=IndicatorValue._meta.db_table,
+        where=where,
+    )
+
+
+def refresh_slices(slices):
+    """Recalculer les cellules des tranches (indicator_id, year, period)"""
+    slices = {(int(i), int(y), p or '') for i, y, p in slices}
+    if not slices:
+        return
+    indicator_ids, years, periods = map(list, zip(*sorted(slices)))
+    delete_sql = """
+        DELETE FROM {aggregate}
+        WHERE (indicator_id, year, period) IN (
+            SELECT * FROM unnest(%s::bigint[], %s::integer[], %s::varchar[])
+        )
+        RETURNING indicator_id, level, territory_id, period
+    """.format(aggregate=IndicatorAggregate._meta.db_table)
+    params = [indicator_ids, years, periods]
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Séries des cellules avant et après recalcul : celles dont la
+        # dernière valeur ou la projection a pu changer (hors totaux par niveau)
+        cursor.execute(delete_sql, params)
+        cells = cursor.fetchall()
+        cursor.execute(_insert_sql(_SLICE_FILTER) + 'RETURNING indicator_id, level, territory_id, period', params)
+        cells += cursor.fetchall()
+        series = {
+            tuple(cell) for cell in cells
+            if cell[1] != 'all' and (cell[2] or cell[1] == 'national')
+        }
+        refresh_latest({key[:3] for key in series})
+        refresh_projections(series=series)
+    # Résultats calculés en cache (classes, statistiques) de ces indicateurs
+    for indicator_id in set(indicator_ids):
+        bump_cache_version(f'indicator_values:{indicator_id}')
+    bump_cache_version(STATISTICS_NAMESPACE)
+
+
+def rebuild_cube():
+    """Reconstruire entièrement le cube"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {IndicatorAggregate._meta.db_table}')
+        cursor.execute(_insert_sql())
+        refresh_latest()
+        refresh_projections(full=True)
+    for indicator_id in Indicator.objects.values_list('id', flat=True):
+        bump_cache_version(f'indicator_values:{indicator_id}')
+    bump_cache_version(STATISTICS_NAMESPACE)
+
+
+def schedule_refresh(slices):
+    """
+    Planifier le recalcul de tranches à la validation de la transaction
+    (abandonné avec un bloc annulé)
+    """
+    defer_batch(refresh_slices, slices)
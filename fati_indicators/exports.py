@@ -0,0 +1,172 @@
+"""
+FATI Indicators - Export tabulaire des valeurs (CSV, NDJSON, Parquet)
+
+Les lignes sont lues depuis un curseur serveur, avec les libellés
+d'indicateur et de territoire joints en SQL, puis écrites par blocs dans une
+réponse en flux : l'export n'est jamais matérialisé en mémoire.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+
+from django.db import transaction
+from django.http import StreamingHttpResponse
+
+
+EXPORT_CHUNK_SIZE = 5000
+PARQUET_ROW_GROUP_SIZE = 50000
+
+# (colonne, lookup, type Parquet)
+VALUE_EXPORT_COLUMNS = [
+    ('id', 'id', 'int64'),
+    ('indicator_code', 'indicator__code', 'string'),
+    ('indicator_name', 'indicator__name', 'string'),
+    ('sector', 'indicator__sector', 'string'),
+    ('unit', 'indicator__unit', 'string'),
+    ('region_code', 'region__code', 'string'),
+    ('region_name', 'region__name', 'string'),
+    ('department_code', 'department__code', 'string'),
+    ('department_name', 'department__name', 'string'),
+    ('commune_code', 'commune__code', 'string'),
+    ('commune_name', 'commune__name', 'string'),
+    ('year', 'year', 'int32'),
+    ('period', 'period', 'string'),
+    ('value', 'value', 'float64'),
+    ('previous_value', 'previous_value', 'float64'),
+    ('target_value', 'target_value', 'float64'),
+    ('variation', 'variation', 'float64'),
+    ('achievement_rate', 'achievement_rate', 'float64'),
+    ('status', 'status', 'string'),
+    ('source', 'source', 'string'),
+    ('validated_at', 'validated_at', 'timestamp'),
+    ('updated_at', 'updated_at', 'timestamp'),
+]
+
+TABULAR_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def iter_rows(queryset, columns=VALUE_EXPORT_COLUMNS):
+    """Itérer sur les tuples de colonnes via un curseur serveur"""
+    lookups = [lookup for _, lookup, _ in columns]
+    # Curseur nommé : nécessite une transaction (pooler en mode transaction)
+    with transaction.atomic():
+        yield from queryset.order_by('id').values_list(*lookups).iterator(
+            chunk_size=EXPORT_CHUNK_SIZE
+        )
+
+
+def _text(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(queryset, columns=VALUE_EXPORT_COLUMNS):
+    """Produire un CSV (UTF-8 avec BOM pour les tableurs) par blocs"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow([name for name, _, _ in columns])
+    for count, row in enumerate(iter_rows(queryset, columns), 1):
+        writer.writerow(['' if value is None else _text(value) for value in row])
+        if count % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def iter_ndjson(queryset, columns=VALUE_EXPORT_COLUMNS):
+    """Produire un objet JSON par ligne, par blocs"""
+    names = [name for name, _, _ in columns]
+    block = []
+    for row in iter_rows(queryset, columns):
+        block.append(json.dumps(
+            dict(zip(names, map(_text, row))), ensure_ascii=False
+        ))
+        if len(block) >= EXPORT_CHUNK_SIZE:
+            yield ('\n'.join(block) + '\n').encode('utf-8')
+            block = []
+    if block:
+        yield ('\n'.join(block) + '\n').encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Fichier en écriture seule dont le contenu est vidé à chaque bloc"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_parquet(queryset, columns=VALUE_EXPORT_COLUMNS):
+    """Produire un fichier Parquet, un groupe de lignes à la fois"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {
+        'int32': pa.int32(),
+        'int64': pa.int64(),
+        'float64': pa.float64(),
+        'string': pa.string(),
+        'timestamp': pa.timestamp('us', tz='UTC'),
+    }
+    schema = pa.schema([(name, types[kind]) for name, _, kind in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+
+    def write_group(rows):
+        arrays = [
+            pa.array(list(column), type=field.type)
+            for column, field in zip(zip(*rows), schema)
+        ]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+    rows = []
+    for row in iter_rows(queryset, columns):
+        rows.append(row)
+        if len(rows) >= PARQUET_ROW_GROUP_SIZE:
+            write_group(rows)
+            rows = []
+            yield sink.drain()
+    if rows:
+        write_group(rows)
+    writer.close()
+    yield sink.drain()
+
+
+TABULAR_WRITERS = {
+    'csv': iter_csv,
+    'ndjson': iter_ndjson,
+    'parquet': iter_parquet,
+}
+
+
+def tabular_export_response(queryset, export_format, basename):
+    """Réponse en flux pour ``csv``, ``ndjson`` ou ``parquet``"""
+    stream = TABULAR_WRITERS[export_format](queryset)
+    response = StreamingHttpResponse(stream, content_type=TABULAR_FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{basename}.{export_format}"'
+    return response
@@ -0,0 +1,312 @@
+"""
+FATI Indicators - Moteur de formules
+
+``Indicator.formula`` est une expression arithmétique dont les variables
+sont des codes d'indicateurs (``{CODE}`` pour un code qui n'est pas un
+identifiant valide). Si ``Indicator.denominator`` est renseigné, la valeur
+dérivée vaut formule / dénominateur (x 100 pour un pourcentage).
+
+Les indicateurs dérivés forment un graphe orienté acyclique : ils sont
+calculés dans l'ordre topologique, par lots vectorisés sur toutes les
+combinaisons (territoire, année, période) des valeurs validées.
+"""
+import ast
+import math
+import operator
+import re
+from graphlib import CycleError, TopologicalSorter
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from fati_backend.transactions import defer_batch
+from .models import Indicator, IndicatorValue
+
+
+FORMULA_SOURCE = 'Formule'
+
+_BRACED_CODE = re.compile(r'\{([^{}]+)\}')
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow,
+}
+
+_UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+# Fonctions autorisées : (implémentation, nombre d'arguments, None si variable)
+_FUNCTIONS = {
+    'abs': (np.abs, 1),
+    'min': (lambda *args: np.minimum.reduce(np.broadcast_arrays(*args)), None),
+    'max': (lambda *args: np.maximum.reduce(np.broadcast_arrays(*args)), None),
+}
+
+
+class FormulaError(ValueError):
+    """Formule invalide"""
+
+
+class Formula:
+    """Expression compilée d'un indicateur dérivé"""
+
+    def __init__(self, expression):
+        self.expression = expression
+        self._aliases = {}
+
+        def _alias(match):
+            name = f'__ref{len(self._aliases)}'
+            self._aliases[name] = match.group(1).strip()
+            return name
+
+        try:
+            tree = ast.parse(_BRACED_CODE.sub(_alias, expression.strip()), mode='eval')
+        except SyntaxError as exc:
+            raise FormulaError(f"Syntaxe invalide: {exc.msg}")
+        self.references = set()
+        self._check(tree.body)
+        self._tree = tree.body
+
+    def _check(self, node):
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+            self._check(node.left)
+            self._check(node.right)
+        elif isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+            self._check(node.operand)
+        elif isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            pass
+        elif isinstance(node, ast.Name):
+            self.references.add(self._aliases.get(node.id, node.id))
+        elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                and node.func.id in _FUNCTIONS and node.args and not node.keywords):
+            arity = _FUNCTIONS[node.func.id][1]
+            if arity is not None and len(node.args) != arity:
+                raise FormulaError(f"{node.func.id}() attend {arity} argument(s)")
+            for arg in node.args:
+                self._check(arg)
+        else:
+            raise FormulaError(f"Élément non autorisé: {type(node).__name__}")
+
+    def evaluate(self, env):
+        """Évaluer la formule sur des tableaux alignés ``{code: ndarray}``"""
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            return np.asarray(self._eval(self._tree, env), dtype=float)
+
+    def _eval(self, node, env):
+        if isinstance(node, ast.BinOp):
+            return _BINARY_OPERATORS[type(node.op)](
+                self._eval(node.left, env), self._eval(node.right, env)
+            )
+        if isinstance(node, ast.UnaryOp):
+            return _UNARY_OPERATORS[type(node.op)](self._eval(node.operand, env))
+        if isinstance(node, ast.Constant):
+            # Constantes en NumPy : un dépassement donne inf, pas OverflowError
+            try:
+                return np.float64(node.value)
+            except OverflowError:
+                return np.float64(np.inf if node.value > 0 else -np.inf)
+        if isinstance(node, ast.Name):
+            return env[self._aliases.get(node.id, node.id)]
+        return _FUNCTIONS[node.func.id][0](*(self._eval(arg, env) for arg in node.args))
+
+
+class DerivedIndicator:
+    """Indicateur calculé : formule et dénominateur éventuel"""
+
+    def __init__(self, indicator):
+        self.indicator = indicator
+        self.formula = Formula(indicator.formula)
+        self.denominator = Formula(indicator.denominator) if indicator.denominator else None
+        self.references = set(self.formula.references)
+        if self.denominator:
+            self.references |= self.denominator.references
+
+    def evaluate(self, env):
+        result = self.formula.evaluate(env)
+        if self.denominator is not None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result = result / self.denominator.evaluate(env)
+            if self.indicator.type == Indicator.Type.PERCENTAGE:
+                result = result * 100
+        return result
+
+
+class FormulaGraph:
+    """Graphe de dépendances entre indicateurs (codes)"""
+
+    def __init__(self, indicators=None):
+        if indicators is None:
+            indicators = Indicator.objects.filter(is_active=True).only(
+                'id', 'code', 'type', 'formula', 'denominator', 'target_value'
+            )
+        self.by_code = {}
+        self.derived = {}
+        self.errors = {}
+        for indicator in indicators:
+            self.by_code[indicator.code] = indicator
+        for indicator in self.by_code.values():
+            if not indicator.formula.strip():
+                continue
+            try:
+                derived = DerivedIndicator(indicator)
+            except FormulaError as exc:
+                # Formule descriptive en texte libre : indicateur non calculé
+                self.errors[indicator.code] = str(exc)
+                continue
+            unknown = derived.references - self.by_code.keys()
+            if unknown:
+                self.errors[indicator.code] = (
+                    f"Indicateurs inconnus: {', '.join(sorted(unknown))}"
+                )
+                continue
+            self.derived[indicator.code] = derived
+
+        while True:
+            try:
+                order = list(TopologicalSorter({
+                    code: derived.references & self.derived.keys()
+                    for code, derived in self.derived.items()
+                }).static_order())
+                break
+            except CycleError as exc:
+                cycle = exc.args[1]
+                for code in cycle:
+                    self.errors[code] = f"Dépendance circulaire: {' -> '.join(cycle)}"
+                    self.derived.pop(code, None)
+        self.order = [code for code in order if code in self.derived]
+
+    def descendants(self, codes):
+        """Indicateurs dérivés dépendant (transitivement) de ``codes``, triés"""
+        affected = set(codes)
+        result = []
+        for code in self.order:
+            if self.derived[code].references & affected:
+                affected.add(code)
+                result.append(code)
+        return result
+
+
+def _load_inputs(indicator_ids, years):
+    """Valeurs validées des entrées, indexées par clé territoriale"""
+    values = IndicatorValue.objects.filter(
+        indicator_id__in=indicator_ids,
+        status=IndicatorValue.Status.VALIDATED,
+    )
+    if years is not None:
+        values = values.filter(year__in=years)
+    data = {}
+    for indicator_id, region_id, department_id, commune_id, year, period, value in (
+        values.values_list(
+            'indicator_id', 'region_id', 'department_id',
+            'commune_id', 'year', 'period', 'value'
+        ).iterator(chunk_size=5000)
+    ):
+        data.setdefault(indicator_id, {})[
+            (region_id, department_id, commune_id, year, period)
+        ] = value
+    return data
+
+
+def compute_derived(graph, codes, years=None):
+    """
+    Calculer les indicateurs dérivés ``codes`` (ordre topologique) pour les
+    années données (toutes si ``None``). Renvoie le nombre de valeurs écrites.
+    """
+    from .bulk import upsert_values
+
+    written = 0
+    now = timezone.now()
+    for code in codes:
+        derived = graph.derived[code]
+        indicator = derived.indicator
+        inputs = [graph.by_code[ref] for ref in sorted(derived.references)]
+        data = _load_inputs([ref.id for ref in inputs], years)
+
+        # Clés présentes pour toutes les entrées
+        keys = None
+        for ref in inputs:
+            ref_keys = data.get(ref.id, {}).keys()
+            keys = set(ref_keys) if keys is None else keys & ref_keys
+        keys = list(keys or ())
+
+        result = np.empty(0)
+        if keys:
+            env = {
+                ref.code: np.fromiter(
+                    (data[ref.id][key] for key in keys), dtype=float, count=len(keys)
+                )
+                for ref in inputs
+            }
+            result = derived.evaluate(env)
+
+        target = indicator.target_value
+        objects = []
+        for key, value in zip(keys, result.tolist()):
+            if not math.isfinite(value):
+                continue
+            region_id, department_id, commune_id, year, period = key
+            objects.append(IndicatorValue(
+                indicator_id=indicator.id,
+                region_id=region_id,
+                department_id=department_id,
+                commune_id=commune_id,
+                year=year,
+                period=period,
+                value=value,
+                achievement_rate=value / target * 100 if target else None,
+                status=IndicatorValue.Status.VALIDATED,
+                validated_at=now,
+                source=FORMULA_SOURCE,
+            ))
+
+        with transaction.atomic():
+            # Les valeurs dont une entrée a disparu sont supprimées
+            stale = IndicatorValue.objects.filter(
+                indicator=indicator, source=FORMULA_SOURCE
+            )
+            if years is not None:
+                stale = stale.filter(year__in=years)
+            kept = {(obj.region_id, obj.department_id, obj.commune_id, obj.year, obj.period)
+                    for obj in objects}
+            stale_ids = [
+                pk for pk, *key in stale.values_list(
+                    'id', 'region_id', 'department_id', 'commune_id', 'year', 'period'
+                )
+                if tuple(key) not in kept
+            ]
+            if stale_ids:
+                IndicatorValue.objects.filter(id__in=stale_ids).delete()
+            created, updated = upsert_values(objects, update_fields=[
+                'value', 'achievement_rate', 'status',
+                'validated_at', 'source', 'updated_at',
+            ], change_reason=FORMULA_SOURCE)
+        written += created + updated
+    return written
+
+
+def recompute_for_inputs(slices):
+    """Recalculer les descendants des (indicator_id, year, period) modifiés"""
+    graph = FormulaGraph()
+    if not graph.derived:
+        return 0
+    code_by_id = {indicator.id: code for code, indicator in graph.by_code.items()}
+    codes = {code_by_id[i] for i, _, _ in slices if i in code_by_id}
+    years = {year for _, year, _ in slices}
+    descendants = graph.descendants(codes)
+    if not descendants:
+        return 0
+    return compute_derived(graph, descendants, years)
+
+
+def schedule_recompute(slices):
+    """
+    Planifier le recalcul des indicateurs dérivés à la validation
+    (abandonné avec un bloc annulé)
+    """
+    defer_batch(recompute_for_inputs, slices)
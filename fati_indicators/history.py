@@ -0,0 +1,46 @@
+"""
+FATI Indicators - Historique des valeurs
+
+Chaque modification de ``IndicatorValue.value`` (enregistrement unitaire,
+upsert en masse, consolidation, formule) est rattachée au bloc ``atomic``
+courant ; les entrées d'historique sont insérées par ``bulk_create`` à la
+validation de la transaction et abandonnées avec un bloc annulé.
+"""
+from fati_backend.transactions import defer_batch
+from .models import IndicatorHistory, IndicatorValue
+
+
+HISTORY_BATCH_SIZE = 1000
+
+
+def _write_history(entries):
+    # Valeur supprimée après sa modification : rien à historiser
+    existing = set(IndicatorValue.objects.filter(
+        id__in={entry.indicator_value_id for entry in entries}
+    ).values_list('id', flat=True))
+    IndicatorHistory.objects.bulk_create(
+        [entry for entry in entries if entry.indicator_value_id in existing],
+        batch_size=HISTORY_BATCH_SIZE
+    )
+
+
+def record_changes(changes, changed_by=None, reason=''):
+    """
+    Mettre en file des modifications de valeur.
+
+    ``changes`` : itérable de (indicator_value_id, ancienne valeur, nouvelle
+    valeur) ; les lignes dont la valeur n'a pas changé sont ignorées.
+    """
+    changed_by_id = getattr(changed_by, 'pk', changed_by)
+    entries = [
+        IndicatorHistory(
+            indicator_value_id=value_id,
+            old_value=old_value,
+            new_value=new_value,
+            changed_by_id=changed_by_id,
+            change_reason=reason,
+        )
+        for value_id, old_value, new_value in changes
+        if old_value != new_value
+    ]
+    defer_batch(_write_history, entries)
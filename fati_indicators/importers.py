@@ -0,0 +1,510 @@
+"""
+FATI Indicators - Import en flux des fichiers JSON (sante.json, education.json)
+
+Les fichiers ont la forme ``{groupe: {feuille: [ligne, ...]}}``. Ils sont lus
+par blocs : seules les clés et une ligne à la fois sont décodées, le
+fichier n'est jamais chargé entièrement. Indicateurs et territoires sont
+résolus une seule fois puis mis en cache, les valeurs sont insérées ou
+mises à jour par lots et la progression est enregistrée dans un fichier de
+reprise après chaque lot.
+"""
+import json
+import os
+import re
+import time
+
+from django.db import transaction
+from django.utils.text import slugify
+
+from fati_geography.resolver import TerritoryResolver, normalize_label
+from .bulk import upsert_values, value_key
+from .formulas import schedule_recompute
+from .models import Indicator, IndicatorValue
+from .rollup import schedule_rollup
+
+
+IMPORT_BATCH_SIZE = 1000
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Suite éventuelle d'un nombre jusqu'à la fin du tampon
+_NUMBER_TAIL = re.compile(r'[0-9.eE+-]*\Z')
+
+SECTOR_FILES = {
+    'sante': Indicator.Sector.HEALTH,
+    'health': Indicator.Sector.HEALTH,
+    'education': Indicator.Sector.EDUCATION,
+}
+
+
+class ImportCheckpointError(ValueError):
+    """Fichier de reprise incompatible avec le fichier importé"""
+
+
+# ----------------------------------------------------------------------
+# Lecture en flux
+# ----------------------------------------------------------------------
+
+class JsonStream:
+    """Lecteur JSON incrémental : clés d'objets, éléments de tableaux, valeurs"""
+
+    def __init__(self, handle, chunk_size=STREAM_CHUNK_SIZE):
+        self.handle = handle
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = self.handle.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        """Prochain caractère significatif (sans le consommer)"""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in ' \t\r\n':
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"JSON invalide : '{char}' attendu à la position {self.position}")
+        self.position += 1
+
+    def value(self):
+        """Décoder la valeur suivante, en complétant le tampon si nécessaire"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # Un nombre en fin de tampon peut être tronqué (« 1. », « 2e »)
+            if not self.eof and _NUMBER_TAIL.match(self.buffer, end) and self._fill():
+                continue
+            self.position = end
+            return value
+
+    def _items(self, close):
+        if self.peek() == close:
+            self.position += 1
+            return
+        while True:
+            yield
+            separator = self.peek()
+            self.position += 1
+            if separator == close:
+                return
+            if separator != ',':
+                raise ValueError(f"JSON invalide : ',' ou '{close}' attendu")
+
+    def keys(self):
+        """Clés d'un objet ; la valeur doit être consommée avant la clé suivante"""
+        self.expect('{')
+        for _ in self._items('}'):
+            key = self.value()
+            self.expect(':')
+            yield key
+
+    def elements(self):
+        """Éléments d'un tableau, décodés un par un"""
+        self.expect('[')
+        for _ in self._items(']'):
+            yield self.value()
+
+
+def iter_sheet_rows(handle, chunk_size=STREAM_CHUNK_SIZE):
+    """(groupe, feuille, ligne) pour un fichier ``{groupe: {feuille: [lignes]}}``"""
+    stream = JsonStream(handle, chunk_size)
+    for group_key in stream.keys():
+        if stream.peek() != '{':
+            stream.value()
+            continue
+        for sheet_name in stream.keys():
+            if stream.peek() != '[':
+                stream.value()
+                continue
+            for row in stream.elements():
+                yield group_key, sheet_name, row
+
+
+# ----------------------------------------------------------------------
+# Analyse des lignes
+# ----------------------------------------------------------------------
+
+def parse_number(value):
+    """Nombre au format français ou anglais, ``None`` si illisible"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return None if value != value else float(value)
+    text = str(value).strip()
+    if not text or text in {'-', '--', '...', 'NA', 'N/A'}:
+        return None
+    text = text.replace('\xa0', ' ').replace('%', '').replace(' ', '')
+    if ',' in text and '.' in text:
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    elif text.count(',') == 1:
+        text = text.replace(',', '.')
+    elif text.count(',') > 1:
+        text = text.replace(',', '')
+    if text.count('.') > 1:
+        # Comme l'ancien import : le dernier point sépare les décimales
+        head, _, tail = text.rpartition('.')
+        text = f"{head.replace('.', '')}.{tail}"
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def clean_indicator_name(value):
+    text = str(value or '').replace('(*)', '')
+    return re.sub(r'\s+', ' ', text).strip(' -:;')
+
+
+def guess_category(sector, group_key, sheet_name, indicator_name):
+    text = normalize_label(f'{group_key} {sheet_name} {indicator_name}')
+    if sector == Indicator.Sector.HEALTH:
+        if any(token in text for token in ['DEPENSE', 'BUDGET', 'FINANCE']):
+            return Indicator.Category.FINANCE
+        if any(token in text for token in ['PERSONNEL', 'SOIGNANT', 'MEDECIN', 'SAGE FEMME']):
+            return Indicator.Category.PERSONNEL
+        if any(token in text for token in ['LIT', 'ETABLISSEMENT', 'HOPITAL', 'CENTRE', 'POSTE', 'INFRA']):
+            return Indicator.Category.INFRASTRUCTURE
+        if any(token in text for token in ['MORTAL', 'PREVALENCE', 'DECES', 'RESULTAT']):
+            return Indicator.Category.OUTCOMES
+        if any(token in text for token in ['ACCES', 'COUVERTURE', 'CONSULTATION', 'VACCIN']):
+            return Indicator.Category.ACCESS
+        return Indicator.Category.RESOURCES
+
+    if any(token in text for token in ['RESULTAT', 'REUSSITE', 'ADMIS', 'EXAMEN']):
+        return Indicator.Category.OUTCOMES
+    if any(token in text for token in ['ETABLISSEMENT', 'CLASSE', 'SALLE', 'INFRA']):
+        return Indicator.Category.INFRASTRUCTURE
+    if any(token in text for token in ['ENSEIGNANT', 'PERSONNEL', 'MAITRE']):
+        return Indicator.Category.PERSONNEL
+    if any(token in text for token in ['SCOLAR', 'INSCRIPTION', 'ACCES']):
+        return Indicator.Category.ACCESS
+    if 'RATIO' in text or 'QUALITE' in text:
+        return Indicator.Category.QUALITY
+    return Indicator.Category.RESOURCES
+
+
+def guess_type(unit, indicator_name):
+    normalized = normalize_label(f'{unit} {indicator_name}')
+    if '%' in unit or 'TAUX' in normalized or 'POURCENT' in normalized:
+        return Indicator.Type.PERCENTAGE
+    if 'RATIO' in normalized or normalize_label(unit) in {'PER 1000', '1000', 'POUR 1000'}:
+        return Indicator.Type.RATIO
+    if any(token in normalized for token in ['BUDGET', 'DEPENSE', 'COUT', 'FCFA']):
+        return Indicator.Type.CURRENCY
+    if any(token in normalized for token in ['NOMBRE', 'EFFECTIF', 'NB', 'ETABLISSEMENT']):
+        return Indicator.Type.COUNT
+    return Indicator.Type.NUMBER
+
+
+def build_indicator_code(sector, group_key, sheet_name, indicator_name):
+    token = slugify(f'{sector}_{group_key}_{sheet_name}_{indicator_name}').replace('-', '_').upper()
+    token = re.sub(r'[^A-Z0-9_]', '', token)
+    return (token or f'{sector[:3].upper()}_IND')[:50]
+
+
+class HealthSheetParser:
+    """
+    Feuilles santé : le territoire est porté par la colonne ``Période`` (et
+    reste valable pour les lignes suivantes), l'indicateur par
+    ``Unnamed: 1``, les valeurs par les colonnes années.
+    """
+
+    HEADER_PATTERNS = (
+        'PRINCIPAUX INDICATEURS', 'DECOUPAGE ADMINISTRATIF',
+        'ETABLISSEMENTS DE SANTE', 'INDICATEURS',
+    )
+
+    def __init__(self):
+        self.geo_label = None
+
+    def parse(self, row):
+        """(nom d'indicateur, unité, territoire, [(année, valeur)]) ou None"""
+        if not isinstance(row, dict):
+            return None
+        period_label = row.get('Période')
+        if isinstance(period_label, str) and period_label.strip():
+            if normalize_label(period_label) not in {'', 'PERIODE', 'DECOUPAGE ADMINISTRATIF'}:
+                self.geo_label = period_label.strip()
+
+        name = clean_indicator_name(row.get('Unnamed: 1') or row.get('Unnamed: 2') or '')
+        normalized = normalize_label(name)
+        if len(normalized) < 3 or any(pattern in normalized for pattern in self.HEADER_PATTERNS):
+            return None
+        values = []
+        for key, raw in row.items():
+            key = str(key).strip()
+            if re.fullmatch(r'(19|20)\d{2}', key):
+                value = parse_number(raw)
+                if value is not None:
+                    values.append((int(key), value))
+        if not values:
+            return None
+        return name, '', self.geo_label, values
+
+
+class EducationSheetParser:
+    """
+    Feuilles éducation : une ligne ``Période`` donne les colonnes années, une
+    ligne ``Fréquence ..., Indicateurs: ..., Unité: ...`` l'indicateur courant,
+    puis une ligne par territoire.
+    """
+
+    META_PREFIXES = ('STATUT', 'CYCLES', 'NIVEAU', 'MILIEU', 'SEXE', 'ACADEMIES', 'IA')
+
+    def __init__(self):
+        self.year_columns = {}
+        self.indicator = None
+
+    def parse(self, row):
+        if not isinstance(row, dict) or not row:
+            return None
+        first_value = str(next(iter(row.values())) or '').strip()
+        if not first_value:
+            return None
+        normalized = normalize_label(first_value)
+
+        if 'PERIODE' in normalized:
+            self.year_columns = {}
+            for column, raw in row.items():
+                match = re.search(r'(19|20)\d{2}', str(raw)) if raw is not None else None
+                if match:
+                    self.year_columns[column] = int(match.group(0))
+            return None
+
+        if 'FREQUENCE' in normalized and 'INDICATEUR' in normalized:
+            name = re.search(r'indicateurs?\s*:\s*([^,]+)', first_value, flags=re.IGNORECASE)
+            unit = re.search(r'unit[ée]?\s*:\s*([^,]+)', first_value, flags=re.IGNORECASE)
+            name = clean_indicator_name(name.group(1) if name else first_value)
+            if name:
+                self.indicator = (name, unit.group(1).strip() if unit else '')
+            return None
+
+        if not self.indicator or not self.year_columns:
+            return None
+        if normalized.startswith(self.META_PREFIXES):
+            return None
+        values = []
+        for column, year in self.year_columns.items():
+            value = parse_number(row.get(column))
+            if value is not None:
+                values.append((year, value))
+        if not values:
+            return None
+        return self.indicator[0], self.indicator[1], first_value, values
+
+
+SHEET_PARSERS = {
+    Indicator.Sector.HEALTH: HealthSheetParser,
+    Indicator.Sector.EDUCATION: EducationSheetParser,
+}
+
+
+# ----------------------------------------------------------------------
+# Résolution en mémoire
+# ----------------------------------------------------------------------
+
+class IndicatorCache:
+    """Indicateurs d'un secteur par nom ; création à la première occurrence"""
+
+    def __init__(self, sector):
+        self.sector = sector
+        self.by_name = {}
+        self.codes = set(Indicator.objects.values_list('code', flat=True))
+        for indicator in Indicator.objects.filter(sector=sector).only(
+            'id', 'name', 'code', 'target_value'
+        ):
+            self.by_name.setdefault(indicator.name.lower(), indicator)
+        self.created = 0
+
+    def resolve(self, name, unit, group_key, sheet_name, filename):
+        key = name.lower()
+        indicator = self.by_name.get(key)
+        if indicator is not None:
+            return indicator
+        code = build_indicator_code(self.sector, group_key, sheet_name, name)
+        suffix = 1
+        while code in self.codes:
+            code = f'{code[:46]}_{suffix:03d}'
+            suffix += 1
+        indicator = Indicator.objects.create(
+            code=code,
+            name=name,
+            sector=self.sector,
+            category=guess_category(self.sector, group_key, sheet_name, name),
+            type=guess_type(unit, name),
+            unit=unit,
+            description=f'Import JSON {filename} / {group_key} / {sheet_name}',
+        )
+        self.codes.add(code)
+        self.by_name[key] = indicator
+        self.created += 1
+        return indicator
+
+
+# ----------------------------------------------------------------------
+# Import
+# ----------------------------------------------------------------------
+
+def sector_for_path(path):
+    """Secteur déduit du nom de fichier (sante.json, education.json)"""
+    stem = os.path.splitext(os.path.basename(path))[0].lower()
+    for prefix, sector in SECTOR_FILES.items():
+        if stem.startswith(prefix):
+            return sector
+    return None
+
+
+class JsonIndicatorImporter:
+    """
+    Import en flux d'un fichier JSON, par lots, avec reprise.
+
+    Le fichier de reprise mémorise le nombre de lignes source dont les
+    valeurs sont enregistrées ; à la reprise, ces lignes sont relues (pour
+    reconstituer le contexte des feuilles) sans être réécrites.
+    """
+
+    def __init__(self, path, sector, batch_size=IMPORT_BATCH_SIZE,
+                 checkpoint_path=None, restart=False, report=None):
+        self.path = path
+        self.sector = sector
+        self.batch_size = batch_size
+        self.checkpoint_path = checkpoint_path or f'{path}.checkpoint'
+        self.report = report or (lambda message: None)
+        self.filename = os.path.basename(path)
+        self.source = f'json:{self.filename}'
+        stat = os.stat(path)
+        self.fingerprint = {'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+        self.state = {'rows': 0, 'values': 0}
+        if restart and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        self._load_checkpoint()
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path, encoding='utf-8') as handle:
+            saved = json.load(handle)
+        if saved.get('file') != self.fingerprint:
+            raise ImportCheckpointError(
+                f"Le fichier {self.path} a changé depuis le dernier passage "
+                f"(reprise impossible, utiliser --restart)"
+            )
+        self.state = {'rows': saved['rows'], 'values': saved['values']}
+
+    def _save_checkpoint(self):
+        temporary = f'{self.checkpoint_path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as handle:
+            json.dump({'file': self.fingerprint, **self.state}, handle)
+        os.replace(temporary, self.checkpoint_path)
+
+    def _flush(self, pending, rows):
+        """Enregistrer un lot puis avancer le point de reprise"""
+        if pending:
+            objects = list(pending.values())
+            with transaction.atomic():
+                upsert_values(objects, change_reason=f'Import {self.source}')
+                schedule_rollup({
+                    (obj.indicator_id, obj.year, obj.period,
+                     obj.region_id, obj.department_id, obj.commune_id)
+                    for obj in objects
+                })
+                schedule_recompute({(obj.indicator_id, obj.year, obj.period) for obj in objects})
+            self.state['values'] += len(objects)
+            pending.clear()
+        self.state['rows'] = rows
+        self._save_checkpoint()
+
+    def run(self):
+        """
+        Importer le fichier. Les lignes dont le territoire est ambigu ou
+        inconnu ne sont pas écrites ; leurs libellés sont renvoyés dans le
+        rapport (``ambiguous``, ``unresolved``).
+        """
+        indicators = IndicatorCache(self.sector)
+        territories = TerritoryResolver()
+        resume_after = self.state['rows']
+        written_before = self.state['values']
+        sheet, parser = None, None
+        pending = {}
+        rows = skipped = 0
+        started = time.monotonic()
+
+        with open(self.path, encoding='utf-8') as handle:
+            for group_key, sheet_name, row in iter_sheet_rows(handle):
+                rows += 1
+                if sheet != (group_key, sheet_name):
+                    sheet, parser = (group_key, sheet_name), SHEET_PARSERS[self.sector]()
+                parsed = parser.parse(row)
+                if parsed is None or rows <= resume_after:
+                    continue
+
+                name, unit, geo_label, values = parsed
+                indicator = indicators.resolve(name, unit, group_key, sheet_name, self.filename)
+                territory = territories.resolve(geo_label)
+                if territory.method is None:
+                    # Libellé ambigu ou inconnu : la ligne est signalée, pas rattachée
+                    skipped += 1
+                    continue
+                target = indicator.target_value
+                for year, value in values:
+                    obj = IndicatorValue(
+                        indicator_id=indicator.id,
+                        region_id=territory.region_id,
+                        department_id=territory.department_id,
+                        commune_id=territory.commune_id,
+                        year=year,
+                        period='',
+                        value=value,
+                        target_value=target,
+                        achievement_rate=value / target * 100 if target else None,
+                        status=IndicatorValue.Status.VALIDATED,
+                        source=self.source,
+                    )
+                    # Dernière occurrence prioritaire pour une même clé
+                    pending[value_key(obj)] = obj
+
+                if len(pending) >= self.batch_size:
+                    self._flush(pending, rows)
+                    elapsed = max(time.monotonic() - started, 1e-6)
+                    self.report(
+                        f'{rows} lignes, {self.state["values"]} valeurs '
+                        f'({(rows - resume_after) / elapsed:.0f} lignes/s)'
+                    )
+
+        self._flush(pending, rows)
+        os.remove(self.checkpoint_path)
+        elapsed = max(time.monotonic() - started, 1e-6)
+        return {
+            'rows': rows,
+            'resumed_after': resume_after,
+            'values': self.state['values'] - written_before,
+            'indicators_created': indicators.created,
+            'skipped': skipped,
+            'ambiguous': territories.ambiguous,
+            'unresolved': sorted(territories.unresolved),
+            'seconds': elapsed,
+            'rows_per_second': (rows - resume_after) / elapsed,
+        }
@@ -0,0 +1,42 @@
+"""
+Calculer les indicateurs dérivés à partir de leurs formules
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from fati_indicators.formulas import FormulaGraph, compute_derived
+
+
+class Command(BaseCommand):
+    help = "Calcule les valeurs des indicateurs définis par une formule"
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--indicator', action='append', default=[],
+            help="Code d'indicateur à recalculer (avec ses descendants)"
+        )
+        parser.add_argument(
+            '--year', type=int, action='append',
+            help="Année à recalculer (toutes par défaut)"
+        )
+    
+    def handle(self, *args, **options):
+        graph = FormulaGraph()
+        
+        for code, error in sorted(graph.errors.items()):
+            self.stdout.write(self.style.WARNING(f'⚠️  {code}: {error}'))
+        
+        codes = graph.order
+        if options['indicator']:
+            unknown = set(options['indicator']) - graph.by_code.keys()
+            if unknown:
+                raise CommandError(f"Indicateurs inconnus: {', '.join(sorted(unknown))}")
+            selected = [code for code in options['indicator'] if code in graph.derived]
+            codes = [
+                code for code in graph.order
+                if code in selected or code in graph.descendants(options['indicator'])
+            ]
+        
+        written = compute_derived(graph, codes, options['year'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {len(codes)} indicateurs dérivés, {written} valeurs écrites'
+        ))
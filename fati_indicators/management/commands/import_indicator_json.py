@@ -0,0 +1,72 @@
+"""
+Importer en flux les fichiers JSON d'indicateurs (sante.json, education.json)
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from fati_indicators.importers import (
+    IMPORT_BATCH_SIZE, ImportCheckpointError, JsonIndicatorImporter, sector_for_path,
+)
+from fati_indicators.models import Indicator
+
+
+class Command(BaseCommand):
+    help = "Import par lots, avec reprise, des fichiers JSON santé / éducation"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help="Fichiers JSON à importer")
+        parser.add_argument(
+            '--sector', choices=[choice[0] for choice in Indicator.Sector.choices],
+            help="Secteur (déduit du nom de fichier par défaut)"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+            help="Nombre de valeurs par lot"
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help="Fichier de reprise (par défaut <fichier>.checkpoint, un seul fichier importé)"
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help="Ignorer le fichier de reprise et repartir du début"
+        )
+    
+    def handle(self, *args, **options):
+        if options['checkpoint'] and len(options['paths']) > 1:
+            raise CommandError("--checkpoint n'est utilisable qu'avec un seul fichier")
+        
+        for path in options['paths']:
+            sector = options['sector'] or sector_for_path(path)
+            if sector is None:
+                raise CommandError(f"Secteur indéterminé pour {path} (utiliser --sector)")
+            try:
+                importer = JsonIndicatorImporter(
+                    path, sector,
+                    batch_size=options['batch_size'],
+                    checkpoint_path=options['checkpoint'],
+                    restart=options['restart'],
+                    report=lambda message: self.stdout.write(f'  {message}'),
+                )
+            except (OSError, ImportCheckpointError) as exc:
+                raise CommandError(str(exc))
+            
+            if importer.state['rows']:
+                self.stdout.write(
+                    f"Reprise de {path} après {importer.state['rows']} lignes"
+                )
+            result = importer.run()
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {path} : {result['rows']} lignes, {result['values']} valeurs, "
+                f"{result['indicators_created']} indicateurs créés "
+                f"({result['rows_per_second']:.0f} lignes/s)"
+            ))
+            if result['skipped']:
+                self.stdout.write(self.style.WARNING(
+                    f"⚠️  {result['skipped']} lignes ignorées (territoire non résolu)"
+                ))
+            for label, candidates in result['ambiguous'].items():
+                self.stdout.write(self.style.WARNING(
+                    f"  Libellé ambigu « {label} » : {', '.join(candidates)}"
+                ))
+            for label in result['unresolved']:
+                self.stdout.write(self.style.WARNING(f"  Libellé inconnu « {label} »"))
@@ -0,0 +1,17 @@
+"""
+Reconstruire le cube d'agrégats des indicateurs
+"""
+from django.core.management.base import BaseCommand
+
+from fati_indicators.cube import rebuild_cube
+from fati_indicators.models import IndicatorAggregate
+
+
+class Command(BaseCommand):
+    help = "Reconstruit entièrement la table IndicatorAggregate"
+    
+    def handle(self, *args, **options):
+        rebuild_cube()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Cube reconstruit : {IndicatorAggregate.objects.count()} cellules'
+        ))
@@ -0,0 +1,35 @@
+"""
+Consolider les valeurs d'indicateurs vers les niveaux territoriaux supérieurs
+"""
+from django.core.management.base import BaseCommand
+
+from fati_indicators.formulas import FormulaGraph
+from fati_indicators.models import Indicator
+from fati_indicators.rollup import rollup_indicator
+
+
+class Command(BaseCommand):
+    help = "Recalcule les valeurs consolidées (département, région, national)"
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--indicator', action='append', default=[],
+            help="Code d'indicateur à consolider (tous par défaut)"
+        )
+        parser.add_argument(
+            '--year', type=int, action='append',
+            help="Année à consolider (toutes par défaut)"
+        )
+    
+    def handle(self, *args, **options):
+        derived = {item.indicator.id for item in FormulaGraph().derived.values()}
+        indicators = Indicator.objects.filter(is_active=True).exclude(id__in=derived)
+        if options['indicator']:
+            indicators = indicators.filter(code__in=options['indicator'])
+        
+        count = 0
+        for indicator in indicators:
+            rollup_indicator(indicator, options['year'])
+            count += 1
+        
+        self.stdout.write(self.style.SUCCESS(f'✅ {count} indicateurs consolidés'))
@@ -0,0 +1,171 @@
+# Generated by Django 4.2.27 on 2026-10-18 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fati_indicators", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IndicatorAggregate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "level",
+                    models.CharField(
+                        choices=[
+                            ("all", "Tous niveaux"),
+                            ("national", "National"),
+                            ("region", "Région"),
+                            ("department", "Département"),
+                            ("commune", "Commune"),
+                        ],
+                        max_length=20,
+                        verbose_name="niveau territorial",
+                    ),
+                ),
+                (
+                    "territory_id",
+                    models.PositiveBigIntegerField(
+                        default=0,
+                        help_text="0 : tous les territoires du niveau",
+                        verbose_name="territoire",
+                    ),
+                ),
+                ("year", models.PositiveIntegerField(verbose_name="année")),
+                (
+                    "period",
+                    models.CharField(blank=True, max_length=20, verbose_name="période"),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("draft", "Brouillon"),
+                            ("pending", "En attente"),
+                            ("validated", "Validé"),
+                            ("rejected", "Rejeté"),
+                        ],
+                        max_length=20,
+                        verbose_name="statut",
+                    ),
+                ),
+                (
+                    "count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="nombre de valeurs"
+                    ),
+                ),
+                ("sum_value", models.FloatField(default=0, verbose_name="somme")),
+                (
+                    "avg_value",
+                    models.FloatField(blank=True, null=True, verbose_name="moyenne"),
+                ),
+                (
+                    "min_value",
+                    models.FloatField(blank=True, null=True, verbose_name="minimum"),
+                ),
+                (
+                    "max_value",
+                    models.FloatField(blank=True, null=True, verbose_name="maximum"),
+                ),
+                (
+                    "latest_value",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="dernière valeur"
+                    ),
+                ),
+                (
+                    "achievement_sum",
+                    models.FloatField(
+                        default=0, verbose_name="somme des taux de réalisation"
+                    ),
+                ),
+                (
+                    "achievement_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="nombre de taux de réalisation"
+                    ),
+                ),
+                (
+                    "refreshed_at",
+                    models.DateTimeField(auto_now=True, verbose_name="recalculé le"),
+                ),
+                (
+                    "indicator",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="aggregates",
+                        to="fati_indicators.indicator",
+                        verbose_name="indicateur",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "agrégat d'indicateur",
+                "verbose_name_plural": "agrégats d'indicateurs",
+                "ordering": ["-year", "indicator", "level"],
+                "indexes": [
+                    models.Index(
+                        fields=["level", "status", "year"],
+                        name="fati_indica_level_10ce32_idx",
+                    )
+                ],
+                "unique_together": {
+                    ("indicator", "level", "territory_id", "year", "period", "status")
+                },
+            },
+        ),
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO fati_indicators_indicatoraggregate (
+                    indicator_id, level, territory_id, year, period, status,
+                    count, sum_value, avg_value, min_value, max_value, latest_value,
+                    achievement_sum, achievement_count, refreshed_at
+                )
+                SELECT
+                    indicator_id,
+                    CASE WHEN GROUPING(level) = 1 THEN 'all' ELSE level END,
+                    CASE WHEN GROUPING(territory_id) = 1 THEN 0 ELSE territory_id END,
+                    year, period, status,
+                    COUNT(*), SUM(value), AVG(value), MIN(value), MAX(value),
+                    (ARRAY_AGG(value ORDER BY updated_at DESC, id DESC))[1],
+                    COALESCE(SUM(achievement_rate), 0), COUNT(achievement_rate), NOW()
+                FROM (
+                    SELECT
+                        v.*,
+                        CASE
+                            WHEN v.commune_id IS NOT NULL THEN 'commune'
+                            WHEN v.department_id IS NOT NULL THEN 'department'
+                            WHEN v.region_id IS NOT NULL THEN 'region'
+                            ELSE 'national'
+                        END AS level,
+                        COALESCE(v.commune_id, v.department_id, v.region_id, 0) AS territory_id
+                    FROM fati_indicators_indicatorvalue v
+                ) s
+                GROUP BY GROUPING SETS (
+                    (indicator_id, year, period, status, level, territory_id),
+                    (indicator_id, year, period, status, level),
+                    (indicator_id, year, period, status)
+                )
+                HAVING NOT (
+                    GROUPING(territory_id) = 1 AND GROUPING(level) = 0
+                    AND level = 'national'
+                )
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.27 on 2026-10-18 23:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fati_indicators", "0002_indicatoraggregate"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="indicatorvalue",
+            index=models.Index(fields=["year", "indicator", "id"], name="fati_indica_year_1bea7b_idx"),
+        ),
+    ]
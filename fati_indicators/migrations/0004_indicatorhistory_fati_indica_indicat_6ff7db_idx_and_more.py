@@ -0,0 +1,21 @@
+# Generated by Django 4.2.27 on 2026-10-18 23:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fati_indicators", "0003_indicatorvalue_fati_indica_year_1bea7b_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="indicatorhistory",
+            index=models.Index(fields=["indicator_value", "created_at", "id"], name="fati_indica_indicat_6ff7db_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="indicatorhistory",
+            index=models.Index(fields=["created_at", "id"], name="fati_indica_created_2df15b_idx"),
+        ),
+    ]
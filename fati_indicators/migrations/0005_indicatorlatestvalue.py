@@ -0,0 +1,63 @@
+# Generated by Django 4.2.27 on 2026-10-18 23:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fati_indicators", "0004_indicatorhistory_fati_indica_indicat_6ff7db_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IndicatorLatestValue",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("level", models.CharField(choices=[("all", "Tous niveaux"), ("national", "National"), ("region", "Région"), ("department", "Département"), ("commune", "Commune")], max_length=20, verbose_name="niveau territorial")),
+                ("territory_id", models.PositiveBigIntegerField(default=0, verbose_name="territoire")),
+                ("year", models.PositiveIntegerField(verbose_name="année")),
+                ("period", models.CharField(blank=True, max_length=20, verbose_name="période")),
+                ("value", models.FloatField(verbose_name="valeur")),
+                ("achievement_rate", models.FloatField(blank=True, null=True, verbose_name="taux de réalisation")),
+                ("refreshed_at", models.DateTimeField(auto_now=True, verbose_name="recalculé le")),
+                ("indicator", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="latest_values", to="fati_indicators.indicator", verbose_name="indicateur")),
+                ("indicator_value", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="+", to="fati_indicators.indicatorvalue", verbose_name="valeur d'indicateur")),
+            ],
+            options={
+                "verbose_name": "dernière valeur d'indicateur",
+                "verbose_name_plural": "dernières valeurs d'indicateurs",
+                "indexes": [models.Index(fields=["level", "territory_id"], name="fati_indica_level_5f1491_idx")],
+                "unique_together": {("indicator", "level", "territory_id")},
+            },
+        ),
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO fati_indicators_indicatorlatestvalue (
+                    indicator_id, level, territory_id, indicator_value_id,
+                    year, period, value, achievement_rate, refreshed_at
+                )
+                SELECT DISTINCT ON (indicator_id, level, territory_id)
+                    indicator_id, level, territory_id, id,
+                    year, period, value, achievement_rate, NOW()
+                FROM (
+                    SELECT
+                        v.id, v.indicator_id, v.year, v.period, v.value,
+                        v.achievement_rate, v.updated_at,
+                        CASE
+                            WHEN v.commune_id IS NOT NULL THEN 'commune'
+                            WHEN v.department_id IS NOT NULL THEN 'department'
+                            WHEN v.region_id IS NOT NULL THEN 'region'
+                            ELSE 'national'
+                        END AS level,
+                        COALESCE(v.commune_id, v.department_id, v.region_id, 0) AS territory_id
+                    FROM fati_indicators_indicatorvalue v
+                    WHERE v.status = 'validated'
+                ) s
+                ORDER BY indicator_id, level, territory_id, year DESC, period DESC,
+                         updated_at DESC, id DESC
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.27 on 2026-10-18 23:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fati_indicators", "0005_indicatorlatestvalue"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IndicatorProjection",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("level", models.CharField(choices=[("all", "Tous niveaux"), ("national", "National"), ("region", "Région"), ("department", "Département"), ("commune", "Commune")], max_length=20, verbose_name="niveau territorial")),
+                ("territory_id", models.PositiveBigIntegerField(default=0, verbose_name="territoire")),
+                ("period", models.CharField(blank=True, max_length=20, verbose_name="période")),
+                ("points", models.PositiveIntegerField(verbose_name="nombre de points")),
+                ("first_year", models.PositiveIntegerField(verbose_name="première année")),
+                ("last_year", models.PositiveIntegerField(verbose_name="dernière année")),
+                ("last_value", models.FloatField(verbose_name="dernière valeur")),
+                ("slope", models.FloatField(blank=True, null=True, verbose_name="pente annuelle")),
+                ("intercept", models.FloatField(blank=True, null=True, verbose_name="ordonnée à l'origine")),
+                ("r2", models.FloatField(blank=True, null=True, verbose_name="coefficient de détermination")),
+                ("target_value", models.FloatField(blank=True, null=True, verbose_name="valeur cible")),
+                ("target_year", models.PositiveIntegerField(blank=True, null=True, verbose_name="année d'atteinte projetée")),
+                ("status", models.CharField(choices=[("reached", "Cible atteinte"), ("projected", "Atteinte projetée"), ("diverging", "Tendance défavorable"), ("no_target", "Sans cible"), ("insufficient", "Série insuffisante")], max_length=20, verbose_name="statut")),
+                ("signature", models.CharField(max_length=100, verbose_name="signature de la série")),
+                ("computed_at", models.DateTimeField(auto_now=True, verbose_name="calculé le")),
+                ("indicator", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="projections", to="fati_indicators.indicator", verbose_name="indicateur")),
+            ],
+            options={
+                "verbose_name": "projection d'indicateur",
+                "verbose_name_plural": "projections d'indicateurs",
+                "unique_together": {("indicator", "level", "territory_id", "period")},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.27 on 2026-10-18 23:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fati_indicators", "0006_indicatorprojection"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="indicatorvalue",
+            index=models.Index(fields=["indicator", "status", "year"], name="fati_indica_indicat_aa5b62_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="indicatorvalue",
+            index=models.Index(fields=["region", "year"], name="fati_indica_region__3f66e7_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="indicatorvalue",
+            index=models.Index(fields=["status", "year"], name="fati_indica_status_c934dc_idx"),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.27 on 2026-10-19 00:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fati_indicators", "0007_indicatorvalue_fati_indica_indicat_aa5b62_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChangeScan",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=50, unique=True, verbose_name="nom")),
+                ("last_transaction_id", models.PositiveBigIntegerField(default=0, verbose_name="dernière transaction traitée")),
+                ("last_change_id", models.PositiveBigIntegerField(default=0, verbose_name="dernière modification traitée")),
+                ("values_scanned", models.PositiveIntegerField(default=0, verbose_name="valeurs analysées")),
+                ("results_created", models.PositiveIntegerField(default=0, verbose_name="résultats créés")),
+                ("scanned_at", models.DateTimeField(blank=True, null=True, verbose_name="analysé le")),
+            ],
+            options={
+                "verbose_name": "analyse incrémentale",
+                "verbose_name_plural": "analyses incrémentales",
+            },
+        ),
+        migrations.CreateModel(
+            name="IndicatorValueChange",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("indicator_value_id", models.PositiveBigIntegerField(verbose_name="valeur d'indicateur")),
+                ("transaction_id", models.PositiveBigIntegerField(verbose_name="transaction")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="journalisé le")),
+            ],
+            options={
+                "verbose_name": "modification de valeur",
+                "verbose_name_plural": "modifications de valeurs",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="indicatorvaluechange",
+            index=models.Index(fields=["transaction_id", "id"], name="fati_indica_transac_0fb1c5_idx"),
+        ),
+    ]
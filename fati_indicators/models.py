@@ -3,6 +3,7 @@ FATI Indicators - Modèles d'indicateurs
 """
 from django.contrib.gis.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db import transaction
 from django.utils.translation import gettext_lazy as _
 
 
@@ -173,6 +174,16 @@ class IndicatorValue(models.Model):
         unique_together = [
             ['indicator', 'region', 'department', 'commune', 'year', 'period']
         ]
+        indexes = [
+            # Pagination par curseur (year, indicator, id)
+            models.Index(fields=['year', 'indicator', 'id']),
+            # Valeurs d'un indicateur filtrées par statut et année
+            models.Index(fields=['indicator', 'status', 'year']),
+            # Liste et classements d'une région, les plus récentes d'abord
+            models.Index(fields=['region', 'year']),
+            # File de validation (status=pending) triée par année
+            models.Index(fields=['status', 'year']),
+        ]
     
     def __str__(self):
         territory = self.commune or self.department or self.region
@@ -188,7 +199,16 @@ class IndicatorValue(models.Model):
         if target and target != 0:
             self.achievement_rate = (self.value / target) * 100
         
-        super().save(*args, **kwargs)
+        # Valeur et entrée du journal des modifications (post_save) dans la
+        # même transaction
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+    
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        # État d'origine mémorisé par les signaux : champs rechargés seulement
+        from .signals import reset_original_state
+        reset_original_state(self, fields)
     
     @property
     def value_formatted(self):
@@ -249,3 +269,238 @@ class IndicatorHistory(models.Model):
         verbose_name = _('historique d\'indicateur')
         verbose_name_plural = _('historiques d\'indicateurs')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['indicator_value', 'created_at', 'id']),
+            models.Index(fields=['created_at', 'id']),
+        ]
+
+
+class IndicatorAggregate(models.Model):
+    """
+    Cube d'agrégats des valeurs d'indicateurs.
+    
+    Une cellule par (indicateur, niveau, territoire, année, période, statut).
+    Les cellules ``territory_id = 0`` agrègent tous les territoires d'un
+    niveau ; le niveau ``all`` agrège tous les niveaux.
+    """
+    
+    class Level(models.TextChoices):
+        ALL = 'all', _('Tous niveaux')
+        NATIONAL = 'national', _('National')
+        REGION = 'region', _('Région')
+        DEPARTMENT = 'department', _('Département')
+        COMMUNE = 'commune', _('Commune')
+    
+    indicator = models.ForeignKey(
+        Indicator,
+        on_delete=models.CASCADE,
+        related_name='aggregates',
+        verbose_name=_('indicateur')
+    )
+    level = models.CharField(
+        _('niveau territorial'),
+        max_length=20,
+        choices=Level.choices
+    )
+    territory_id = models.PositiveBigIntegerField(
+        _('territoire'),
+        default=0,
+        help_text=_('0 : tous les territoires du niveau')
+    )
+    
+    year = models.PositiveIntegerField(_('année'))
+    period = models.CharField(_('période'), max_length=20, blank=True)
+    status = models.CharField(
+        _('statut'),
+        max_length=20,
+        choices=IndicatorValue.Status.choices
+    )
+    
+    # Agrégats
+    count = models.PositiveIntegerField(_('nombre de valeurs'), default=0)
+    sum_value = models.FloatField(_('somme'), default=0)
+    avg_value = models.FloatField(_('moyenne'), null=True, blank=True)
+    min_value = models.FloatField(_('minimum'), null=True, blank=True)
+    max_value = models.FloatField(_('maximum'), null=True, blank=True)
+    latest_value = models.FloatField(_('dernière valeur'), null=True, blank=True)
+    achievement_sum = models.FloatField(_('somme des taux de réalisation'), default=0)
+    achievement_count = models.PositiveIntegerField(_('nombre de taux de réalisation'), default=0)
+    
+    refreshed_at = models.DateTimeField(_('recalculé le'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('agrégat d\'indicateur')
+        verbose_name_plural = _('agrégats d\'indicateurs')
+        ordering = ['-year', 'indicator', 'level']
+        unique_together = [
+            ['indicator', 'level', 'territory_id', 'year', 'period', 'status']
+        ]
+        indexes = [
+            models.Index(fields=['level', 'status', 'year']),
+        ]
+    
+    def __str__(self):
+        return f"{self.indicator_id} - {self.level}:{self.territory_id} ({self.year} {self.status})"
+    
+    @property
+    def avg_achievement_rate(self):
+        if not self.achievement_count:
+            return None
+        return self.achievement_sum / self.achievement_count
+
+
+class IndicatorLatestValue(models.Model):
+    """
+    Dernière valeur validée par indicateur et territoire.
+    
+    Maintenue avec le cube d'agrégats : une ligne par (indicateur, niveau,
+    territoire), ``territory_id = 0`` pour le niveau national. La dernière
+    valeur est celle de l'année puis de la période la plus récente.
+    """
+    
+    indicator = models.ForeignKey(
+        Indicator,
+        on_delete=models.CASCADE,
+        related_name='latest_values',
+        verbose_name=_('indicateur')
+    )
+    level = models.CharField(
+        _('niveau territorial'),
+        max_length=20,
+        choices=IndicatorAggregate.Level.choices
+    )
+    territory_id = models.PositiveBigIntegerField(_('territoire'), default=0)
+    
+    indicator_value = models.ForeignKey(
+        IndicatorValue,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_('valeur d\'indicateur')
+    )
+    year = models.PositiveIntegerField(_('année'))
+    period = models.CharField(_('période'), max_length=20, blank=True)
+    value = models.FloatField(_('valeur'))
+    achievement_rate = models.FloatField(_('taux de réalisation'), null=True, blank=True)
+    
+    refreshed_at = models.DateTimeField(_('recalculé le'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('dernière valeur d\'indicateur')
+        verbose_name_plural = _('dernières valeurs d\'indicateurs')
+        unique_together = [
+            ['indicator', 'level', 'territory_id']
+        ]
+        indexes = [
+            # Cartes : toutes les dernières valeurs d'un niveau
+            models.Index(fields=['level', 'territory_id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.indicator_id} - {self.level}:{self.territory_id} ({self.year})"
+
+
+class IndicatorProjection(models.Model):
+    """
+    Tendance linéaire de la série validée d'un territoire et année projetée
+    d'atteinte de la cible.
+    
+    Une ligne par (indicateur, niveau, territoire, période). ``signature``
+    résume la série (effectif, dernière modification, cible) : seules les
+    séries dont la signature change sont recalculées.
+    """
+    
+    class Status(models.TextChoices):
+        REACHED = 'reached', _('Cible atteinte')
+        PROJECTED = 'projected', _('Atteinte projetée')
+        DIVERGING = 'diverging', _('Tendance défavorable')
+        NO_TARGET = 'no_target', _('Sans cible')
+        INSUFFICIENT = 'insufficient', _('Série insuffisante')
+    
+    indicator = models.ForeignKey(
+        Indicator,
+        on_delete=models.CASCADE,
+        related_name='projections',
+        verbose_name=_('indicateur')
+    )
+    level = models.CharField(
+        _('niveau territorial'),
+        max_length=20,
+        choices=IndicatorAggregate.Level.choices
+    )
+    territory_id = models.PositiveBigIntegerField(_('territoire'), default=0)
+    period = models.CharField(_('période'), max_length=20, blank=True)
+    
+    # Série
+    points = models.PositiveIntegerField(_('nombre de points'))
+    first_year = models.PositiveIntegerField(_('première année'))
+    last_year = models.PositiveIntegerField(_('dernière année'))
+    last_value = models.FloatField(_('dernière valeur'))
+    
+    # Tendance (moindres carrés : valeur = pente * année + ordonnée)
+    slope = models.FloatField(_('pente annuelle'), null=True, blank=True)
+    intercept = models.FloatField(_('ordonnée à l\'origine'), null=True, blank=True)
+    r2 = models.FloatField(_('coefficient de détermination'), null=True, blank=True)
+    
+    # Projection
+    target_value = models.FloatField(_('valeur cible'), null=True, blank=True)
+    target_year = models.PositiveIntegerField(_('année d\'atteinte projetée'), null=True, blank=True)
+    status = models.CharField(_('statut'), max_length=20, choices=Status.choices)
+    
+    signature = models.CharField(_('signature de la série'), max_length=100)
+    computed_at = models.DateTimeField(_('calculé le'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('projection d\'indicateur')
+        verbose_name_plural = _('projections d\'indicateurs')
+        unique_together = [
+            ['indicator', 'level', 'territory_id', 'period']
+        ]
+    
+    def __str__(self):
+        return f"{self.indicator_id} - {self.level}:{self.territory_id} ({self.status})"
+
+
+class IndicatorValueChange(models.Model):
+    """
+    Journal des modifications de valeurs, écrit dans la transaction qui
+    modifie la valeur.
+    
+    Chaque entrée porte l'identifiant de sa transaction (``txid_current()``) :
+    les moteurs incrémentaux ne lisent que les transactions antérieures au
+    ``xmin`` de leur instantané, toutes terminées, au-delà de leur point de
+    reprise (``ChangeScan``). Pas de clé étrangère : les suppressions sont
+    journalisées aussi.
+    """
+    
+    indicator_value_id = models.PositiveBigIntegerField(_('valeur d\'indicateur'))
+    transaction_id = models.PositiveBigIntegerField(_('transaction'))
+    created_at = models.DateTimeField(_('journalisé le'), auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('modification de valeur')
+        verbose_name_plural = _('modifications de valeurs')
+        indexes = [
+            models.Index(fields=['transaction_id', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.indicator_value_id} ({self.created_at})"
+
+
+class ChangeScan(models.Model):
+    """Point de reprise d'un moteur incrémental dans le journal des modifications"""
+    
+    name = models.CharField(_('nom'), max_length=50, unique=True)
+    last_transaction_id = models.PositiveBigIntegerField(_('dernière transaction traitée'), default=0)
+    last_change_id = models.PositiveBigIntegerField(_('dernière modification traitée'), default=0)
+    
+    values_scanned = models.PositiveIntegerField(_('valeurs analysées'), default=0)
+    results_created = models.PositiveIntegerField(_('résultats créés'), default=0)
+    scanned_at = models.DateTimeField(_('analysé le'), null=True, blank=True)
+    
+    class Meta:
+        verbose_name = _('analyse incrémentale')
+        verbose_name_plural = _('analyses incrémentales')
+    
+    def __str__(self):
+        return f"{self.name} ({self.last_transaction_id}, {self.last_change_id})"
@@ -0,0 +1,219 @@
+"""
+FATI Indicators - Projections d'atteinte des cibles
+
+Pour chaque série validée (indicateur, niveau, territoire, période), une
+droite des moindres carrés valeur = pente x année + ordonnée est ajustée ;
+l'année où elle atteint la cible est stockée dans ``IndicatorProjection``.
+Les ajustements sont vectorisés (sommes par série avec ``np.bincount``)
+et seules les séries dont la signature (effectif, dernière modification,
+cible) a changé sont rechargées et recalculées ; après une écriture, le
+cube ne compare que les séries des tranches touchées.
+"""
+import math
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import Indicator, IndicatorProjection, IndicatorValue
+
+
+# Nombre minimal d'années pour ajuster une tendance
+MIN_POINTS = 3
+# Au-delà, l'atteinte n'est pas projetée (tendance trop lente)
+PROJECTION_HORIZON = 100
+
+_SERIES_SQL = """
+    SELECT indicator_id, level, territory_id, period, {columns}
+    FROM (
+        SELECT
+            v.id, v.indicator_id, v.year, v.period, v.value, v.target_value,
+            v.updated_at,
+            CASE
+                WHEN v.commune_id IS NOT NULL THEN 'commune'
+                WHEN v.department_id IS NOT NULL THEN 'department'
+                WHEN v.region_id IS NOT NULL THEN 'region'
+                ELSE 'national'
+            END AS level,
+            COALESCE(v.commune_id, v.department_id, v.region_id, 0) AS territory_id
+        FROM {value} v
+        WHERE v.status = 'validated' AND v.indicator_id = ANY(%s::bigint[])
+    ) s
+    {tail}
+"""
+
+_SERIES_FILTER = """
+    WHERE (indicator_id, level, territory_id, period) IN (
+        SELECT * FROM unnest(%s::bigint[], %s::varchar[], %s::bigint[], %s::varchar[])
+    )
+"""
+
+_SIGNATURE_COLUMNS = 'COUNT(*), MAX(updated_at)'
+_SIGNATURE_TAIL = 'GROUP BY indicator_id, level, territory_id, period'
+
+_POINTS_COLUMNS = 'year, value, target_value'
+_POINTS_TAIL = _SERIES_FILTER + """
+    ORDER BY indicator_id, level, territory_id, period, year
+"""
+
+
+def _fetch(columns, tail, params):
+    sql = _SERIES_SQL.format(
+        columns=columns, tail=tail, value=IndicatorValue._meta.db_table
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def fit_series(groups, years, values, count):
+    """
+    Moindres carrés par série. ``groups`` : indice 0..count-1 de chaque
+    point. Renvoie (effectif, pente, ordonnée, r²), NaN si indéterminé.
+    """
+    n = np.bincount(groups, minlength=count).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = np.bincount(groups, years, minlength=count) / n
+        mean_y = np.bincount(groups, values, minlength=count) / n
+        dx = years - mean_x[groups]
+        dy = values - mean_y[groups]
+        sxx = np.bincount(groups, dx * dx, minlength=count)
+        sxy = np.bincount(groups, dx * dy, minlength=count)
+        syy = np.bincount(groups, dy * dy, minlength=count)
+        slope = np.where(sxx > 0, sxy / sxx, np.nan)
+        intercept = mean_y - slope * mean_x
+        r2 = np.where((sxx > 0) & (syy > 0), sxy ** 2 / (sxx * syy), np.nan)
+    return n.astype(int), slope, intercept, r2
+
+
+def project(first_value, last_value, last_year, points, slope, intercept, target):
+    """(statut, année projetée) d'une série"""
+    Status = IndicatorProjection.Status
+    if target is None:
+        return Status.NO_TARGET, None
+    # Sens de progression attendu : de la première valeur vers la cible
+    direction = np.sign(target - first_value)
+    if direction == 0 or (last_value - target) * direction >= 0:
+        return Status.REACHED, None
+    if points < MIN_POINTS or math.isnan(slope):
+        return Status.INSUFFICIENT, None
+    if slope * direction <= 0:
+        return Status.DIVERGING, None
+    year = max(math.ceil((target - intercept) / slope), last_year + 1)
+    if year > last_year + PROJECTION_HORIZON:
+        return Status.DIVERGING, None
+    return Status.PROJECTED, year
+
+
+def _signature(count, updated_at, target):
+    return f'{count}:{updated_at.isoformat()}:{target}'
+
+
+def _series_params(keys):
+    return [list(column) for column in zip(*keys)]
+
+
+def refresh_projections(indicator_ids=None, full=False, series=None):
+    """
+    Recalculer les projections des séries modifiées (toutes si ``full``),
+    des indicateurs ``indicator_ids`` ou des seules séries ``series``
+    (indicator_id, level, territory_id, period). Renvoie le nombre de
+    séries recalculées.
+    """
+    if series is not None:
+        series = set(series)
+        indicator_ids = {key[0] for key in series}
+    indicators = Indicator.objects.all()
+    if indicator_ids is not None:
+        indicators = indicators.filter(id__in=indicator_ids)
+    targets = dict(indicators.values_list('id', 'target_value'))
+    ids = sorted(targets)
+    if not ids:
+        return 0
+
+    stored = IndicatorProjection.objects.filter(indicator_id__in=ids)
+    if series is None:
+        rows = _fetch(_SIGNATURE_COLUMNS, _SIGNATURE_TAIL, [ids])
+    else:
+        series = {key for key in series if key[0] in targets}
+        if not series:
+            return 0
+        rows = _fetch(
+            _SIGNATURE_COLUMNS, _SERIES_FILTER + _SIGNATURE_TAIL,
+            [ids] + _series_params(series)
+        )
+        stored = stored.filter(period__in={key[3] for key in series})
+    current = {
+        tuple(row[:4]): _signature(row[4], row[5], targets[row[0]])
+        for row in rows
+    }
+    stored = {
+        tuple(row[:4]): row[4]
+        for row in stored.values_list(
+            'indicator_id', 'level', 'territory_id', 'period', 'signature'
+        )
+        if series is None or tuple(row[:4]) in series
+    }
+    changed = sorted(
+        key for key, signature in current.items()
+        if full or stored.get(key) != signature
+    )
+    removed = stored.keys() - current.keys()
+
+    projections = []
+    if changed:
+        rows = _fetch(_POINTS_COLUMNS, _POINTS_TAIL, [ids] + _series_params(changed))
+        index = {key: position for position, key in enumerate(changed)}
+        groups = np.fromiter((index[tuple(row[:4])] for row in rows), dtype=np.intp, count=len(rows))
+        years = np.fromiter((row[4] for row in rows), dtype=float, count=len(rows))
+        values = np.fromiter((row[5] for row in rows), dtype=float, count=len(rows))
+        n, slope, intercept, r2 = fit_series(groups, years, values, len(changed))
+
+        # Premier et dernier point de chaque série, quel que soit l'ordre
+        # des séries renvoyé par la base (collation des périodes)
+        positions = np.arange(len(rows))
+        starts = np.full(len(changed), len(rows))
+        ends = np.full(len(changed), -1)
+        np.minimum.at(starts, groups, positions)
+        np.maximum.at(ends, groups, positions)
+        for position, key in enumerate(changed):
+            if not n[position]:
+                # Série supprimée entre les deux lectures
+                continue
+            first, last = rows[starts[position]], rows[ends[position]]
+            target = last[6] if last[6] is not None else targets[key[0]]
+            status, target_year = project(
+                first[5], last[5], last[4], int(n[position]),
+                slope[position], intercept[position], target
+            )
+            projections.append(IndicatorProjection(
+                indicator_id=key[0], level=key[1], territory_id=key[2], period=key[3],
+                points=int(n[position]), first_year=first[4], last_year=last[4],
+                last_value=last[5],
+                slope=None if np.isnan(slope[position]) else float(slope[position]),
+                intercept=None if np.isnan(intercept[position]) else float(intercept[position]),
+                r2=None if np.isnan(r2[position]) else float(r2[position]),
+                target_value=target, target_year=target_year, status=status,
+                signature=current[key],
+            ))
+
+    with transaction.atomic():
+        if removed:
+            condition = Q(pk__in=[])
+            for indicator_id, level, territory_id, period in removed:
+                condition |= Q(
+                    indicator_id=indicator_id, level=level,
+                    territory_id=territory_id, period=period
+                )
+            IndicatorProjection.objects.filter(condition).delete()
+        IndicatorProjection.objects.bulk_create(
+            projections,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['indicator', 'level', 'territory_id', 'period'],
+            update_fields=[
+                'points', 'first_year', 'last_year', 'last_value', 'slope', 'intercept',
+                'r2', 'target_value', 'target_year', 'status', 'signature', 'computed_at',
+            ],
+        )
+    return len(projections)
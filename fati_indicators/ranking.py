@@ -0,0 +1,102 @@
+"""
+FATI Indicators - Classement des territoires
+
+Rang, rang centile, écart à la moyenne des territoires et évolution du
+rang depuis l'année précédente, calculés en une requête avec les fonctions
+de fenêtrage ``RANK``, ``PERCENT_RANK``, ``AVG`` et ``LAG``.
+"""
+from django.db import connection
+
+from fati_backend.cache import get_or_compute
+from .models import IndicatorValue
+from .series import TERRITORY_LEVELS
+
+
+# Colonne territoire et conditions d'une valeur saisie exactement au niveau
+_LEVEL_COLUMNS = {
+    'region': ('region_id', 'v.department_id IS NULL AND v.commune_id IS NULL'),
+    'department': ('department_id', 'v.commune_id IS NULL'),
+    'commune': ('commune_id', 'TRUE'),
+}
+
+_RANKING_SQL = """
+    SELECT territory_id, t.code, t.name, value, rank, percentile, mean, count,
+           previous_rank, previous_rank - rank AS rank_change
+    FROM (
+        SELECT *,
+            LAG(rank) OVER (PARTITION BY territory_id ORDER BY year) AS previous_rank
+        FROM (
+            SELECT
+                v.{column} AS territory_id, v.year, v.value,
+                RANK() OVER (PARTITION BY v.year ORDER BY v.value DESC) AS rank,
+                PERCENT_RANK() OVER (PARTITION BY v.year ORDER BY v.value) AS percentile,
+                AVG(v.value) OVER (PARTITION BY v.year) AS mean,
+                COUNT(*) OVER (PARTITION BY v.year) AS count
+            FROM {value} v
+            WHERE v.indicator_id = %s AND v.status = 'validated' AND v.period = %s
+              AND v.year IN (%s, %s) AND v.{column} IS NOT NULL AND {condition}
+        ) ranked
+    ) lagged
+    JOIN {territory} t ON t.id = territory_id
+    WHERE year = %s
+    ORDER BY rank, t.name
+"""
+
+
+def latest_ranked_year(indicator, level, period=''):
+    column, _ = _LEVEL_COLUMNS[level]
+    values = IndicatorValue.objects.filter(
+        indicator=indicator, status=IndicatorValue.Status.VALIDATED, period=period,
+        **{f'{column}__isnull': False}
+    )
+    if level != 'commune':
+        values = values.filter(commune__isnull=True)
+    if level == 'region':
+        values = values.filter(department__isnull=True)
+    return values.order_by('-year').values_list('year', flat=True).first()
+
+
+def build_ranking(indicator, level='region', year=None, period=''):
+    """Classement des territoires d'un niveau pour une année"""
+    if year is None:
+        year = latest_ranked_year(indicator, level, period)
+    result = {'year': year, 'level': level, 'period': period, 'mean': None, 'ranking': []}
+    if year is None:
+        return result
+
+    column, condition = _LEVEL_COLUMNS[level]
+    sql = _RANKING_SQL.format(
+        column=column,
+        condition=condition,
+        value=IndicatorValue._meta.db_table,
+        territory=TERRITORY_LEVELS[level]._meta.db_table,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [indicator.id, period, year, year - 1, year])
+        rows = cursor.fetchall()
+
+    for territory_id, code, name, value, rank, percentile, mean, count, previous_rank, rank_change in rows:
+        result['mean'] = mean
+        result['ranking'].append({
+            'territory_id': territory_id,
+            'code': code,
+            'name': name,
+            'value': value,
+            'rank': rank,
+            'count': count,
+            'percentile': round(percentile * 100, 1),
+            'deviation': value - mean,
+            'deviation_pct': (value - mean) / abs(mean) * 100 if mean else None,
+            'previous_rank': previous_rank,
+            'rank_change': rank_change,
+        })
+    return result
+
+
+def cached_ranking(indicator, level, year, period=''):
+    """``build_ranking`` mis en cache, invalidé avec le cube de l'indicateur"""
+    return get_or_compute(
+        f'indicator_values:{indicator.id}',
+        {'view': 'ranking', 'level': level, 'year': year, 'period': period},
+        lambda: build_ranking(indicator, level, year, period)
+    )
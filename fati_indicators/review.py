@@ -0,0 +1,96 @@
+"""
+FATI Indicators - Validation et rejet en masse
+
+Les droits et le périmètre territorial sont appliqués sur l'ensemble des
+valeurs ciblées, le statut est modifié en un seul ``UPDATE`` et les entrées
+d'historique et de journal d'audit sont insérées par lots.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from fati_audit.models import AuditLog
+from .changes import log_changes
+from .cube import schedule_refresh
+from .formulas import FORMULA_SOURCE, schedule_recompute
+from .models import IndicatorHistory, IndicatorValue
+from .rollup import ROLLUP_SOURCE, schedule_rollup
+
+
+REVIEW_BATCH_SIZE = 1000
+
+# Statut cible -> (action d'audit, libellé)
+REVIEW_ACTIONS = {
+    IndicatorValue.Status.VALIDATED: (AuditLog.Action.VALIDATE, 'Validation'),
+    IndicatorValue.Status.REJECTED: (AuditLog.Action.REJECT, 'Rejet'),
+}
+
+
+def can_review(user, new_status):
+    """Les agents de saisie valident sur leur territoire mais ne rejettent pas"""
+    if user.is_admin or user.is_institution:
+        return True
+    return new_status == IndicatorValue.Status.VALIDATED and user.is_local_manager
+
+
+def review_values(queryset, user, new_status, reason='', request=None):
+    """
+    Passer au statut ``new_status`` les valeurs de ``queryset``.
+
+    ``queryset`` doit déjà être restreint au périmètre de l'utilisateur.
+    Les valeurs déjà au statut cible sont ignorées. Renvoie la liste des
+    identifiants modifiés.
+    """
+    action, label = REVIEW_ACTIONS[new_status]
+    now = timezone.now()
+    change_reason = f'{label} en masse' + (f' : {reason}' if reason else '')
+
+    with transaction.atomic():
+        rows = list(
+            queryset.exclude(status=new_status).order_by('id').select_for_update(of=('self',))
+            .values_list(
+                'id', 'status', 'value', 'indicator_id', 'indicator__name',
+                'year', 'period', 'region_id', 'department_id', 'commune_id', 'source'
+            )
+        )
+        if not rows:
+            return []
+        ids = [row[0] for row in rows]
+
+        fields = {'status': new_status, 'updated_at': now}
+        if new_status == IndicatorValue.Status.VALIDATED:
+            fields.update(validated_by=user, validated_at=now)
+        IndicatorValue.objects.filter(id__in=ids).update(**fields)
+
+        IndicatorHistory.objects.bulk_create([
+            IndicatorHistory(
+                indicator_value_id=row[0],
+                old_value=row[2],
+                new_value=row[2],
+                changed_by=user,
+                change_reason=change_reason,
+            )
+            for row in rows
+        ], batch_size=REVIEW_BATCH_SIZE)
+        AuditLog.objects.bulk_create([
+            AuditLog.build(
+                user, action, 'IndicatorValue', row[0],
+                entity_name=f'{row[4]} ({row[5]})'[:255],
+                old_values={'status': row[1]},
+                new_values={'status': new_status, 'reason': reason} if reason
+                else {'status': new_status},
+                request=request,
+            )
+            for row in rows
+        ], batch_size=REVIEW_BATCH_SIZE)
+
+        # Un UPDATE ne déclenche pas les signaux : planifier les recalculs
+        schedule_refresh({(row[3], row[5], row[6]) for row in rows})
+        log_changes(ids)
+        schedule_rollup({
+            (row[3], row[5], row[6], row[7], row[8], row[9])
+            for row in rows if row[10] not in (FORMULA_SOURCE, ROLLUP_SOURCE)
+        })
+        schedule_recompute({
+            (row[3], row[5], row[6]) for row in rows if row[10] != FORMULA_SOURCE
+        })
+    return ids
@@ -0,0 +1,226 @@
+"""
+FATI Indicators - Consolidation territoriale
+
+Les valeurs validées sont agrégées vers le niveau parent
+(commune -> département -> région -> national) : somme pour les effectifs
+et montants, moyenne pondérée par la population pour les autres types.
+Les lignes consolidées portent la source ``ROLLUP_SOURCE`` ; une valeur
+saisie au niveau parent reste prioritaire et n'est jamais écrasée.
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from fati_backend.transactions import defer_batch
+from fati_geography.models import Commune, Department
+from .models import Indicator, IndicatorValue
+
+
+ROLLUP_SOURCE = 'Consolidation territoriale'
+
+# Types agrégés par somme ; les autres par moyenne pondérée
+SUM_TYPES = {Indicator.Type.COUNT, Indicator.Type.CURRENCY}
+
+# Niveau enfant -> (filtre des lignes enfants, champ parent, population)
+LEVELS = [
+    ('commune', {'commune__isnull': False},
+     'commune__department_id', 'commune__population'),
+    ('department', {'department__isnull': False, 'commune__isnull': True},
+     'department__region_id', 'department__population'),
+    ('region', {'region__isnull': False, 'department__isnull': True, 'commune__isnull': True},
+     None, 'region__population'),
+]
+
+# Niveau parent -> (filtre des lignes du niveau, champ territoire)
+PARENT_LEVELS = {
+    'commune': ({'department__isnull': False, 'commune__isnull': True}, 'department_id'),
+    'department': ({'region__isnull': False, 'department__isnull': True,
+                    'commune__isnull': True}, 'region_id'),
+    'region': ({'region__isnull': True, 'department__isnull': True,
+                'commune__isnull': True}, None),
+}
+
+
+def aggregate_groups(groups, values, weights, method):
+    """
+    Agréger ``values`` par groupe (entiers 0..n-1).
+
+    Moyenne pondérée si tous les enfants d'un groupe ont une population,
+    moyenne simple sinon.
+    """
+    size = int(groups.max()) + 1
+    if method == 'sum':
+        return np.bincount(groups, values, minlength=size)
+    counts = np.bincount(groups, minlength=size)
+    mean = np.bincount(groups, values, minlength=size) / np.maximum(counts, 1)
+    missing = np.bincount(groups, weights <= 0, minlength=size) > 0
+    total = np.bincount(groups, weights, minlength=size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weighted = np.bincount(groups, values * weights, minlength=size) / total
+    return np.where(missing | (total <= 0), mean, weighted)
+
+
+def _rollup_level(indicator, year, period, level, parents, now):
+    """
+    Consolider un niveau vers son parent pour une tranche.
+
+    ``parents`` restreint le calcul à une branche (``None`` : tous les
+    parents).
+    """
+    from .bulk import upsert_values
+
+    _, child_filter, parent_field, population_field = next(
+        item for item in LEVELS if item[0] == level
+    )
+    children = IndicatorValue.objects.filter(
+        indicator=indicator, year=year, period=period,
+        status=IndicatorValue.Status.VALIDATED, **child_filter
+    )
+    if parents is not None and parent_field:
+        children = children.filter(**{f'{parent_field}__in': parents})
+    if parent_field:
+        rows = list(children.values_list(parent_field, 'value', population_field))
+    else:
+        # Niveau national : un seul parent
+        rows = [(0, value, population) for value, population in
+                children.values_list('value', population_field)]
+
+    parent_filter, territory_field = PARENT_LEVELS[level]
+    existing = IndicatorValue.objects.filter(
+        indicator=indicator, year=year, period=period, **parent_filter
+    )
+    if parents is not None and territory_field:
+        existing = existing.filter(**{f'{territory_field}__in': parents})
+    entered, rolled = set(), {}
+    if territory_field:
+        existing = existing.values_list('id', territory_field, 'source')
+    else:
+        existing = ((pk, 0, source) for pk, source in existing.values_list('id', 'source'))
+    for pk, territory_id, source in existing:
+        if source == ROLLUP_SOURCE:
+            rolled[territory_id] = pk
+        else:
+            entered.add(territory_id)
+
+    results = {}
+    if rows:
+        parent_ids = sorted({row[0] for row in rows})
+        index = {parent_id: position for position, parent_id in enumerate(parent_ids)}
+        groups = np.fromiter((index[row[0]] for row in rows), dtype=np.int64, count=len(rows))
+        values = np.fromiter((row[1] for row in rows), dtype=float, count=len(rows))
+        weights = np.fromiter((row[2] or 0 for row in rows), dtype=float, count=len(rows))
+        method = 'sum' if indicator.type in SUM_TYPES else 'mean'
+        aggregated = aggregate_groups(groups, values, weights, method)
+        results = {
+            parent_id: aggregated[position]
+            for parent_id, position in index.items()
+            if parent_id not in entered and np.isfinite(aggregated[position])
+        }
+
+    objects = []
+    target = indicator.target_value
+    for parent_id, value in results.items():
+        value = float(value)
+        territory = {'region_id': None, 'department_id': None, 'commune_id': None}
+        if territory_field:
+            territory[territory_field] = parent_id
+        objects.append(IndicatorValue(
+            indicator_id=indicator.id, year=year, period=period,
+            value=value,
+            achievement_rate=value / target * 100 if target else None,
+            status=IndicatorValue.Status.VALIDATED,
+            validated_at=now,
+            source=ROLLUP_SOURCE,
+            **territory
+        ))
+    stale = [pk for territory_id, pk in rolled.items() if territory_id not in results]
+    if stale:
+        IndicatorValue.objects.filter(id__in=stale).delete()
+    upsert_values(objects, update_fields=[
+        'value', 'achievement_rate', 'status', 'validated_at', 'source', 'updated_at',
+    ], change_reason=ROLLUP_SOURCE)
+
+
+def rollup_slice(indicator, year, period, branches=None):
+    """
+    Consolider une tranche (indicateur, année, période) de bas en haut.
+
+    ``branches`` : ensembles de territoires modifiés par niveau
+    (``{'commune': {...}, 'department': {...}, 'region': {...}}``) ; seules
+    leurs branches sont recalculées. ``None`` recalcule toute la tranche.
+    """
+    from .formulas import schedule_recompute
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Les valeurs consolidées alimentent les indicateurs dérivés
+        schedule_recompute({(indicator.id, year, period)})
+        if branches is None:
+            for level, *_ in LEVELS:
+                _rollup_level(indicator, year, period, level, None, now)
+            return
+        departments = set(branches.get('department', ()))
+        communes = branches.get('commune')
+        if communes:
+            departments |= set(
+                Commune.objects.filter(id__in=communes).values_list('department_id', flat=True)
+            )
+        if departments:
+            _rollup_level(indicator, year, period, 'commune', departments, now)
+        regions = set(branches.get('region', ()))
+        if departments:
+            regions |= set(
+                Department.objects.filter(id__in=departments).values_list('region_id', flat=True)
+            )
+        if regions:
+            _rollup_level(indicator, year, period, 'department', regions, now)
+        _rollup_level(indicator, year, period, 'region', None, now)
+
+
+def rollup_indicator(indicator, years=None):
+    """Consolider toutes les tranches d'un indicateur"""
+    slices = IndicatorValue.objects.filter(indicator=indicator)
+    if years is not None:
+        slices = slices.filter(year__in=years)
+    for year, period in slices.order_by().values_list('year', 'period').distinct():
+        rollup_slice(indicator, year, period)
+
+
+def rollup_changes(changes):
+    """
+    Consolider les branches des valeurs modifiées.
+
+    ``changes`` : ensemble de (indicator_id, year, period, region_id,
+    department_id, commune_id).
+    """
+    from .formulas import FormulaGraph
+
+    derived = {item.indicator.id for item in FormulaGraph().derived.values()}
+    branches = defaultdict(lambda: defaultdict(set))
+    for indicator_id, year, period, region_id, department_id, commune_id in changes:
+        # Les indicateurs dérivés sont calculés à chaque niveau par leur formule
+        if indicator_id in derived:
+            continue
+        branch = branches[(indicator_id, year, period)]
+        if commune_id:
+            branch['commune'].add(commune_id)
+        elif department_id:
+            branch['department'].add(department_id)
+        elif region_id:
+            branch['region'].add(region_id)
+    if not branches:
+        return
+    indicators = Indicator.objects.in_bulk({key[0] for key in branches})
+    for (indicator_id, year, period), branch in branches.items():
+        if indicator_id in indicators:
+            rollup_slice(indicators[indicator_id], year, period, branch)
+
+
+def schedule_rollup(changes):
+    """
+    Planifier la consolidation des branches modifiées à la validation
+    (abandonné avec un bloc annulé)
+    """
+    defer_batch(rollup_changes, changes)
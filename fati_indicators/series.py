@@ -0,0 +1,258 @@
+"""
+FATI Indicators - Séries en colonnes
+
+Les séries sont construites directement depuis ``values_list()`` : une liste
+d'années et, par territoire, une liste de valeurs alignée sur ces années.
+La matrice de comparaison (territoires x indicateurs x années) est pivotée
+avec NumPy.
+"""
+import numpy as np
+from django.db.models import Q
+
+from fati_geography.models import Commune, Department, Region
+from .models import Indicator, IndicatorValue
+
+
+TERRITORY_LEVELS = {
+    'region': Region,
+    'department': Department,
+    'commune': Commune,
+}
+
+NATIONAL = ('national', None)
+
+
+def parse_years(param):
+    """``2015,2018`` ou ``2015-2020`` -> liste triée d'années"""
+    years = set()
+    for token in filter(None, (part.strip() for part in param.split(','))):
+        try:
+            bounds = [int(bound) for bound in token.split('-', 1)]
+        except ValueError:
+            raise ValueError(f"Année invalide: {token}")
+        start, end = bounds[0], bounds[-1]
+        if end < start or end - start > 200:
+            raise ValueError(f"Intervalle d'années invalide: {token}")
+        years.update(range(start, end + 1))
+    return sorted(years)
+
+
+def parse_territories(param, default_level='region'):
+    """
+    ``region:DK,department:D01,national`` -> liste de territoires.
+
+    Chaque territoire est un dict ``level``, ``id``, ``code``, ``name``.
+    Sans paramètre, tous les territoires de ``default_level``.
+    """
+    if not param:
+        if default_level == 'national':
+            return [{'level': 'national', 'id': None, 'code': None, 'name': 'National'}]
+        if default_level not in TERRITORY_LEVELS:
+            raise ValueError(f"Niveau inconnu: {default_level}")
+        model = TERRITORY_LEVELS[default_level]
+        return [
+            {'level': default_level, 'id': pk, 'code': code, 'name': name}
+            for pk, code, name in model.objects.order_by('name').values_list('id', 'code', 'name')
+        ]
+
+    requested = []
+    codes = {level: set() for level in TERRITORY_LEVELS}
+    for token in filter(None, (part.strip() for part in param.split(','))):
+        if token == 'national':
+            requested.append(NATIONAL)
+            continue
+        level, _, code = token.partition(':')
+        if level not in TERRITORY_LEVELS or not code:
+            raise ValueError(f"Territoire invalide: {token} (attendu niveau:code)")
+        requested.append((level, code))
+        codes[level].add(code)
+
+    found = {}
+    for level, level_codes in codes.items():
+        if level_codes:
+            for pk, code, name in TERRITORY_LEVELS[level].objects.filter(
+                code__in=level_codes
+            ).values_list('id', 'code', 'name'):
+                found[(level, code)] = {'level': level, 'id': pk, 'code': code, 'name': name}
+
+    territories = []
+    for key in dict.fromkeys(requested):
+        if key == NATIONAL:
+            territories.append({'level': 'national', 'id': None, 'code': None, 'name': 'National'})
+        elif key in found:
+            territories.append(found[key])
+        else:
+            raise ValueError(f"Territoire inconnu: {key[0]}:{key[1]}")
+    return territories
+
+
+def territory_filter(territories):
+    """Filtre des valeurs saisies exactement au niveau des territoires"""
+    ids = {level: set() for level in TERRITORY_LEVELS}
+    national = False
+    for territory in territories:
+        if territory['level'] == 'national':
+            national = True
+        else:
+            ids[territory['level']].add(territory['id'])
+    condition = Q(pk__in=[])
+    if ids['commune']:
+        condition |= Q(commune_id__in=ids['commune'])
+    if ids['department']:
+        condition |= Q(department_id__in=ids['department'], commune__isnull=True)
+    if ids['region']:
+        condition |= Q(region_id__in=ids['region'], department__isnull=True,
+                       commune__isnull=True)
+    if national:
+        condition |= Q(region__isnull=True, department__isnull=True, commune__isnull=True)
+    return condition
+
+
+def territory_key(region_id, department_id, commune_id):
+    """Clé (niveau, id) du territoire le plus fin d'une valeur"""
+    if commune_id:
+        return ('commune', commune_id)
+    if department_id:
+        return ('department', department_id)
+    if region_id:
+        return ('region', region_id)
+    return NATIONAL
+
+
+def build_series(indicator, territories, years=None, period=''):
+    """Années et valeurs validées alignées par territoire pour un indicateur"""
+    values = IndicatorValue.objects.filter(
+        territory_filter(territories), indicator=indicator, period=period,
+        status=IndicatorValue.Status.VALIDATED
+    )
+    if years:
+        values = values.filter(year__in=years)
+
+    points = {}
+    for year, region_id, department_id, commune_id, value in values.values_list(
+        'year', 'region_id', 'department_id', 'commune_id', 'value'
+    ).order_by():
+        points[(territory_key(region_id, department_id, commune_id), year)] = value
+
+    axis = list(years) if years else sorted({year for _, year in points})
+    series = []
+    for territory in territories:
+        key = (territory['level'], territory['id'])
+        series.append({
+            **territory,
+            'values': [points.get((key, year)) for year in axis],
+        })
+    return {'years': axis, 'series': series}
+
+
+def parse_indicators(param, queryset=None):
+    """
+    ``1,2`` ou ``CODE_A,CODE_B`` -> liste ordonnée d'indicateurs, choisis
+    dans ``queryset`` (par défaut : indicateurs actifs)
+    """
+    tokens = list(dict.fromkeys(filter(None, (part.strip() for part in param.split(',')))))
+    if not tokens:
+        raise ValueError("Le paramètre indicators est requis")
+    if queryset is None:
+        queryset = Indicator.objects.filter(is_active=True).only('id', 'code', 'name', 'unit', 'type')
+    ids = {int(token) for token in tokens if token.isdigit()}
+    found = {}
+    for indicator in queryset.filter(Q(id__in=ids) | Q(code__in=tokens)):
+        found[str(indicator.id)] = found[indicator.code] = indicator
+    missing = [token for token in tokens if token not in found]
+    if missing:
+        raise ValueError(f"Indicateurs inconnus: {', '.join(missing)}")
+    return list({found[token].id: found[token] for token in tokens}.values())
+
+
+def to_nullable_list(array, integer=False):
+    """ndarray -> listes imbriquées, NaN remplacés par None"""
+    missing = np.isnan(array)
+    if integer:
+        array = np.where(missing, 0, array).astype(np.int64)
+    return np.where(missing, None, array.astype(object)).tolist()
+
+
+def rank_descending(matrix):
+    """
+    Rang de chaque territoire (axe 0) par colonne, 1 = valeur la plus
+    élevée ; les ex aequo partagent le meilleur rang, NaN reste NaN.
+    """
+    ranks = np.full(matrix.shape, np.nan)
+    columns = matrix.reshape(matrix.shape[0], -1)
+    flat_ranks = ranks.reshape(matrix.shape[0], -1)
+    for column in range(columns.shape[1]):
+        values = columns[:, column]
+        present = ~np.isnan(values)
+        ordered = np.sort(-values[present])
+        flat_ranks[present, column] = np.searchsorted(ordered, -values[present], side='left') + 1
+    return ranks
+
+
+def pivot_values(indicators, territories, years, period=''):
+    """Matrice dense territoires x indicateurs x années (NaN si absente)"""
+    values = IndicatorValue.objects.filter(
+        territory_filter(territories),
+        indicator__in=[indicator.id for indicator in indicators],
+        period=period,
+        status=IndicatorValue.Status.VALIDATED,
+    )
+    if years:
+        values = values.filter(year__in=years)
+    rows = list(values.values_list(
+        'indicator_id', 'year', 'region_id', 'department_id', 'commune_id', 'value'
+    ).order_by())
+
+    if not years:
+        years = sorted({row[1] for row in rows})
+    territory_index = {
+        (territory['level'], territory['id']): position
+        for position, territory in enumerate(territories)
+    }
+    indicator_index = {indicator.id: position for position, indicator in enumerate(indicators)}
+    year_index = {year: position for position, year in enumerate(years)}
+
+    matrix = np.full((len(territories), len(indicators), len(years)), np.nan)
+    if rows:
+        cells = np.array([
+            (
+                territory_index.get(territory_key(region_id, department_id, commune_id), -1),
+                indicator_index[indicator_id],
+                year_index.get(year, -1),
+                value,
+            )
+            for indicator_id, year, region_id, department_id, commune_id, value in rows
+        ], dtype=float)
+        cells = cells[(cells[:, 0] >= 0) & (cells[:, 2] >= 0)]
+        index = cells[:, :3].astype(np.intp)
+        matrix[index[:, 0], index[:, 1], index[:, 2]] = cells[:, 3]
+    return matrix, list(years)
+
+
+def build_matrix(indicators, territories, years, period=''):
+    """Matrice dense territoires x indicateurs x années, rangs et z-scores"""
+    matrix, years = pivot_values(indicators, territories, years, period)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        present = ~np.isnan(matrix)
+        count = present.sum(axis=0)
+        total = np.where(present, matrix, 0).sum(axis=0)
+        mean = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+        deviation = np.where(present, matrix - mean, 0)
+        std = np.where(count > 0, np.sqrt((deviation ** 2).sum(axis=0) / np.maximum(count, 1)), np.nan)
+        z_scores = np.where(std > 0, (matrix - mean) / std, np.nan)
+
+    return {
+        'territories': territories,
+        'indicators': [
+            {'id': indicator.id, 'code': indicator.code, 'name': indicator.name,
+             'unit': indicator.unit}
+            for indicator in indicators
+        ],
+        'years': list(years),
+        'values': to_nullable_list(matrix),
+        'ranks': to_nullable_list(rank_descending(matrix), integer=True),
+        'z_scores': to_nullable_list(z_scores),
+        'mean': to_nullable_list(mean),
+        'std': to_nullable_list(std),
+    }
@@ -0,0 +1,109 @@
+"""
+FATI Indicators - Signaux
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .catalogue import invalidate_catalogue
+from .changes import log_changes
+from .cube import schedule_refresh
+from .formulas import FORMULA_SOURCE, schedule_recompute
+from .history import record_changes
+from .models import Indicator, IndicatorValue
+from .projections import refresh_projections
+from .rollup import ROLLUP_SOURCE, schedule_rollup
+
+
+# Valeur non chargée (champ différé)
+_UNKNOWN = object()
+
+
+# Champs de ``_change``, dans l'ordre
+_CHANGE_FIELDS = ('indicator_id', 'year', 'period', 'region_id', 'department_id', 'commune_id')
+
+
+def _change(instance):
+    """(indicateur, année, période, région, département, commune) d'une valeur"""
+    data = instance.__dict__
+    if data.get('indicator_id') is None or data.get('year') is None:
+        return None
+    return (
+        data['indicator_id'], data['year'], data.get('period') or '',
+        data.get('region_id'), data.get('department_id'), data.get('commune_id'),
+    )
+
+
+@receiver(post_init, sender=IndicatorValue)
+def remember_cube_slice(sender, instance, **kwargs):
+    """Mémoriser la tranche, le territoire et la valeur d'origine"""
+    instance._original_change = _change(instance)
+    instance._original_value = instance.__dict__.get('value', _UNKNOWN)
+
+
+def reset_original_state(instance, fields=None):
+    """
+    Après ``refresh_from_db`` : l'état d'origine des seuls champs rechargés
+    (tous les champs non différés si ``fields`` est ``None``) devient celui
+    de la base ; une modification en attente sur un autre champ est gardée.
+    """
+    if fields is None:
+        deferred = instance.get_deferred_fields()
+        reloaded = {field.attname for field in instance._meta.concrete_fields} - deferred
+    else:
+        reloaded = {instance._meta.get_field(name).attname for name in fields}
+
+    if 'value' in reloaded:
+        instance._original_value = instance.__dict__.get('value', _UNKNOWN)
+    if reloaded & set(_CHANGE_FIELDS):
+        original, current = instance._original_change, _change(instance)
+        if original is None or current is None:
+            instance._original_change = current
+        else:
+            instance._original_change = tuple(
+                now if name in reloaded else before
+                for name, before, now in zip(_CHANGE_FIELDS, original, current)
+            )
+
+
+@receiver([post_save, post_delete], sender=IndicatorValue)
+def refresh_cube_slice(sender, instance, **kwargs):
+    """Recalculer agrégats, consolidations et indicateurs dérivés touchés"""
+    changes = {c for c in (instance._original_change, _change(instance)) if c}
+    slices = {change[:3] for change in changes}
+    schedule_refresh(slices)
+    log_changes([instance.pk])
+    if instance.source not in (FORMULA_SOURCE, ROLLUP_SOURCE):
+        schedule_rollup(changes)
+    if instance.source != FORMULA_SOURCE:
+        schedule_recompute(slices)
+    instance._original_change = _change(instance)
+
+
+@receiver(post_save, sender=IndicatorValue)
+def record_value_history(sender, instance, created, **kwargs):
+    """Historiser les changements de valeur (insertion groupée au commit)"""
+    original = None if created else instance._original_value
+    if original is not _UNKNOWN:
+        changed_by = getattr(instance, '_changed_by', None)
+        if changed_by is None and created:
+            changed_by = instance.created_by_id
+        record_changes(
+            [(instance.pk, original, instance.value)],
+            changed_by=changed_by,
+            reason=getattr(instance, '_change_reason', '')
+        )
+    instance._original_value = instance.value
+
+
+@receiver(post_save, sender=Indicator)
+def refresh_indicator_projections(sender, instance, created, **kwargs):
+    """Une cible modifiée change la signature des séries : projections à revoir"""
+    if not created:
+        transaction.on_commit(lambda: refresh_projections({instance.pk}))
+
+
+@receiver([post_save, post_delete], sender=Indicator)
+def invalidate_indicator_catalogue(sender, **kwargs):
+    """Nouvelle version du catalogue en cache"""
+    invalidate_catalogue()
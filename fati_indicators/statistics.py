@@ -0,0 +1,116 @@
+"""
+FATI Indicators - Statistiques des valeurs
+
+Toutes les ventilations secteur x catégorie x niveau territorial sont
+calculées en une seule requête ``GROUP BY GROUPING SETS`` ; la répartition
+par statut et le taux de réalisation moyen des valeurs validées sont des
+agrégats conditionnels (``FILTER``) de chaque ligne. Le résultat est mis en
+cache par jeu de filtres et invalidé à chaque recalcul du cube.
+"""
+from django.db import connection
+
+from fati_backend.cache import get_or_compute
+from .models import Indicator, IndicatorValue
+
+
+STATISTICS_NAMESPACE = 'indicator_statistics'
+
+STATUSES = [choice[0] for choice in IndicatorValue.Status.choices]
+
+# Dimension -> expression SQL
+DIMENSIONS = {
+    'sector': 'i.sector',
+    'category': 'i.category',
+    'level': """CASE
+        WHEN v.commune_id IS NOT NULL THEN 'commune'
+        WHEN v.department_id IS NOT NULL THEN 'department'
+        WHEN v.region_id IS NOT NULL THEN 'region'
+        ELSE 'national'
+    END""",
+}
+
+GROUPING_SETS = [
+    ('sector',),
+    ('level',),
+    ('sector', 'category'),
+    ('sector', 'level'),
+    ('sector', 'category', 'level'),
+]
+
+
+def _counts(row):
+    return {
+        'count': row['count'],
+        **{status: row[status] for status in STATUSES},
+        'avg_achievement': row['avg_achievement'],
+    }
+
+
+def value_statistics(queryset):
+    """Total et ventilations des valeurs du queryset, en une requête"""
+    select = [f'{expr} AS {dim}' for dim, expr in DIMENSIONS.items()]
+    select.extend(f'GROUPING({expr}) AS grouping_{dim}' for dim, expr in DIMENSIONS.items())
+    select.append('COUNT(*) AS count')
+    select.extend(
+        f"COUNT(*) FILTER (WHERE v.status = '{status}') AS {status}" for status in STATUSES
+    )
+    select.append(
+        "AVG(v.achievement_rate) FILTER (WHERE v.status = 'validated') AS avg_achievement"
+    )
+    sets_sql = [
+        '(' + ', '.join(DIMENSIONS[dim] for dim in grouping_set) + ')'
+        for grouping_set in GROUPING_SETS
+    ]
+    sets_sql.append('()')
+
+    # Les filtres de la vue sont appliqués via le queryset compilé en sous-requête
+    subquery, params = queryset.order_by().values('id').query.sql_with_params()
+    sql = (
+        f'SELECT {", ".join(select)} '
+        f'FROM {IndicatorValue._meta.db_table} v '
+        f'JOIN {Indicator._meta.db_table} i ON i.id = v.indicator_id '
+        f'WHERE v.id IN ({subquery}) '
+        f'GROUP BY GROUPING SETS ({", ".join(sets_sql)})'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = [col[0] for col in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    set_names = {frozenset(grouping_set): '+'.join(grouping_set) for grouping_set in GROUPING_SETS}
+    empty = {'count': 0, **{status: 0 for status in STATUSES}, 'avg_achievement': None}
+    result = {
+        'total': dict(empty),
+        'breakdowns': {name: [] for name in set_names.values()},
+    }
+    for row in rows:
+        grouped = frozenset(dim for dim in DIMENSIONS if row[f'grouping_{dim}'] == 0)
+        if not grouped:
+            result['total'] = _counts(row)
+            continue
+        name = set_names[grouped]
+        entry = {dim: row[dim] for dim in name.split('+')}
+        entry.update(_counts(row))
+        result['breakdowns'][name].append(entry)
+
+    for entries in result['breakdowns'].values():
+        entries.sort(key=lambda entry: entry['count'], reverse=True)
+
+    # Compatibilité : valeurs validées par secteur et répartition par statut
+    sectors = {entry['sector']: entry for entry in result['breakdowns']['sector']}
+    for sector in ('health', 'education'):
+        entry = sectors.get(sector, empty)
+        result[sector] = {
+            'count': entry['validated'],
+            'avg_achievement': entry['avg_achievement'],
+        }
+    result['by_status'] = [
+        {'status': status, 'count': result['total'][status]}
+        for status in sorted(STATUSES) if result['total'][status]
+    ]
+    return result
+
+
+def cached_value_statistics(queryset, params):
+    """``value_statistics`` mis en cache par jeu de filtres"""
+    return get_or_compute(STATISTICS_NAMESPACE, params, lambda: value_statistics(queryset))
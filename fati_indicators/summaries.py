@@ -0,0 +1,97 @@
+"""
+FATI Indicators - Résumés d'indicateurs
+
+Dernière valeur validée, moyennes annuelles et tendance de plusieurs
+indicateurs en deux requêtes groupées (dernières valeurs, puis cellules du
+cube par indicateur et année) ; la tendance, variation entre les deux
+dernières moyennes annuelles, est calculée pour tous les indicateurs à la
+fois.
+"""
+import numpy as np
+from django.db.models import Case, IntegerField, Sum, Value, When
+
+from .models import IndicatorAggregate, IndicatorLatestValue
+from .serializers import IndicatorSerializer
+
+
+MAX_SUMMARY_INDICATORS = 100
+# Variation (%) au-delà de laquelle la tendance n'est plus stable
+TREND_THRESHOLD = 5
+
+
+def trends(groups, averages, count):
+    """
+    Tendance de chaque série de moyennes annuelles. ``groups`` : indice
+    0..count-1 de chaque point, points triés par série puis année.
+    """
+    n = np.bincount(groups, minlength=count)
+    # Décalage d'un rang : position 0 pour « aucun point »
+    shifted = np.concatenate(([np.nan], averages))
+    end = np.cumsum(n)
+    recent = np.where(n >= 1, shifted[end], np.nan)
+    previous = np.where(n >= 2, shifted[end - 1], np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        change = np.where(previous > 0, (recent - previous) / previous * 100, 0.0)
+    return np.select(
+        [change > TREND_THRESHOLD, change < -TREND_THRESHOLD],
+        ['increasing', 'decreasing'],
+        default='stable'
+    )
+
+
+def build_summaries(indicators):
+    """Résumés des indicateurs, dans l'ordre reçu"""
+    ids = [indicator.id for indicator in indicators]
+    index = {indicator_id: position for position, indicator_id in enumerate(ids)}
+
+    # Dernière valeur validée, tous niveaux confondus : la plus récente,
+    # le niveau le plus large d'abord à année et période égales
+    Level = IndicatorAggregate.Level
+    latest = {
+        row.indicator_id: row
+        for row in IndicatorLatestValue.objects.filter(indicator_id__in=ids).annotate(
+            level_rank=Case(
+                *(When(level=level, then=Value(rank)) for rank, level in enumerate(
+                    (Level.NATIONAL, Level.REGION, Level.DEPARTMENT, Level.COMMUNE)
+                )),
+                output_field=IntegerField()
+            )
+        ).order_by(
+            'indicator_id', '-year', '-period', 'level_rank', 'territory_id'
+        ).distinct('indicator_id').only('indicator_id', 'year', 'value', 'achievement_rate')
+    }
+
+    # Cellules du cube : toutes zones confondues, valeurs validées
+    rows = [
+        row for row in IndicatorAggregate.objects.filter(
+            indicator_id__in=ids,
+            level=IndicatorAggregate.Level.ALL,
+            status='validated'
+        ).values('indicator_id', 'year').annotate(
+            total=Sum('sum_value'),
+            count=Sum('count')
+        ).order_by('indicator_id', 'year')
+        if row['count']
+    ]
+    rows.sort(key=lambda row: (index[row['indicator_id']], row['year']))
+
+    groups = np.fromiter((index[row['indicator_id']] for row in rows), dtype=np.intp, count=len(rows))
+    averages = np.fromiter((row['total'] / row['count'] for row in rows), dtype=float, count=len(rows))
+    trend = trends(groups, averages, len(ids))
+
+    yearly = {indicator_id: [] for indicator_id in ids}
+    for row, average in zip(rows, averages.tolist()):
+        yearly[row['indicator_id']].append({'year': row['year'], 'avg_value': average})
+
+    summaries = []
+    for position, indicator in enumerate(indicators):
+        value = latest.get(indicator.id)
+        summaries.append({
+            'indicator': IndicatorSerializer(indicator).data,
+            'latest_value': value.value if value else None,
+            'latest_year': value.year if value else None,
+            'achievement_rate': value.achievement_rate if value else None,
+            'yearly_data': yearly[indicator.id],
+            'trend': str(trend[position]),
+        })
+    return summaries
@@ -1,3 +1,563 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
 
-# Create your tests here.
+import numpy as np
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from fati_accounts.models import User
+from fati_geography.models import Region
+from .changes import CHANGE_CONSUMERS, ChangedValues, prune_changes
+from .classes import classify
+from .cube import refresh_latest
+from .formulas import Formula
+from .importers import (
+    ImportCheckpointError, JsonIndicatorImporter, JsonStream, iter_sheet_rows, parse_number
+)
+from .models import (
+    Indicator, IndicatorHistory, IndicatorProjection, IndicatorValue, IndicatorValueChange
+)
+from .projections import PROJECTION_HORIZON, fit_series, project
+from .summaries import build_summaries
+
+
+class IndicatorValueQueryPlanTest(TestCase):
+    """
+    Plans d'exécution des requêtes des vues les plus sollicitées, sur un
+    jeu de données volumineux : aucun parcours séquentiel de la table des
+    valeurs ne doit apparaître.
+    """
+
+    INDICATORS = 40
+    REGIONS = 14
+    YEARS = range(1990, 2020)
+    PERIODS = ('', 'S1', 'S2')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.indicators = Indicator.objects.bulk_create([
+            Indicator(
+                code=f'IND{number:03d}', name=f'Indicateur {number}',
+                sector='health' if number % 2 else 'education',
+                category='access', type='rate'
+            )
+            for number in range(cls.INDICATORS)
+        ])
+        cls.regions = Region.objects.bulk_create([
+            Region(code=f'R{number:02d}', name=f'Région {number}')
+            for number in range(cls.REGIONS)
+        ])
+
+        statuses = ['validated'] * 40 + ['draft'] * 6 + ['rejected'] * 3 + ['pending']
+        values = []
+        for indicator in cls.indicators:
+            for region in cls.regions:
+                for year in cls.YEARS:
+                    for period in cls.PERIODS:
+                        values.append(IndicatorValue(
+                            indicator=indicator, region=region, year=year,
+                            period=period, value=len(values) % 100,
+                            status=statuses[len(values) % len(statuses)]
+                        ))
+        IndicatorValue.objects.bulk_create(values, batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {IndicatorValue._meta.db_table}')
+
+        cls.user = User.objects.create_user(
+            email='plans@fati.sn', first_name='Plan', last_name='Test'
+        )
+        cls.user.role = 'admin'
+        cls.user.is_superuser = True
+        cls.user.save()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _sequential_scans(self, plan):
+        """Tables parcourues séquentiellement dans un plan JSON"""
+        scans = []
+        if plan.get('Node Type') == 'Seq Scan':
+            scans.append(plan.get('Relation Name'))
+        for child in plan.get('Plans', []):
+            scans.extend(self._sequential_scans(child))
+        return scans
+
+    def assertNoSequentialScan(self, url, params=None):
+        """Requêter la vue puis expliquer chaque requête sur les valeurs"""
+        table = IndicatorValue._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200, response.content)
+
+        explained = 0
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if f'"{table}"' not in sql or not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            self.assertNotIn(
+                table, self._sequential_scans(plan[0]['Plan']),
+                f'Parcours séquentiel pour {url} {params}:\n{sql}'
+            )
+            explained += 1
+        self.assertGreater(explained, 0)
+
+    def test_dataset_is_large(self):
+        self.assertEqual(
+            IndicatorValue.objects.count(),
+            self.INDICATORS * self.REGIONS * len(self.YEARS) * len(self.PERIODS)
+        )
+
+    def test_list(self):
+        self.assertNoSequentialScan('/api/indicators/values/')
+
+    def test_list_by_indicator_status_year(self):
+        self.assertNoSequentialScan('/api/indicators/values/', {
+            'indicator': self.indicators[3].id, 'status': 'validated', 'year': 2010
+        })
+
+    def test_list_by_indicator(self):
+        self.assertNoSequentialScan('/api/indicators/values/', {
+            'indicator': self.indicators[3].id
+        })
+
+    def test_list_by_region_year(self):
+        self.assertNoSequentialScan('/api/indicators/values/', {
+            'region': self.regions[5].id, 'year': 2015
+        })
+
+    def test_list_by_region(self):
+        self.assertNoSequentialScan('/api/indicators/values/', {
+            'region': self.regions[5].id
+        })
+
+    def test_list_by_status(self):
+        self.assertNoSequentialScan('/api/indicators/values/', {'status': 'pending'})
+
+    def test_list_default_ordering(self):
+        self.assertNoSequentialScan('/api/indicators/values/', {
+            'status': 'pending', 'page': 2
+        })
+
+    def test_list_explicit_ordering(self):
+        for ordering in ('-year', 'year', '-created_at'):
+            with self.subTest(ordering=ordering):
+                self.assertNoSequentialScan('/api/indicators/values/', {
+                    'status': 'pending', 'page': 2, 'ordering': ordering
+                })
+
+    def test_pending(self):
+        self.assertNoSequentialScan('/api/indicators/values/pending/')
+
+    def test_indicator_values(self):
+        self.assertNoSequentialScan(
+            f'/api/indicators/indicators/{self.indicators[7].id}/values/',
+            {'status': 'validated', 'year': 2005}
+        )
+
+
+class FormulaOverflowTest(SimpleTestCase):
+    """Les dépassements des constantes restent dans NumPy (inf)"""
+
+    def test_constant_power(self):
+        self.assertEqual(Formula('10 ** 400').evaluate({}).tolist(), float('inf'))
+
+    def test_huge_literal(self):
+        self.assertEqual(Formula('-' + '9' * 400).evaluate({}).tolist(), float('-inf'))
+
+
+class ValueHistoryRollbackTest(TestCase):
+    """Les modifications annulées avec leur point de sauvegarde ne sont pas historisées"""
+
+    def setUp(self):
+        indicator = Indicator.objects.create(
+            code='HIST01', name='Historique', sector='health', category='access', type='rate'
+        )
+        region = Region.objects.create(code='RH', name='Région historique')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.value = IndicatorValue.objects.create(
+                indicator=indicator, region=region, year=2020, value=1
+            )
+
+    def test_savepoint_rollback(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                value = IndicatorValue.objects.get(pk=self.value.pk)
+                try:
+                    with transaction.atomic():
+                        value.value = 2
+                        value.save()
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+                value = IndicatorValue.objects.get(pk=self.value.pk)
+                value.value = 2
+                value.save()
+
+        self.assertEqual(
+            list(IndicatorHistory.objects.filter(indicator_value=self.value).order_by('id').values_list(
+                'old_value', 'new_value'
+            )),
+            [(None, 1.0), (1.0, 2.0)]
+        )
+
+    def test_partial_refresh_keeps_pending_value(self):
+        IndicatorValue.objects.filter(pk=self.value.pk).update(value=3)
+        value = IndicatorValue.objects.get(pk=self.value.pk)
+        IndicatorValue.objects.filter(pk=self.value.pk).update(value=4)
+        value.value = 5
+        value.refresh_from_db(fields=['year'])
+        with self.captureOnCommitCallbacks(execute=True):
+            value.save()
+
+        self.assertEqual(
+            IndicatorHistory.objects.filter(indicator_value=self.value).latest('id').old_value, 3.0
+        )
+        value.refresh_from_db()
+        value.value = 6
+        with self.captureOnCommitCallbacks(execute=True):
+            value.save()
+        self.assertEqual(
+            IndicatorHistory.objects.filter(indicator_value=self.value).latest('id').old_value, 5.0
+        )
+
+
+class ClassifyTest(SimpleTestCase):
+    """Classes de largeur nulle : conservées si occupées, fusionnées si vides"""
+
+    def test_jenks_low_singleton(self):
+        breaks, classes = classify([0, *range(50, 58), 100], 'jenks', 3)
+        self.assertEqual(breaks.tolist(), [0, 0, 57, 100])
+        self.assertEqual(classes.tolist(), [0] + [1] * 8 + [2])
+
+    def test_jenks_high_singleton(self):
+        breaks, classes = classify([1, 2, 3, 4, 5, 100], 'jenks', 2)
+        self.assertEqual(breaks.tolist(), [1, 5, 100])
+        self.assertEqual(classes.tolist(), [0, 0, 0, 0, 0, 1])
+
+    def test_jenks_singleton_and_pair(self):
+        breaks, classes = classify([1, 10, 11, 12, 30, 31], 'jenks', 3)
+        self.assertEqual(breaks.tolist(), [1, 1, 12, 31])
+        self.assertEqual(classes.tolist(), [0, 1, 1, 1, 2, 2])
+
+    def test_empty_duplicate_class(self):
+        breaks, classes = classify([1, 1, 1, 1, 5], 'quantile', 3)
+        self.assertEqual(breaks.tolist(), [1, 1, 5])
+        self.assertEqual(classes.tolist(), [0, 0, 0, 0, 1])
+
+    def test_single_value(self):
+        breaks, classes = classify([5, 5, 5], 'equal', 3)
+        self.assertEqual(breaks.tolist(), [5, 5])
+        self.assertEqual(classes.tolist(), [0, 0, 0])
+
+
+class ChangeLogTest(TransactionTestCase):
+    """Journal écrit dans la transaction de la valeur, lu par point de reprise"""
+
+    def setUp(self):
+        self.indicator = Indicator.objects.create(
+            code='LOG01', name='Journal', sector='health', category='access', type='count'
+        )
+
+    def scan(self, name=CHANGE_CONSUMERS[0]):
+        changed = ChangedValues(name)
+        batches = []
+        for value_ids in changed:
+            batches.extend(value_ids)
+            changed.commit(len(value_ids), 0)
+        return batches
+
+    def test_rolled_back_value_is_not_logged(self):
+        try:
+            with transaction.atomic():
+                IndicatorValue.objects.create(indicator=self.indicator, year=2020, value=1)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        value = IndicatorValue.objects.create(indicator=self.indicator, year=2021, value=2)
+        self.assertEqual(self.scan(), [value.id])
+
+    def test_resume(self):
+        first = IndicatorValue.objects.create(indicator=self.indicator, year=2020, value=1)
+        self.assertEqual(self.scan(), [first.id])
+        self.assertEqual(self.scan(), [])
+        with transaction.atomic():
+            second = IndicatorValue.objects.create(indicator=self.indicator, year=2021, value=2)
+            first.value = 3
+            first.save()
+        self.assertEqual(sorted(self.scan()), sorted([first.id, second.id]))
+        # Chaque moteur a son propre point de reprise
+        self.assertEqual(sorted(self.scan(CHANGE_CONSUMERS[1])), sorted([first.id, second.id]))
+
+    def test_prune_waits_for_every_consumer(self):
+        value = IndicatorValue.objects.create(indicator=self.indicator, year=2020, value=1)
+        self.scan(CHANGE_CONSUMERS[0])
+        prune_changes()
+        # Le second moteur n'a jamais tourné : ses entrées sont conservées
+        self.assertEqual(self.scan(CHANGE_CONSUMERS[1]), [value.id])
+        prune_changes()
+        self.assertFalse(IndicatorValueChange.objects.exists())
+
+
+class ValidatedOnlyTest(TestCase):
+    """Les vues de comparaison ne servent que des valeurs validées, quel que soit ``status``"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.indicator = Indicator.objects.create(
+            code='VAL01', name='Validées', sector='health', category='access', type='count'
+        )
+        cls.region = Region.objects.create(code='RV', name='Région validée')
+        for year, value, value_status in (
+            (2020, 10, 'validated'), (2021, 20, 'draft'), (2022, 30, 'rejected')
+        ):
+            IndicatorValue.objects.create(
+                indicator=cls.indicator, region=cls.region, year=year,
+                value=value, status=value_status
+            )
+        cls.user = User.objects.create_user(
+            email='validated@fati.sn', first_name='Valeurs', last_name='Validées'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_matrix(self):
+        for value_status in ('', 'draft', 'rejected'):
+            response = self.client.get('/api/indicators/values/matrix/', {
+                'indicators': self.indicator.code, 'territories': f'region:{self.region.code}',
+                'years': '2020-2022', 'status': value_status,
+            })
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['values'], [[[10.0, None, None]]])
+
+    def test_series(self):
+        for value_status in ('', 'draft', 'rejected'):
+            response = self.client.get(f'/api/indicators/indicators/{self.indicator.id}/series/', {
+                'territories': f'region:{self.region.code}', 'years': '2020-2022',
+                'status': value_status,
+            })
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['series'][0]['values'], [10.0, None, None])
+
+
+class SummaryLatestValueTest(TestCase):
+    """Dernière valeur du résumé : la plus récente, quel que soit le niveau"""
+
+    def setUp(self):
+        self.region = Region.objects.create(code='RS', name='Région résumé')
+        self.indicator = Indicator.objects.create(
+            code='SUM01', name='Résumé', sector='health', category='access', type='rate'
+        )
+
+    def latest(self):
+        refresh_latest()
+        summary = build_summaries([self.indicator])[0]
+        return summary['latest_year'], summary['latest_value']
+
+    def test_regional_only(self):
+        IndicatorValue.objects.create(
+            indicator=self.indicator, region=self.region, year=2021, value=7, status='validated'
+        )
+        self.assertEqual(self.latest(), (2021, 7))
+
+    def test_most_recent_level(self):
+        IndicatorValue.objects.create(indicator=self.indicator, year=2019, value=5, status='validated')
+        IndicatorValue.objects.create(
+            indicator=self.indicator, region=self.region, year=2021, value=7, status='validated'
+        )
+        self.assertEqual(self.latest(), (2021, 7))
+        IndicatorValue.objects.create(indicator=self.indicator, year=2021, value=6, status='validated')
+        self.assertEqual(self.latest(), (2021, 6))
+
+
+class JsonStreamTest(SimpleTestCase):
+    """Lecture en flux identique à ``json.loads`` quelle que soit la taille des blocs"""
+
+    DOCUMENT = {
+        'Groupe "A"': {
+            'Feuille 1': [
+                {'Période': 'Dakar', '2019': 1234.5, '2020': -7.25e-2, '2021': 12e3},
+                {'Texte': 'guillemet " barre \\ accent é \u00e8 tab \t', 'vide': ''},
+                [True, False, None, 0, -0.5, 123456789012],
+            ],
+            'Notes': 'ignorée',
+            'Vide': [],
+        },
+        'Scalaire': 42,
+        'Groupe B': {'Feuille 2': [{'x': [1, {'y': 'z'}]}]},
+    }
+
+    def expected_rows(self):
+        return [
+            (group, sheet, row)
+            for group, sheets in self.DOCUMENT.items() if isinstance(sheets, dict)
+            for sheet, rows in sheets.items() if isinstance(rows, list)
+            for row in rows
+        ]
+
+    def test_chunk_boundaries(self):
+        for text in (json.dumps(self.DOCUMENT), json.dumps(self.DOCUMENT, ensure_ascii=False, indent=2)):
+            for chunk_size in range(1, 40):
+                with self.subTest(chunk_size=chunk_size):
+                    self.assertEqual(
+                        list(iter_sheet_rows(io.StringIO(text), chunk_size)),
+                        self.expected_rows()
+                    )
+
+    def test_numbers_split_anywhere(self):
+        text = '[1.5, 12e3, -7.25E-2, 10, 3.0e+2]'
+        for chunk_size in range(1, len(text) + 1):
+            with self.subTest(chunk_size=chunk_size):
+                stream = JsonStream(io.StringIO(text), chunk_size)
+                self.assertEqual(list(stream.elements()), json.loads(text))
+
+    def test_invalid_separator(self):
+        with self.assertRaises(ValueError):
+            list(JsonStream(io.StringIO('[1 2]')).elements())
+
+
+class ParseNumberTest(SimpleTestCase):
+    """Formats numériques des fichiers sources"""
+
+    def test_formats(self):
+        cases = {
+            '12': 12.0,
+            '12,5': 12.5,
+            '12.5': 12.5,
+            '1 234,5': 1234.5,
+            '1\xa0234,5': 1234.5,
+            '1.234,5': 1234.5,
+            '1,234.5': 1234.5,
+            '1,234,567': 1234567.0,
+            '45 %': 45.0,
+            '-3,2': -3.2,
+            7: 7.0,
+            2.5: 2.5,
+        }
+        for raw, expected in cases.items():
+            with self.subTest(raw=raw):
+                self.assertEqual(parse_number(raw), expected)
+
+    def test_multiple_dots(self):
+        # Comme l'ancien import : le dernier point sépare les décimales
+        self.assertEqual(parse_number('1.234.5'), 1234.5)
+        self.assertEqual(parse_number('1.234.567'), 1234.567)
+
+    def test_missing(self):
+        for raw in (None, '', '  ', '-', '--', '...', 'NA', 'N/A', 'abc', float('nan')):
+            with self.subTest(raw=raw):
+                self.assertIsNone(parse_number(raw))
+
+
+class JsonImportResumeTest(TestCase):
+    """Reprise d'un import : les lignes déjà enregistrées ne sont pas réécrites"""
+
+    ROWS = [
+        {'Période': 'Dakar', 'Unnamed: 1': 'Nombre de lits', '2019': '1 200'},
+        {'Période': None, 'Unnamed: 1': 'Nombre de médecins', '2019': '80'},
+        {'Période': 'Thiès', 'Unnamed: 1': 'Nombre de lits', '2019': '1.234.5'},
+    ]
+
+    def setUp(self):
+        self.dakar = Region.objects.create(code='DK', name='Dakar')
+        self.thies = Region.objects.create(code='TH', name='Thiès')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'sante.json')
+        with open(self.path, 'w', encoding='utf-8') as handle:
+            json.dump({'Groupe': {'Feuille': self.ROWS}}, handle, ensure_ascii=False)
+
+    def test_resume_from_checkpoint(self):
+        interrupted = JsonIndicatorImporter(self.path, Indicator.Sector.HEALTH)
+        interrupted.state = {'rows': 1, 'values': 1}
+        interrupted._save_checkpoint()
+
+        result = JsonIndicatorImporter(self.path, Indicator.Sector.HEALTH).run()
+
+        self.assertEqual(result['resumed_after'], 1)
+        self.assertEqual(result['values'], 2)
+        self.assertFalse(os.path.exists(f'{self.path}.checkpoint'))
+        # La deuxième ligne reprend le territoire de la première, relue sans être écrite
+        self.assertEqual(
+            sorted(IndicatorValue.objects.values_list('indicator__name', 'region_id', 'value')),
+            [('Nombre de lits', self.thies.id, 1234.5), ('Nombre de médecins', self.dakar.id, 80.0)]
+        )
+
+    def test_changed_file(self):
+        importer = JsonIndicatorImporter(self.path, Indicator.Sector.HEALTH)
+        importer.fingerprint = {'size': 0, 'mtime': 0}
+        importer._save_checkpoint()
+
+        with self.assertRaises(ImportCheckpointError):
+            JsonIndicatorImporter(self.path, Indicator.Sector.HEALTH)
+
+
+class FitSeriesTest(SimpleTestCase):
+    """Moindres carrés par série, NaN pour les séries indéterminées"""
+
+    def test_fit(self):
+        groups = np.array([0, 0, 0, 1, 1, 1, 1, 3])
+        years = np.array([2010, 2011, 2012, 2010, 2011, 2012, 2013, 2015], dtype=float)
+        values = np.array([10, 12, 14, 5, 4, 6, 5, 1], dtype=float)
+        n, slope, intercept, r2 = fit_series(groups, years, values, 4)
+        self.assertEqual(n.tolist(), [3, 4, 0, 1])
+        self.assertAlmostEqual(slope[0], 2.0)
+        self.assertAlmostEqual(intercept[0] + slope[0] * 2010, 10.0)
+        self.assertAlmostEqual(r2[0], 1.0)
+        self.assertAlmostEqual(slope[1], 0.2)
+        self.assertAlmostEqual(r2[1], 0.1)
+        # Série vide et série d'un seul point : pente indéterminée
+        self.assertTrue(np.isnan(slope[2:]).all())
+
+    def test_flat_series(self):
+        _, slope, _, r2 = fit_series(np.zeros(3, dtype=int), np.array([2010., 2011., 2012.]), np.full(3, 7.), 1)
+        self.assertEqual(slope.tolist(), [0.0])
+        self.assertTrue(np.isnan(r2[0]))
+
+
+class ProjectTest(SimpleTestCase):
+    """Statut et année d'atteinte de la cible"""
+
+    Status = IndicatorProjection.Status
+
+    def test_projected(self):
+        # 10 en 2010, +2 par an : 30 atteint en 2020
+        self.assertEqual(project(10, 14, 2012, 3, 2.0, 10 - 2.0 * 2010, 30), (self.Status.PROJECTED, 2020))
+
+    def test_decreasing_target(self):
+        self.assertEqual(project(50, 46, 2012, 3, -2.0, 50 + 2.0 * 2010, 40), (self.Status.PROJECTED, 2015))
+
+    def test_at_least_next_year(self):
+        # La droite atteint déjà la cible, pas la dernière valeur
+        self.assertEqual(project(10, 19, 2012, 3, 5.0, 10 - 5.0 * 2008, 20), (self.Status.PROJECTED, 2013))
+
+    def test_statuses(self):
+        cases = [
+            ((10, 14, 2012, 3, 2.0, 0.0, None), self.Status.NO_TARGET),
+            ((10, 31, 2012, 3, 2.0, 0.0, 30), self.Status.REACHED),
+            ((30, 25, 2012, 3, -2.0, 0.0, 30), self.Status.REACHED),
+            ((10, 14, 2012, 2, 2.0, 0.0, 30), self.Status.INSUFFICIENT),
+            ((10, 14, 2012, 3, float('nan'), 0.0, 30), self.Status.INSUFFICIENT),
+            ((10, 8, 2012, 3, -1.0, 0.0, 30), self.Status.DIVERGING),
+        ]
+        for args, expected in cases:
+            with self.subTest(args=args):
+                self.assertEqual(project(*args), (expected, None))
+
+    def test_beyond_horizon(self):
+        slope = 0.01
+        self.assertEqual(
+            project(10, 10, 2012, 3, slope, 10 - slope * 2012, 10 + slope * (PROJECTION_HORIZON + 5)),
+            (self.Status.DIVERGING, None)
+        )
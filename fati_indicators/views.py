@@ -1,12 +1,36 @@
 """
 FATI Indicators - Views
 """
+from datetime import datetime, time
+
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Avg, Max, Min, Count, Q
-from .models import Indicator, IndicatorValue, IndicatorHistory
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from fati_backend.pagination import KeysetPagination
+from fati_geography.exports import ExportContentNegotiation
+from .analytics import CORRELATION_LEVELS, MAX_CORRELATION_INDICATORS, cached_correlations
+from .bulk import BulkValueLoader, CSVTextParser, read_csv_rows
+from .catalogue import catalogue_response
+from .classes import (
+    CLASS_LEVELS, CLASS_METHODS, DEFAULT_PALETTE, MAX_CLASSES, MIN_CLASSES, PALETTES,
+    cached_classes
+)
+from .series import (
+    TERRITORY_LEVELS, build_matrix, build_series, parse_indicators, parse_territories,
+    parse_years
+)
+from .exports import TABULAR_FORMATS, tabular_export_response
+from .ranking import cached_ranking
+from .review import can_review, review_values
+from .statistics import cached_value_statistics
+from .summaries import MAX_SUMMARY_INDICATORS, build_summaries
+from .models import Indicator, IndicatorAggregate, IndicatorValue, IndicatorHistory
 from .serializers import (
     IndicatorSerializer,
     IndicatorValueSerializer,
@@ -17,6 +41,12 @@ from .serializers import (
 )
 
 
+class IndicatorValuePagination(KeysetPagination):
+    """Curseur sur (année, indicateur, id), couvert par un index"""
+    
+    key = ('-year', '-indicator_id', '-id')
+
+
 class IndicatorViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet pour les indicateurs"""
     
@@ -26,16 +56,24 @@ class IndicatorViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['code', 'name', 'description']
     ordering_fields = ['sector', 'category', 'order', 'name']
     
+    def list(self, request, *args, **kwargs):
+        """Catalogue filtré, servi depuis le cache avec ETag"""
+        return catalogue_response(
+            request, 'list',
+            lambda: super(IndicatorViewSet, self).list(request, *args, **kwargs).data
+        )
+    
     @action(detail=False, methods=['get'])
     def by_sector(self, request):
         """Récupérer les indicateurs groupés par secteur"""
-        health_indicators = self.queryset.filter(sector='health')
-        education_indicators = self.queryset.filter(sector='education')
+        def build():
+            indicators = IndicatorSerializer(self.queryset.all(), many=True).data
+            return {
+                sector: [item for item in indicators if item['sector'] == sector]
+                for sector in ('health', 'education')
+            }
         
-        return Response({
-            'health': IndicatorSerializer(health_indicators, many=True).data,
-            'education': IndicatorSerializer(education_indicators, many=True).data
-        })
+        return catalogue_response(request, 'by_sector', build)
     
     @action(detail=True, methods=['get'])
     def values(self, request, pk=None):
@@ -62,40 +100,199 @@ class IndicatorViewSet(viewsets.ReadOnlyModelViewSet):
         return Response(serializer.data)
     
     @action(detail=True, methods=['get'])
-    def summary(self, request, pk=None):
-        """Récupérer un résumé de l'indicateur"""
+    def series(self, request, pk=None):
+        """Séries en colonnes : années et valeurs alignées par territoire"""
         indicator = self.get_object()
         
-        # Dernière valeur
-        latest = indicator.values.filter(status='validated').order_by('-year').first()
+        try:
+            years = parse_years(request.query_params.get('years', ''))
+            territories = parse_territories(
+                request.query_params.get('territories'),
+                default_level=request.query_params.get('level', 'region')
+            )
+        except ValueError as exc:
+            return Response(
+                {'error': str(exc)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Valeurs par année pour la tendance
-        yearly_values = indicator.values.filter(
-            status='validated'
-        ).values('year').annotate(
-            avg_value=Avg('value')
-        ).order_by('year')
-        
-        # Calculer la tendance
-        trend = 'stable'
-        if len(yearly_values) >= 2:
-            recent = yearly_values[-1]['avg_value']
-            previous = yearly_values[-2]['avg_value']
-            if previous > 0:
-                change = ((recent - previous) / previous) * 100
-                if change > 5:
-                    trend = 'increasing'
-                elif change < -5:
-                    trend = 'decreasing'
+        data = build_series(
+            indicator, territories, years,
+            period=request.query_params.get('period', '')
+        )
+        return Response({
+            'indicator': {
+                'id': indicator.id,
+                'code': indicator.code,
+                'name': indicator.name,
+                'unit': indicator.unit,
+                'type': indicator.type
+            },
+            **data
+        })
+    
+    @action(detail=True, methods=['get'])
+    def classes(self, request, pk=None):
+        """Classes de carte choroplèthe : bornes, couleurs et territoires"""
+        indicator = self.get_object()
+        params = request.query_params
+        
+        level = params.get('level', 'region')
+        method = params.get('method', 'quantile')
+        palette = params.get('palette', DEFAULT_PALETTE)
+        if level not in CLASS_LEVELS:
+            return Response(
+                {'error': f"Niveau invalide: {level} ({', '.join(CLASS_LEVELS)})"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if method not in CLASS_METHODS:
+            return Response(
+                {'error': f"Méthode invalide: {method} ({', '.join(CLASS_METHODS)})"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if palette not in PALETTES:
+            return Response(
+                {'error': f"Palette inconnue: {palette} ({', '.join(PALETTES)})"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            k = int(params.get('k', 5))
+            year = int(params['year']) if params.get('year') else None
+        except ValueError:
+            return Response(
+                {'error': 'Les paramètres k et year doivent être des entiers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not MIN_CLASSES <= k <= MAX_CLASSES:
+            return Response(
+                {'error': f"k doit être compris entre {MIN_CLASSES} et {MAX_CLASSES}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        data = cached_classes(
+            indicator, level, year, method, k, palette,
+            period=params.get('period', '')
+        )
+        return Response({
+            'indicator': {
+                'id': indicator.id,
+                'code': indicator.code,
+                'name': indicator.name,
+                'unit': indicator.unit
+            },
+            **data
+        })
+    
+    @action(detail=True, methods=['get'])
+    def ranking(self, request, pk=None):
+        """Classement des territoires (?year=2020&level=region)"""
+        indicator = self.get_object()
+        level = request.query_params.get('level', 'region')
+        if level not in TERRITORY_LEVELS:
+            return Response(
+                {'error': f"Niveau invalide: {level} ({', '.join(TERRITORY_LEVELS)})"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        year = request.query_params.get('year')
+        if year is not None:
+            try:
+                year = int(year)
+            except ValueError:
+                return Response(
+                    {'error': 'Le paramètre year doit être une année'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
         
         return Response({
-            'indicator': IndicatorSerializer(indicator).data,
-            'latest_value': latest.value if latest else None,
-            'latest_year': latest.year if latest else None,
-            'achievement_rate': latest.achievement_rate if latest else None,
-            'yearly_data': list(yearly_values),
-            'trend': trend
+            'indicator': {
+                'id': indicator.id,
+                'code': indicator.code,
+                'name': indicator.name,
+                'unit': indicator.unit
+            },
+            **cached_ranking(indicator, level, year, request.query_params.get('period', ''))
         })
+    
+    @action(detail=True, methods=['get'])
+    def projections(self, request, pk=None):
+        """Tendance et année projetée d'atteinte de la cible par territoire"""
+        indicator = self.get_object()
+        level = request.query_params.get('level', 'region')
+        if level not in IndicatorAggregate.Level.values or level == IndicatorAggregate.Level.ALL:
+            return Response(
+                {'error': f"Niveau invalide: {level}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        projections = indicator.projections.filter(
+            level=level, period=request.query_params.get('period', '')
+        )
+        projection_status = request.query_params.get('status')
+        if projection_status:
+            projections = projections.filter(status=projection_status)
+        
+        names = {}
+        if level in TERRITORY_LEVELS:
+            names = dict(TERRITORY_LEVELS[level].objects.filter(
+                id__in=[projection.territory_id for projection in projections]
+            ).values_list('id', 'name'))
+        return Response({
+            'indicator': {
+                'id': indicator.id,
+                'code': indicator.code,
+                'name': indicator.name,
+                'target_value': indicator.target_value
+            },
+            'level': level,
+            'projections': [
+                {
+                    'territory_id': projection.territory_id or None,
+                    'territory_name': names.get(projection.territory_id, 'National'),
+                    'points': projection.points,
+                    'first_year': projection.first_year,
+                    'last_year': projection.last_year,
+                    'last_value': projection.last_value,
+                    'slope': projection.slope,
+                    'intercept': projection.intercept,
+                    'r2': projection.r2,
+                    'target_value': projection.target_value,
+                    'target_year': projection.target_year,
+                    'status': projection.status,
+                }
+                for projection in projections.order_by('target_year', 'territory_id')
+            ]
+        })
+    
+    @action(detail=True, methods=['get'])
+    def summary(self, request, pk=None):
+        """Récupérer un résumé de l'indicateur"""
+        return Response(build_summaries([self.get_object()])[0])
+    
+    @action(detail=False, methods=['get'])
+    def summaries(self, request):
+        """
+        Résumés de plusieurs indicateurs en une fois (?ids=1,2,CODE ou
+        filtres du catalogue : ?sector=health)
+        """
+        indicators = self.filter_queryset(self.get_queryset())
+        ids = request.query_params.get('ids', '')
+        if ids.replace(',', '').strip():
+            try:
+                indicators = parse_indicators(ids, indicators)
+            except ValueError as exc:
+                return Response(
+                    {'error': str(exc)},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            indicators = list(indicators[:MAX_SUMMARY_INDICATORS + 1])
+        if len(indicators) > MAX_SUMMARY_INDICATORS:
+            return Response(
+                {'error': f'Au plus {MAX_SUMMARY_INDICATORS} indicateurs par requête'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(build_summaries(indicators))
 
 
 class IndicatorValueViewSet(viewsets.ModelViewSet):
@@ -105,6 +302,7 @@ class IndicatorValueViewSet(viewsets.ModelViewSet):
         'indicator', 'region', 'department', 'commune', 'validated_by'
     ).all()
     serializer_class = IndicatorValueSerializer
+    pagination_class = IndicatorValuePagination
     filterset_fields = [
         'indicator', 'indicator__sector',
         'region', 'department', 'commune',
@@ -121,6 +319,11 @@ class IndicatorValueViewSet(viewsets.ModelViewSet):
             return IndicatorValueUpdateSerializer
         return IndicatorValueSerializer
     
+    def perform_update(self, serializer):
+        # Auteur de la modification pour l'historique
+        serializer.instance._changed_by = self.request.user
+        serializer.save()
+    
     def get_queryset(self):
         """Filtrer selon les permissions"""
         user = self.request.user
@@ -177,6 +380,62 @@ class IndicatorValueViewSet(viewsets.ModelViewSet):
         serializer = IndicatorValueSerializer(value)
         return Response(serializer.data)
     
+    def _bulk_review(self, request, new_status):
+        """Valider ou rejeter un ensemble de valeurs (ids ou filtres)"""
+        if not can_review(request.user, new_status):
+            return Response(
+                {'error': 'Permission refusée'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        # Périmètre territorial appliqué par get_queryset()
+        queryset = self.get_queryset()
+        ids = request.data.get('ids')
+        not_found = []
+        if ids is not None:
+            if not isinstance(ids, list) or not ids:
+                return Response(
+                    {'error': 'ids doit être une liste non vide'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                ids = {int(pk) for pk in ids}
+            except (TypeError, ValueError):
+                return Response(
+                    {'error': 'ids doit contenir des identifiants entiers'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            queryset = queryset.filter(id__in=ids)
+            not_found = sorted(ids - set(queryset.values_list('id', flat=True)))
+        elif any(field in request.query_params for field in self.filterset_fields):
+            queryset = self.filter_queryset(queryset)
+        else:
+            return Response(
+                {'error': 'Indiquez des ids ou au moins un filtre'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        updated = review_values(
+            queryset, request.user, new_status,
+            reason=str(request.data.get('reason', '')), request=request
+        )
+        return Response({
+            'status': new_status,
+            'updated': len(updated),
+            'ids': updated,
+            'not_found': not_found
+        })
+    
+    @action(detail=False, methods=['post'], url_path='bulk-validate')
+    def bulk_validate(self, request):
+        """Valider en masse des valeurs d'indicateurs"""
+        return self._bulk_review(request, IndicatorValue.Status.VALIDATED)
+    
+    @action(detail=False, methods=['post'], url_path='bulk-reject')
+    def bulk_reject(self, request):
+        """Rejeter en masse des valeurs d'indicateurs"""
+        return self._bulk_review(request, IndicatorValue.Status.REJECTED)
+    
     @action(detail=False, methods=['get'])
     def pending(self, request):
         """Récupérer les valeurs en attente de validation"""
@@ -186,35 +445,143 @@ class IndicatorValueViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def statistics(self, request):
-        """Statistiques globales des indicateurs"""
+        """
+        Statistiques des valeurs : ventilations secteur, catégorie, niveau
+        territorial et statut (filtres de la liste, ?years=2015-2020)
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        raw_years = request.query_params.get('years', '')
+        try:
+            years = parse_years(raw_years)
+        except ValueError as exc:
+            return Response(
+                {'error': str(exc)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if years:
+            queryset = queryset.filter(year__in=years)
         
-        # Par secteur
-        health_stats = IndicatorValue.objects.filter(
-            indicator__sector='health',
-            status='validated'
-        ).aggregate(
-            count=Count('id'),
-            avg_achievement=Avg('achievement_rate')
-        )
+        user = request.user
+        params = {
+            'years': years,
+            'filters': {
+                field: request.query_params.getlist(field)
+                for field in self.filterset_fields
+                if field in request.query_params
+            },
+            # Périmètre du gestionnaire local (voir get_queryset)
+            'scope': [
+                user.assigned_commune_id, user.assigned_department_id, user.assigned_region_id
+            ] if user.is_local_manager else None,
+        }
+        return Response(cached_value_statistics(queryset, params))
+    
+    @action(
+        detail=False,
+        methods=['post'],
+        parser_classes=[JSONParser, CSVTextParser, MultiPartParser]
+    )
+    def bulk(self, request):
+        """Créer ou mettre à jour des valeurs en masse (JSON ou CSV)"""
+        if not (request.user.is_admin or request.user.is_institution or
+                request.user.is_local_manager):
+            return Response(
+                {'error': 'Permission refusée'},
+                status=status.HTTP_403_FORBIDDEN
+            )
         
-        education_stats = IndicatorValue.objects.filter(
-            indicator__sector='education',
-            status='validated'
-        ).aggregate(
-            count=Count('id'),
-            avg_achievement=Avg('achievement_rate')
-        )
+        rows = request.data
+        upload = request.FILES.get('file')
+        if upload is not None:
+            try:
+                rows = read_csv_rows(upload.read().decode('utf-8-sig'))
+            except UnicodeDecodeError:
+                return Response(
+                    {'error': 'Le fichier CSV doit être encodé en UTF-8'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        elif isinstance(rows, dict):
+            rows = rows.get('values')
         
-        # Par statut
-        status_counts = IndicatorValue.objects.values('status').annotate(
-            count=Count('id')
-        )
+        if not isinstance(rows, list) or not rows:
+            return Response(
+                {'error': 'Une liste de valeurs ou un fichier CSV est requis'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        return Response({
-            'health': health_stats,
-            'education': education_stats,
-            'by_status': list(status_counts)
-        })
+        report = BulkValueLoader(request.user).load(rows)
+        if not report['created'] and not report['updated']:
+            return Response(report, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+    
+    @action(
+        detail=False,
+        methods=['get'],
+        content_negotiation_class=ExportContentNegotiation
+    )
+    def export(self, request):
+        """Exporter les valeurs filtrées (?format=csv|ndjson|parquet)"""
+        export_format = request.query_params.get('format', 'csv')
+        if export_format not in TABULAR_FORMATS:
+            return Response(
+                {'error': f"Format non supporté: {export_format} (csv, ndjson, parquet)"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        return tabular_export_response(queryset, export_format, 'indicator_values')
+    
+    @action(detail=False, methods=['get'])
+    def matrix(self, request):
+        """Matrice de comparaison territoires x indicateurs x années"""
+        try:
+            indicators = parse_indicators(request.query_params.get('indicators', ''))
+            years = parse_years(request.query_params.get('years', ''))
+            territories = parse_territories(
+                request.query_params.get('territories'),
+                default_level=request.query_params.get('level', 'region')
+            )
+        except ValueError as exc:
+            return Response(
+                {'error': str(exc)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(build_matrix(
+            indicators, territories, years,
+            period=request.query_params.get('period', '')
+        ))
+    
+    @action(detail=False, methods=['get'])
+    def correlations(self, request):
+        """
+        Corrélations et régressions entre indicateurs pour une année
+        (?indicators=A,B,C&year=2020&level=region)
+        """
+        level = request.query_params.get('level', 'region')
+        if level not in CORRELATION_LEVELS:
+            return Response(
+                {'error': f"Niveau invalide: {level} ({', '.join(CORRELATION_LEVELS)})"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            indicators = parse_indicators(request.query_params.get('indicators', ''))
+            year = request.query_params.get('year')
+            year = int(year) if year else None
+        except ValueError as exc:
+            return Response(
+                {'error': str(exc)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 2 <= len(indicators) <= MAX_CORRELATION_INDICATORS:
+            return Response(
+                {'error': f'Entre 2 et {MAX_CORRELATION_INDICATORS} indicateurs sont requis'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(cached_correlations(
+            indicators, level, year, period=request.query_params.get('period', '')
+        ))
     
     @action(detail=False, methods=['get'])
     def compare(self, request):
@@ -246,16 +613,50 @@ class IndicatorValueViewSet(viewsets.ModelViewSet):
         return Response(data)
 
 
+class IndicatorHistoryPagination(KeysetPagination):
+    """Curseur sur (date, id), couvert par les index (valeur, date, id)"""
+    
+    key = ('-created_at', '-id')
+
+
 class IndicatorHistoryViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet pour l'historique des indicateurs"""
     
-    queryset = IndicatorHistory.objects.select_related(
-        'indicator_value', 'changed_by'
-    ).all()
+    queryset = IndicatorHistory.objects.select_related('changed_by').all()
     serializer_class = IndicatorHistorySerializer
+    pagination_class = IndicatorHistoryPagination
     
     def get_queryset(self):
-        indicator_value_id = self.request.query_params.get('indicator_value')
+        """Filtrer par valeur, indicateur, auteur et période (since/until)"""
+        queryset = self.queryset
+        params = self.request.query_params
+        
+        indicator_value_id = params.get('indicator_value')
         if indicator_value_id:
-            return self.queryset.filter(indicator_value_id=indicator_value_id)
-        return self.queryset
+            queryset = queryset.filter(indicator_value_id=indicator_value_id)
+        indicator_id = params.get('indicator')
+        if indicator_id:
+            queryset = queryset.filter(indicator_value__indicator_id=indicator_id)
+        changed_by = params.get('changed_by')
+        if changed_by:
+            queryset = queryset.filter(changed_by_id=changed_by)
+        
+        since = params.get('since')
+        if since:
+            queryset = queryset.filter(created_at__gte=self._parse_datetime(since))
+        until = params.get('until')
+        if until:
+            queryset = queryset.filter(created_at__lt=self._parse_datetime(until))
+        return queryset
+    
+    @staticmethod
+    def _parse_datetime(value):
+        parsed = parse_datetime(value)
+        if parsed is None:
+            parsed_date = parse_date(value)
+            if parsed_date is None:
+                raise ValidationError({'error': f"Date invalide: {value}"})
+            parsed = datetime.combine(parsed_date, time.min)
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
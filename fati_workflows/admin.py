@@ -63,13 +63,14 @@ class AlertAdmin(admin.ModelAdmin):
     list_filter = ['type', 'severity', 'sector', 'is_read']
     search_fields = ['title', 'message']
     ordering = ['-created_at']
+    raw_id_fields = ['indicator_value']
     
     fieldsets = (
         ('Informations', {
             'fields': ('type', 'severity', 'title', 'message')
         }),
         ('Contexte', {
-            'fields': ('sector', 'indicator', 'region', 'value', 'threshold')
+            'fields': ('sector', 'indicator', 'region', 'indicator_value', 'value', 'threshold')
         }),
         ('Lecture', {
             'fields': ('is_read', 'read_at', 'read_by')
@@ -0,0 +1,297 @@
+"""
+FATI Workflows - Détection automatique d'alertes
+
+Les valeurs d'indicateurs créées ou modifiées depuis le dernier passage
+(journal des modifications, transactions terminées uniquement) sont
+analysées par lots :
+
+- ``threshold`` : franchissement de ``Indicator.alert_threshold`` (le sens
+  est déduit de la position de la cible par rapport au seuil) ;
+- ``trend`` : variation annuelle supérieure à ``TREND_JUMP`` ;
+- ``anomaly`` : z-score robuste (médiane / MAD) sur la série historique du
+  territoire supérieur à ``ANOMALY_Z``.
+
+Les calculs sont vectorisés avec NumPy ; les alertes sont insérées avec
+``bulk_create``.
+"""
+import numpy as np
+from django.db import transaction
+
+from fati_accounts.models import User
+from fati_indicators.changes import CHANGE_BATCH_SIZE, ChangedValues, prune_changes
+from fati_indicators.models import Indicator, IndicatorValue
+from .models import Alert
+
+
+SCAN_NAME = 'indicator_alerts'
+SCAN_BATCH_SIZE = CHANGE_BATCH_SIZE
+
+TREND_JUMP = 0.5
+ANOMALY_Z = 3.5
+ANOMALY_MIN_POINTS = 4
+YEAR_SPAN = 10000
+
+
+def group_medians(groups, values):
+    """Médiane de ``values`` par groupe (entiers triés 0..n-1)"""
+    order = np.lexsort((values, groups))
+    sorted_groups, sorted_values = groups[order], values[order]
+    counts = np.bincount(sorted_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    low = sorted_values[np.minimum(starts + (counts - 1) // 2, len(values) - 1)]
+    high = sorted_values[np.minimum(starts + counts // 2, len(values) - 1)]
+    return np.where(counts > 0, (low + high) / 2, np.nan), counts
+
+
+def threshold_breaches(values, thresholds, targets):
+    """
+    Franchissements de seuil. Si la cible est inférieure au seuil, une
+    valeur élevée est défavorable (alerte au-dessus), sinon l'inverse.
+    """
+    higher_is_worse = np.isnan(targets) | (targets < thresholds)
+    with np.errstate(invalid='ignore'):
+        above = values >= thresholds
+        below = values <= thresholds
+    return ~np.isnan(thresholds) & np.where(higher_is_worse, above, below)
+
+
+class History:
+    """Séries validées par (indicateur, territoire, période), chargées à la demande"""
+
+    def __init__(self):
+        self.loaded = set()
+        self.group_ids = {}
+        self.groups = []
+        self.years = []
+        self.values = []
+        self._arrays = None
+
+    def load(self, indicator_ids):
+        missing = set(indicator_ids) - self.loaded
+        if not missing:
+            return
+        rows = IndicatorValue.objects.filter(
+            indicator_id__in=missing,
+            status=IndicatorValue.Status.VALIDATED,
+        ).values_list(
+            'indicator_id', 'region_id', 'department_id', 'commune_id',
+            'period', 'year', 'value'
+        ).order_by()
+        for indicator_id, region_id, department_id, commune_id, period, year, value in rows.iterator(
+            chunk_size=SCAN_BATCH_SIZE
+        ):
+            key = (indicator_id, region_id, department_id, commune_id, period)
+            self.groups.append(self.group_ids.setdefault(key, len(self.group_ids)))
+            self.years.append(year)
+            self.values.append(value)
+        self.loaded |= missing
+        self._arrays = None
+
+    def arrays(self):
+        """(clés groupe-année triées, valeurs, médianes, MAD, effectifs)"""
+        if self._arrays is None:
+            groups = np.array(self.groups, dtype=np.int64)
+            values = np.array(self.values, dtype=float)
+            keys = groups * YEAR_SPAN + np.array(self.years, dtype=np.int64)
+            order = np.argsort(keys, kind='stable')
+            if len(groups):
+                medians, counts = group_medians(groups, values)
+                mad, _ = group_medians(groups, np.abs(values - medians[groups]))
+            else:
+                medians = mad = counts = np.empty(0)
+            self._arrays = (keys[order], values[order], medians, mad, counts)
+        return self._arrays
+
+
+def _severity_for_z(z):
+    return Alert.Severity.HIGH if abs(z) >= 2 * ANOMALY_Z else Alert.Severity.MEDIUM
+
+
+def detect_batch(rows, indicators, history, territories):
+    """
+    Construire les alertes d'un lot.
+
+    ``rows`` : tuples (id, indicator_id, region_id, department_id,
+    commune_id, period, year, value).
+    """
+    history.load({row[1] for row in rows})
+    keys, hist_values, medians, mad, counts = history.arrays()
+
+    n = len(rows)
+    values = np.fromiter((row[7] for row in rows), dtype=float, count=n)
+    thresholds = np.fromiter(
+        (np.nan if indicators[row[1]].alert_threshold is None else indicators[row[1]].alert_threshold
+         for row in rows), dtype=float, count=n
+    )
+    targets = np.fromiter(
+        (np.nan if indicators[row[1]].target_value is None else indicators[row[1]].target_value
+         for row in rows), dtype=float, count=n
+    )
+    groups = np.fromiter(
+        (history.group_ids.get(row[1:6], -1) for row in rows), dtype=np.int64, count=n
+    )
+    years = np.fromiter((row[6] for row in rows), dtype=np.int64, count=n)
+    known = groups >= 0
+
+    # Seuils
+    breaches = threshold_breaches(values, thresholds, targets)
+
+    # Variation annuelle : valeur de l'année précédente dans la même série
+    previous = np.full(n, np.nan)
+    if len(keys):
+        wanted = groups * YEAR_SPAN + years - 1
+        position = np.clip(np.searchsorted(keys, wanted), 0, len(keys) - 1)
+        found = known & (keys[position] == wanted)
+        previous[found] = hist_values[position[found]]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        jumps = np.abs(values - previous) / np.abs(previous)
+    trends = np.isfinite(jumps) & (jumps >= TREND_JUMP)
+
+    # Z-score robuste sur la série du territoire
+    z_scores = np.full(n, np.nan)
+    if len(medians):
+        safe = np.where(known, groups, 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            z = 0.6745 * (values - medians[safe]) / mad[safe]
+        enough = known & (counts[safe] >= ANOMALY_MIN_POINTS) & (mad[safe] > 0)
+        z_scores[enough] = z[enough]
+    with np.errstate(invalid='ignore'):
+        anomalies = np.isfinite(z_scores) & (np.abs(z_scores) >= ANOMALY_Z)
+
+    alerts = []
+    for index in np.flatnonzero(breaches | trends | anomalies):
+        value_id, indicator_id, region_id, department_id, commune_id, period, year, value = rows[index]
+        indicator = indicators[indicator_id]
+        territory = territories.name(region_id, department_id, commune_id)
+        common = {
+            'sector': indicator.sector,
+            'indicator_id': indicator_id,
+            'region_id': territories.region_of(region_id, department_id, commune_id),
+            'indicator_value_id': value_id,
+            'value': value,
+        }
+        label = f"{indicator.name} - {territory} ({year}{' ' + period if period else ''})"
+        if breaches[index]:
+            alerts.append(Alert(
+                type=Alert.AlertType.THRESHOLD,
+                severity=Alert.Severity.HIGH,
+                title=f"Seuil d'alerte franchi : {label}"[:255],
+                message=(
+                    f"La valeur {value:g} franchit le seuil d'alerte "
+                    f"{thresholds[index]:g} de l'indicateur {indicator.name}."
+                ),
+                threshold=float(thresholds[index]),
+                **common
+            ))
+        if trends[index]:
+            alerts.append(Alert(
+                type=Alert.AlertType.TREND,
+                severity=Alert.Severity.MEDIUM,
+                title=f"Variation annuelle inhabituelle : {label}"[:255],
+                message=(
+                    f"La valeur passe de {previous[index]:g} à {value:g} "
+                    f"({(value - previous[index]) / abs(previous[index]) * 100:+.0f} %) "
+                    f"par rapport à {year - 1}."
+                ),
+                threshold=float(previous[index]),
+                **common
+            ))
+        if anomalies[index]:
+            alerts.append(Alert(
+                type=Alert.AlertType.ANOMALY,
+                severity=_severity_for_z(z_scores[index]),
+                title=f"Valeur atypique : {label}"[:255],
+                message=(
+                    f"La valeur {value:g} s'écarte de la série historique du territoire "
+                    f"(z-score robuste {z_scores[index]:+.1f}, médiane {medians[groups[index]]:g})."
+                ),
+                threshold=float(medians[groups[index]]),
+                **common
+            ))
+    return alerts
+
+
+class TerritoryLookup:
+    """Libellés et région de rattachement des territoires"""
+
+    def __init__(self):
+        from fati_geography.models import Commune, Department, Region
+        self.regions = dict(Region.objects.values_list('id', 'name'))
+        self.departments = {
+            pk: (name, region_id)
+            for pk, name, region_id in Department.objects.values_list('id', 'name', 'region_id')
+        }
+        self.communes = {
+            pk: (name, department_id)
+            for pk, name, department_id in Commune.objects.values_list('id', 'name', 'department_id')
+        }
+
+    def name(self, region_id, department_id, commune_id):
+        if commune_id:
+            return self.communes.get(commune_id, ('',))[0]
+        if department_id:
+            return self.departments.get(department_id, ('',))[0]
+        if region_id:
+            return self.regions.get(region_id, '')
+        return 'National'
+
+    def region_of(self, region_id, department_id, commune_id):
+        if commune_id and commune_id in self.communes:
+            department_id = self.communes[commune_id][1]
+        if department_id and department_id in self.departments:
+            return self.departments[department_id][1]
+        return region_id
+
+
+def _existing_alerts(value_ids):
+    return set(Alert.objects.filter(indicator_value_id__in=value_ids).values_list(
+        'indicator_value_id', 'type', 'value'
+    ))
+
+
+def scan_values(full=False, batch_size=SCAN_BATCH_SIZE):
+    """
+    Analyser les valeurs modifiées depuis le dernier passage (journal des
+    modifications).
+
+    ``full`` repart de zéro (les alertes déjà émises pour une même valeur ne
+    sont pas dupliquées). Renvoie (valeurs analysées, alertes créées).
+    """
+    changed = ChangedValues(SCAN_NAME, full=full, batch_size=batch_size)
+    indicators = Indicator.objects.in_bulk()
+    territories = TerritoryLookup()
+    history = History()
+    recipients = list(User.objects.filter(
+        is_active=True, role__in=[User.Role.ADMIN, User.Role.INSTITUTION]
+    ).values_list('id', flat=True))
+
+    for value_ids in changed:
+        batch = list(IndicatorValue.objects.filter(id__in=value_ids).exclude(
+            status=IndicatorValue.Status.REJECTED
+        ).order_by('id').values_list(
+            'id', 'indicator_id', 'region_id', 'department_id', 'commune_id',
+            'period', 'year', 'value'
+        ))
+        alerts = []
+        if batch:
+            missing = {row[1] for row in batch} - indicators.keys()
+            if missing:
+                indicators.update(Indicator.objects.in_bulk(missing))
+            alerts = detect_batch(batch, indicators, history, territories)
+            existing = _existing_alerts([row[0] for row in batch])
+            alerts = [
+                alert for alert in alerts
+                if (alert.indicator_value_id, alert.type, alert.value) not in existing
+            ]
+
+        with transaction.atomic():
+            alerts = Alert.objects.bulk_create(alerts, batch_size=1000)
+            if recipients and alerts:
+                Through = Alert.recipients.through
+                Through.objects.bulk_create([
+                    Through(alert_id=alert.id, user_id=user_id)
+                    for alert in alerts for user_id in recipients
+                ], batch_size=5000)
+            changed.commit(len(batch), len(alerts))
+    prune_changes()
+    return changed.values, changed.results
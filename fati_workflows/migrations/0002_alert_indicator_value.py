@@ -0,0 +1,20 @@
+# Generated by Django 4.2.27 on 2026-10-18 23:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fati_indicators", "0003_indicatorvalue_fati_indica_year_1bea7b_idx"),
+        ("fati_workflows", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="alert",
+            name="indicator_value",
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name="alerts", to="fati_indicators.indicatorvalue", verbose_name="valeur d'indicateur"),
+        ),
+    ]
@@ -213,6 +213,16 @@ class Alert(models.Model):
         verbose_name=_('région')
     )
     
+    # Valeur à l'origine de l'alerte (détection automatique)
+    indicator_value = models.ForeignKey(
+        'fati_indicators.IndicatorValue',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='alerts',
+        verbose_name=_('valeur d\'indicateur')
+    )
+    
     # Valeurs
     value = models.FloatField(_('valeur'), null=True, blank=True)
     threshold = models.FloatField(_('seuil'), null=True, blank=True)
@@ -89,7 +89,7 @@ class AlertSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'type', 'severity', 'title', 'message',
             'sector', 'indicator', 'indicator_name',
-            'region', 'region_name', 'value', 'threshold',
+            'region', 'region_name', 'indicator_value', 'value', 'threshold',
             'is_read', 'read_at', 'created_at'
         ]
         read_only_fields = ['read_at', 'created_at']
@@ -1,3 +1,93 @@
-from django.test import TestCase
+import numpy as np
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from fati_indicators.models import Indicator
+from .detection import History, detect_batch, group_medians, threshold_breaches
+from .models import Alert
+
+
+class GroupMediansTest(SimpleTestCase):
+    """Médianes par groupe : effectifs pairs, impairs et groupes vides"""
+
+    def test_medians(self):
+        groups = np.array([1, 0, 1, 0, 0, 1, 1, 3])
+        values = np.array([4.0, 9.0, 1.0, 3.0, 5.0, 2.0, 3.0, 7.0])
+        medians, counts = group_medians(groups, values)
+        np.testing.assert_array_equal(medians, [5.0, 2.5, np.nan, 7.0])
+        np.testing.assert_array_equal(counts, [3, 4, 0, 1])
+
+
+class ThresholdBreachesTest(SimpleTestCase):
+    """Le sens du seuil dépend de la position de la cible"""
+
+    def test_directions(self):
+        nan = np.nan
+        values = np.array([12.0, 8.0, 8.0, 12.0, 10.0, 50.0, 12.0])
+        thresholds = np.array([10.0, 10.0, 10.0, 10.0, 10.0, nan, 10.0])
+        targets = np.array([5.0, 5.0, 20.0, 20.0, 20.0, 5.0, nan])
+        np.testing.assert_array_equal(
+            threshold_breaches(values, thresholds, targets),
+            [True, False, True, False, True, False, True]
+        )
+
+
+class Territories:
+    """Libellés fixes, sans base de données"""
+
+    def name(self, region_id, department_id, commune_id):
+        return 'Dakar'
+
+    def region_of(self, region_id, department_id, commune_id):
+        return region_id
+
+
+class DetectBatchTest(SimpleTestCase):
+    """Alertes de seuil, de tendance et d'anomalie d'un lot"""
+
+    def setUp(self):
+        self.indicators = {
+            1: Indicator(id=1, code='I1', name='Couverture', sector='health', type='rate',
+                         alert_threshold=50, target_value=80),
+            2: Indicator(id=2, code='I2', name='Effectif', sector='education', type='count'),
+        }
+        # Série validée de l'indicateur 2 dans la région 1, de 2010 à 2015 (médiane 100)
+        self.history = History()
+        self.history.loaded = {1, 2}
+        self.history.group_ids = {(2, 1, None, None, ''): 0}
+        for year, value in zip(range(2010, 2016), [100, 100, 102, 98, 100, 101]):
+            self.history.groups.append(0)
+            self.history.years.append(year)
+            self.history.values.append(value)
+
+    def detect(self, rows):
+        alerts = detect_batch(rows, self.indicators, self.history, Territories())
+        return sorted((alert.indicator_value_id, alert.type) for alert in alerts)
+
+    def test_threshold(self):
+        self.assertEqual(
+            self.detect([(10, 1, 1, None, None, '', 2016, 40.0), (11, 1, 1, None, None, '', 2016, 60.0)]),
+            [(10, Alert.AlertType.THRESHOLD)]
+        )
+
+    def test_trend_and_anomaly(self):
+        self.assertEqual(
+            self.detect([(20, 2, 1, None, None, '', 2016, 160.0)]),
+            [(20, Alert.AlertType.ANOMALY), (20, Alert.AlertType.TREND)]
+        )
+
+    def test_usual_value(self):
+        self.assertEqual(self.detect([(30, 2, 1, None, None, '', 2016, 101.0)]), [])
+
+    def test_unknown_series(self):
+        # Série sans historique : ni tendance ni anomalie
+        self.assertEqual(self.detect([(40, 2, 2, None, None, '', 2016, 1000.0)]), [])
+
+    def test_anomaly_severity(self):
+        # Médiane 100, MAD 0,5 : z-score robuste de 5,4 puis de 13,5
+        severities = {}
+        for value in (104.0, 110.0):
+            alerts = detect_batch(
+                [(50, 2, 1, None, None, '', 2016, value)], self.indicators, self.history, Territories()
+            )
+            severities[value] = [alert.severity for alert in alerts if alert.type == Alert.AlertType.ANOMALY]
+        self.assertEqual(severities, {104.0: [Alert.Severity.MEDIUM], 110.0: [Alert.Severity.HIGH]})